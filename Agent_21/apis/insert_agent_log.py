@@ -1,11 +1,11 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from supabase import create_client
+from common.supabase_pool import get_client
 
 SUPABASE_URL = <URL>
 SUPABASE_KEY = <KEY>
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_client(SUPABASE_URL, SUPABASE_KEY)
 
 @csrf_exempt
 def insert_agent_log(request):
@@ -2,12 +2,12 @@ import json
 import os
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from supabase import create_client
+from common.supabase_pool import get_client
 
 # Supabase client 
 SUPABASE_URL = <URL>
 SUPABASE_KEY = <KEY>
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_client(SUPABASE_URL, SUPABASE_KEY)
 
 @csrf_exempt
 def insert_products(request):
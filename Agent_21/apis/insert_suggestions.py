@@ -6,7 +6,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 import re
-from supabase import create_client
+from common.supabase_pool import get_client
 import os
 
 # Supabase config
@@ -14,7 +14,7 @@ SUPABASE_URL = <URL>
 SUPABASE_KEY = <KEY>
 
 # Initialize client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_client(SUPABASE_URL, SUPABASE_KEY)
 
 def clean_and_parse_json(json_str):
     """
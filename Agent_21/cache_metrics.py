@@ -0,0 +1,121 @@
+"""
+Cache Metrics
+This cache's own hit/miss counts and latency histograms, aggregated across processes in one Redis hash
+"""
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+METRICS_KEY = "sql_cache_metrics"
+FLUSH_INTERVAL = float(os.getenv("SQL_CACHE_METRICS_FLUSH", 5))  # seconds
+# Upper bounds (ms) of the latency buckets; the last bucket is everything slower
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+OUTCOMES = ("local_hit", "hit", "stale_hit", "miss")
+
+
+def _bucket_label(index: int) -> str:
+    return f"le_{LATENCY_BUCKETS_MS[index]}" if index < len(LATENCY_BUCKETS_MS) else "le_inf"
+
+
+class CacheMetrics:
+    """
+    record() only touches an in-process dict, so a local hit costs no Redis
+    round trip; a background thread folds the deltas into METRICS_KEY with
+    HINCRBY every FLUSH_INTERVAL seconds. snapshot() reads that one small
+    hash, independent of how many keys are cached.
+    """
+
+    def __init__(self, redis_client=None, flush_interval: float = FLUSH_INTERVAL):
+        self.redis = redis_client
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def record(self, outcome: str, elapsed_ms: float):
+        bucket = _bucket_label(bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms))
+        with self._lock:
+            self._pending[f"{outcome}:count"] += 1
+            self._pending[f"{outcome}:sum_ms"] += elapsed_ms
+            self._pending[f"{outcome}:{bucket}"] += 1
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        if not pending or self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for field, value in pending.items():
+                if field.endswith(":sum_ms"):
+                    pipe.hincrbyfloat(METRICS_KEY, field, round(value, 3))
+                else:
+                    pipe.hincrby(METRICS_KEY, field, int(value))
+            pipe.execute()
+        except Exception as e:
+            print(f"Cache metrics flush error: {e}")
+            with self._lock:
+                for field, value in pending.items():
+                    self._pending[field] += value
+
+    def start(self):
+        """Flush periodically from a daemon thread, once per process."""
+        with self._lock:
+            if self._flusher is not None or self.redis is None:
+                return
+            self._flusher = threading.Thread(target=self._flush_forever, name="sql-cache-metrics", daemon=True)
+        self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+        if self.redis is not None:
+            self.redis.delete(METRICS_KEY)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per outcome: count, mean and estimated p50/p95/p99 (bucket upper bounds), plus the overall hit rate."""
+        raw = self.redis.hgetall(METRICS_KEY) if self.redis is not None else {}
+        fields = {k.decode("utf-8") if isinstance(k, bytes) else k: float(v) for k, v in raw.items()}
+
+        outcomes = {}
+        for outcome in OUTCOMES:
+            count = int(fields.get(f"{outcome}:count", 0))
+            buckets = [int(fields.get(f"{outcome}:{_bucket_label(i)}", 0)) for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+            outcomes[outcome] = {
+                "count": count,
+                "avg_ms": round(fields.get(f"{outcome}:sum_ms", 0.0) / count, 2) if count else None,
+                "p50_ms": _percentile(buckets, count, 0.50),
+                "p95_ms": _percentile(buckets, count, 0.95),
+                "p99_ms": _percentile(buckets, count, 0.99),
+                "histogram": {_bucket_label(i): n for i, n in enumerate(buckets) if n},
+            }
+
+        hits = sum(outcomes[o]["count"] for o in ("local_hit", "hit", "stale_hit"))
+        lookups = hits + outcomes["miss"]["count"]
+        return {
+            "hits": hits,
+            "misses": outcomes["miss"]["count"],
+            "hit_rate": f"{hits} / {lookups}",
+            "hit_percentage": f"{hits / max(lookups, 1) * 100:.2f}%",
+            "latency": outcomes,
+        }
+
+
+def _percentile(buckets, count: int, q: float):
+    """Upper bound of the bucket holding the q-quantile; None for the open last bucket or no data."""
+    if not count:
+        return None
+    target, seen = q * count, 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= target:
+            return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+    return None
@@ -0,0 +1,137 @@
+"""
+Local Cache
+In-process LRU of serialised query responses in front of Redis, kept coherent by pub/sub
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_LOCAL_CACHE_MAX_ENTRIES", 1024))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("SQL_LOCAL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+INVALIDATION_CHANNEL = "sql_cache_invalidate"
+ALL_KEYS = "*"
+
+
+class LocalCache:
+    """
+    Response bodies by cache key, bounded by entry count and total bytes, with
+    least-recently-used eviction. Entries never outlive their Redis TTL, and a
+    key deleted from Redis anywhere is dropped here through INVALIDATION_CHANNEL.
+    While that subscription is down nothing is served, since invalidations
+    could not be heard.
+    """
+
+    def __init__(self, max_entries: int = LOCAL_CACHE_MAX_ENTRIES, max_bytes: int = LOCAL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # one entry may not take more than this, or a single wide result would flush the rest
+        self.max_entry_bytes = max_bytes // 8
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.subscribed = False
+        # bumped by every invalidation; a put() with an older value may hold pre-invalidation data
+        self.generation = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key) if self.subscribed else None
+            if entry is not None and entry[0] <= time.time():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, body: bytes, ttl: float, generation: int):
+        """generation: the value of .generation read before the body was fetched from Redis or Supabase"""
+        if ttl <= 0 or len(body) > self.max_entry_bytes or not self.subscribed:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._drop(key)
+            self._entries[key] = (time.time() + ttl, body)
+            self.size += len(body)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def invalidate(self, keys: Iterable[str]):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if key == ALL_KEYS:
+                    self._entries.clear()
+                    self.size = 0
+                    return
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_percentage": f"{self.hits / max(lookups, 1) * 100:.2f}%",
+                "subscribed": self.subscribed
+            }
+
+    # ---------- pub/sub coherence ----------
+    def listen(self, redis_client, channel: str = INVALIDATION_CHANNEL):
+        """Start the background subscriber once per process."""
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(
+                target=self._listen_forever, args=(redis_client, channel), name="sql-cache-invalidation", daemon=True
+            )
+        self._listener.start()
+
+    def _listen_forever(self, redis_client, channel: str):
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(channel)
+                self.subscribed = True
+                while True:
+                    # polled: a blocking listen() would trip the client's socket timeout when idle
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.invalidate(json.loads(message["data"]))
+            except Exception as e:
+                print(f"Local cache invalidation feed lost: {e}")
+            finally:
+                # anything may have been invalidated while we were not listening
+                self.subscribed = False
+                self.invalidate([ALL_KEYS])
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(1)
+
+
+def publish_invalidation(redis_client, keys: Iterable, channel: str = INVALIDATION_CHANNEL):
+    """Tell every process's LocalCache to drop keys (ALL_KEYS for everything)."""
+    keys = [k.decode("utf-8") if isinstance(k, bytes) else k for k in keys]
+    if keys:
+        redis_client.publish(channel, json.dumps(keys))
@@ -0,0 +1,131 @@
+"""
+Query Stream
+Offset / keyset pagination of agent SQL, and page-by-page NDJSON or JSON-array streaming of large results
+"""
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import sqlparse
+
+STREAM_PAGE_SIZE = int(os.getenv("SQL_STREAM_PAGE_SIZE", 5000))
+MAX_PAGE_SIZE = int(os.getenv("SQL_MAX_PAGE_SIZE", 50000))
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+COLUMN_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+TRAILING_SEMICOLONS = re.compile(r"[;\s]+$")
+
+
+def _literal(value: Any) -> str:
+    """A cursor value as a SQL literal; numbers stay numbers (SQLite would compare a quoted one as text)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class Page:
+    """
+    One window over a SELECT, run as `SELECT * FROM (<query>) AS page_q ...`.
+    Offset mode needs an ORDER BY in the query for pages to be stable; keyset
+    mode (cursor_column) orders by that column itself and stays fast at any depth.
+    """
+
+    def __init__(self, size: int = STREAM_PAGE_SIZE, offset: int = 0,
+                 cursor_column: Optional[str] = None, cursor: Any = None):
+        if not 1 <= size <= MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        if cursor_column is not None and not COLUMN_NAME.match(cursor_column):
+            raise ValueError("cursor_column must be a plain column name")
+        self.size = size
+        self.offset = offset
+        self.cursor_column = cursor_column
+        self.cursor = cursor
+
+    @classmethod
+    def from_request(cls, data: Dict[str, Any], default_size: Optional[int] = None) -> Optional["Page"]:
+        """Page from the API body (page_size, offset, cursor_column, cursor); None if none was asked for."""
+        if not any(k in data for k in ("page_size", "offset", "cursor_column")) and default_size is None:
+            return None
+        try:
+            size = int(data.get("page_size", default_size or STREAM_PAGE_SIZE))
+            offset = int(data.get("offset", 0))
+        except (TypeError, ValueError):
+            raise ValueError("page_size and offset must be integers")
+        return cls(size, offset, data.get("cursor_column"), data.get("cursor"))
+
+    def sql(self, sql_query: str) -> str:
+        # a trailing "-- comment" would otherwise swallow the closing parenthesis
+        inner = TRAILING_SEMICOLONS.sub("", sqlparse.format(sql_query, strip_comments=True))
+        if self.cursor_column:
+            column = f'page_q."{self.cursor_column}"'
+            where = f" WHERE {column} > {_literal(self.cursor)}" if self.cursor is not None else ""
+            return f"SELECT * FROM ({inner}) AS page_q{where} ORDER BY {column} LIMIT {self.size}"
+        return f"SELECT * FROM ({inner}) AS page_q LIMIT {self.size} OFFSET {self.offset}"
+
+    def next(self, rows: List[Dict]) -> Optional["Page"]:
+        """The following page, or None once a short page shows the result is exhausted."""
+        if len(rows) < self.size:
+            return None
+        if self.cursor_column:
+            last = rows[-1].get(self.cursor_column)
+            # NULLs sort last and cannot be compared past, so a NULL cursor ends the walk
+            return Page(self.size, 0, self.cursor_column, last) if last is not None else None
+        return Page(self.size, self.offset + len(rows))
+
+    def describe(self, rows: List[Dict]) -> Dict[str, Any]:
+        following = self.next(rows)
+        info = {"page_size": self.size, "has_more": following is not None}
+        if self.cursor_column:
+            info.update(cursor_column=self.cursor_column, cursor=self.cursor,
+                        next_cursor=following.cursor if following else None)
+        else:
+            info.update(offset=self.offset, next_offset=following.offset if following else None)
+        return info
+
+
+def iter_pages(run_query: Callable[[str], List[Dict]], sql_query: str, page: Page) -> Iterator[List[Dict]]:
+    """Run the query one page at a time; only one page of rows is held at once."""
+    while page is not None:
+        rows = run_query(page.sql(sql_query)) or []
+        yield rows
+        page = page.next(rows)
+
+
+def _encode(row: Dict) -> str:
+    return json.dumps(row, default=str)
+
+
+def ndjson_stream(pages: Iterator[List[Dict]], extra: Optional[Dict] = None) -> Iterator[str]:
+    """One JSON object per row and line; the last line reports completion ("stream_end") or the error, plus extra."""
+    extra = extra or {}
+    row_count = page_count = 0
+    try:
+        for rows in pages:
+            page_count += 1
+            row_count += len(rows)
+            if rows:
+                yield "\n".join(map(_encode, rows)) + "\n"
+        yield _encode({"stream_end": True, "success": True, "row_count": row_count, "pages": page_count, **extra}) + "\n"
+    except Exception as e:
+        print(f"Streaming query failed after {row_count} rows: {e}")
+        yield _encode({"stream_end": True, "success": False, "row_count": row_count, "error": str(e), **extra}) + "\n"
+
+
+def json_array_stream(pages: Iterator[List[Dict]], sql_query: str, extra: Optional[Dict] = None) -> Iterator[str]:
+    """The regular response shape, written incrementally; success comes last, after the rows it vouches for."""
+    row_count = page_count = 0
+    yield '{"query": ' + json.dumps(sql_query) + ', "data": ['
+    try:
+        for rows in pages:
+            page_count += 1
+            if rows:
+                yield (", " if row_count else "") + ", ".join(map(_encode, rows))
+            row_count += len(rows)
+        tail = {**(extra or {}), "row_count": row_count, "pages": page_count, "success": True}
+    except Exception as e:
+        print(f"Streaming query failed after {row_count} rows: {e}")
+        tail = {**(extra or {}), "row_count": row_count, "pages": page_count, "success": False, "error": str(e)}
+    yield "], " + json.dumps(tail)[1:]
@@ -0,0 +1,123 @@
+"""
+PII Redaction
+Column-level masking of query results: PII columns are resolved once per result schema, then only those are rewritten
+"""
+import hashlib
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REDACTED = "REDACTED"
+# column name (case-insensitive) -> policy; SQL_PII_POLICIES adds or overrides, e.g. "email=partial,phone=hash,password=drop"
+DEFAULT_PII_POLICIES = {"name": "redact", "email": "redact", "username": "redact", "password": "redact"}
+# key of the "hash" policy; required when any column uses it, or the masked values could be brute-forced
+PII_HASH_SALT = os.getenv("SQL_PII_HASH_SALT", "").encode("utf-8")
+HASH_MEMO_SIZE = 65536
+
+DROP = "drop"
+
+
+def parse_policies(spec: Optional[str]) -> Dict[str, str]:
+    policies = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        column, _, policy = item.partition("=")
+        policies[column.strip().lower()] = policy.strip().lower() or "redact"
+    return policies
+
+
+def _partial(value: Any) -> Any:
+    """Keeps the first character (and an e-mail's domain): "jane@acme.com" -> "j***@acme.com"."""
+    if value is None:
+        return None
+    text = str(value)
+    local, at, domain = text.partition("@")
+    if at:
+        return f"{local[:1]}***@{domain}"
+    return f"{text[:1]}***" if len(text) > 1 else "***"
+
+
+class PIIRedactor:
+    """
+    Maskers per policy: "redact" (constant), "hash" (keyed, stable, so masked
+    values still join and group), "partial" and "drop". A result's columns are
+    matched against the policies once and the plan is memoised per schema, so
+    a result with no PII columns is returned untouched and otherwise the work
+    is one pass per PII column, not one check per cell. Rows are rewritten in
+    place; callers pass freshly decoded results they own.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, str]] = None, salt: bytes = PII_HASH_SALT):
+        self.policies = {column.lower(): policy for column, policy in
+                         (DEFAULT_PII_POLICIES if policies is None else policies).items()}
+        self.salt = salt
+        self.maskers: Dict[str, Callable[[Any], Any]] = {
+            "redact": lambda value: REDACTED,
+            "hash": lru_cache(maxsize=HASH_MEMO_SIZE)(self._hash),
+            "partial": _partial,
+        }
+        unknown = set(self.policies.values()) - set(self.maskers) - {DROP}
+        if unknown:
+            raise ValueError(f"Unknown PII policies {sorted(unknown)}")
+        if "hash" in self.policies.values() and not salt:
+            raise ValueError("The PII hash policy needs a secret salt: set SQL_PII_HASH_SALT")
+        self.plan = lru_cache(maxsize=1024)(self._plan)
+
+    def _hash(self, value: Any) -> Any:
+        if value is None:
+            return None
+        digest = hashlib.blake2b(str(value).encode("utf-8"), key=self.salt, digest_size=8)
+        return f"pii_{digest.hexdigest()}"
+
+    def policy(self, column: str) -> Optional[str]:
+        """The policy masking this result column, or None."""
+        return self.policies.get(column.lower())
+
+    def _plan(self, columns: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        """(column, policy) for each PII column of this schema, in the result's own spelling."""
+        return tuple(
+            (column, self.policies[column.lower()])
+            for column in columns
+            if isinstance(column, str) and column.lower() in self.policies
+        )
+
+    def redact(self, data: Any) -> Any:
+        if isinstance(data, list):
+            return self.redact_rows(data)
+        if isinstance(data, dict):
+            return self.redact_rows([data])[0]
+        return data
+
+    def redact_rows(self, rows: List[Any]) -> List[Any]:
+        if not rows or not isinstance(rows[0], dict):
+            return rows
+        keys = rows[0].keys()
+        try:
+            # all in C: one schema for the whole result, as the RPC always returns
+            uniform = all(map(keys.__eq__, map(dict.keys, rows)))
+        except TypeError:
+            uniform = False
+        if uniform:
+            self._apply(self.plan(tuple(keys)), rows)
+        else:
+            # mixed shapes (not something the RPC returns): resolve per row
+            for row in rows:
+                if isinstance(row, dict):
+                    self._apply(self.plan(tuple(row)), [row])
+        return rows
+
+    def _apply(self, plan: Tuple[Tuple[str, str], ...], rows: List[Dict]):
+        for column, policy in plan:
+            if policy == DROP:
+                for row in rows:
+                    del row[column]
+            elif policy == "redact":
+                for row in rows:
+                    row[column] = REDACTED
+            else:
+                mask = self.maskers[policy]
+                for row in rows:
+                    row[column] = mask(row[column])
+
+
+def policies_from_env() -> Dict[str, str]:
+    return {**DEFAULT_PII_POLICIES, **parse_policies(os.getenv("SQL_PII_POLICIES"))}
@@ -0,0 +1,137 @@
+"""
+Single Flight
+One computation per cache key at a time, within the process and across processes sharing Redis
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional, Set
+
+LOCK_PREFIX = "sql_cache_lock:"
+LOCK_TIMEOUT = float(os.getenv("SQL_CACHE_LOCK_TIMEOUT", 30))     # seconds a leader may hold the key
+WAIT_TIMEOUT = float(os.getenv("SQL_CACHE_WAIT_TIMEOUT", 15))     # seconds a follower waits before computing itself
+POLL_INTERVAL = 0.05
+
+# delete the lock only if this caller still owns it
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Callers of do() for the same key share one computation. Threads in this
+    process wait on the leader's future; other processes see the Redis lock
+    and poll `recheck` (normally a cache read) until the leader has stored the
+    result. A follower that waits longer than wait_timeout, or outlives the
+    lock, computes on its own rather than failing the request.
+    """
+
+    def __init__(self, redis_client=None, lock_timeout: float = LOCK_TIMEOUT,
+                 wait_timeout: float = WAIT_TIMEOUT):
+        self.redis = redis_client
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.coalesced = 0
+        self._inflight: Dict[str, Future] = {}
+        self._leading: Set[str] = set()   # keys whose lock this process holds
+        self._lock = threading.Lock()
+        self._release = redis_client.register_script(RELEASE_SCRIPT) if redis_client is not None else None
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._inflight
+
+    def do(self, key: str, compute: Callable[[], Any], recheck: Callable[[], Optional[Any]] = lambda: None) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except FutureTimeout:
+                return compute()
+
+        try:
+            result = self._across_processes(key, compute, recheck)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def try_lead(self, key: str) -> Optional[str]:
+        """Take the lock without waiting; returns its token, or None if another thread or process has it."""
+        with self._lock:
+            if key in self._leading:
+                return None
+            self._leading.add(key)
+        if self.redis is None:
+            return "local"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis.set(LOCK_PREFIX + key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except Exception as e:
+            print(f"Single-flight lock error: {e}")
+            return "local"
+        if not acquired:
+            with self._lock:
+                self._leading.discard(key)
+            return None
+        return token
+
+    def release(self, key: str, token: str):
+        with self._lock:
+            self._leading.discard(key)
+        if self._release is None or token == "local":
+            return
+        try:
+            self._release(keys=[LOCK_PREFIX + key], args=[token])
+        except Exception as e:
+            print(f"Single-flight unlock error: {e}")
+
+    def _locked(self, key: str) -> bool:
+        with self._lock:
+            if key in self._leading:
+                return True
+        if self.redis is None:
+            return False
+        try:
+            return bool(self.redis.exists(LOCK_PREFIX + key))
+        except Exception:
+            return False
+
+    def _across_processes(self, key: str, compute: Callable[[], Any], recheck: Callable[[], Optional[Any]]) -> Any:
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            token = self.try_lead(key)
+            if token is not None:
+                try:
+                    return compute()
+                finally:
+                    self.release(key, token)
+
+            # another process is computing it: wait for its result to land in the cache
+            self.coalesced += 1
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                result = recheck()
+                if result is not None:
+                    return result
+                if not self._locked(key):
+                    break   # leader finished without caching (error) or died; try to lead
+            else:
+                return compute()
@@ -0,0 +1,327 @@
+"""
+SQL Guard
+Pre-execution cost check of agent-generated SELECTs: reject, cap with a LIMIT, or stream, against row budgets
+"""
+import json
+import math
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlparse import tokens as T
+
+from .query_stream import MAX_PAGE_SIZE
+from .sql_normalize import is_call_paren, referenced_tables, statement_tokens
+
+# Budgets: rows a query may read, and rows it may return in one response
+MAX_SCAN_ROWS = int(os.getenv("SQL_GUARD_MAX_SCAN_ROWS", 10_000_000))
+MAX_RESULT_ROWS = int(os.getenv("SQL_GUARD_MAX_RESULT_ROWS", 10_000))
+MAX_PLAN_COST = float(os.getenv("SQL_GUARD_MAX_COST", 5_000_000))   # Postgres planner cost units, EXPLAIN only
+# what an over-budget result becomes: "limit" (first MAX_RESULT_ROWS rows, with a next offset) or "stream"
+OVERSIZE_ACTION = os.getenv("SQL_GUARD_OVERSIZE", "limit")
+ROW_COUNTS_TTL = 60   # seconds between refreshes of the table sizes
+# the planner's row estimate of every table, kept by ANALYZE / autovacuum; -1 until a table is first analysed
+TABLE_SIZES_SQL = (
+    "SELECT c.relname AS table_name, c.reltuples::bigint AS row_estimate "
+    "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+    "WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm')"
+)
+
+ALLOW, LIMIT, STREAM, REJECT = "allow", "limit", "stream", "reject"
+AGGREGATES = {"count", "sum", "avg", "min", "max", "bool_and", "bool_or", "every", "array_agg",
+              "string_agg", "json_agg", "jsonb_agg", "stddev", "variance"}
+# keywords that end a FROM list (and any join condition in it)
+CLAUSE_KEYWORDS = {"WHERE", "GROUP BY", "HAVING", "WINDOW", "ORDER BY", "LIMIT", "OFFSET", "FETCH",
+                   "UNION", "UNION ALL", "INTERSECT", "EXCEPT"}
+
+
+class GuardDecision:
+    """What the guard did with a query, and why; reported in the response as "guard"."""
+
+    def __init__(self, action: str, reasons: Optional[List[str]] = None, method: str = "static",
+                 estimated_scan_rows: Optional[float] = None, estimated_rows: Optional[float] = None,
+                 estimated_cost: Optional[float] = None, limit: Optional[int] = None):
+        self.action = action
+        self.reasons = reasons or []
+        self.method = method
+        self.estimated_scan_rows = estimated_scan_rows
+        self.estimated_rows = estimated_rows
+        self.estimated_cost = estimated_cost
+        self.limit = limit
+
+    def to_dict(self) -> Dict[str, Any]:
+        def whole(n):
+            return None if n is None else int(min(n, 1e18))
+        return {
+            "action": self.action,
+            "reasons": self.reasons,
+            "method": self.method,
+            "estimated_scan_rows": whole(self.estimated_scan_rows),
+            "estimated_rows": whole(self.estimated_rows),
+            "estimated_cost": self.estimated_cost,
+            "limit": self.limit
+        }
+
+
+class _Scope:
+    """FROM/JOIN state of one SELECT nesting level."""
+
+    def __init__(self, call: bool = False):
+        self.call = call   # a function's arguments: FROM there is syntax, not a FROM clause
+        self.from_items = 0
+        self.in_from = False
+        self.has_where = False
+        self.open_join = False   # a JOIN still waiting for its ON/USING
+
+    def close_join(self) -> bool:
+        """True if a JOIN ended without any ON/USING, pairing every row with every row."""
+        cross, self.open_join = self.open_join, False
+        return cross
+
+
+def _ends_condition(tokens: list, i: int) -> bool:
+    if i >= len(tokens):
+        return True
+    value = tokens[i].normalized
+    return value == ")" or value in CLAUSE_KEYWORDS or value.endswith("JOIN") or value == ","
+
+
+def _always_true_at(tokens: list, i: int) -> bool:
+    """An ON condition that is just TRUE or <literal> = <same literal>."""
+    if tokens[i:i + 1] and tokens[i].normalized == "TRUE" and _ends_condition(tokens, i + 1):
+        return True
+    condition = tokens[i:i + 3]
+    return (len(condition) == 3 and condition[0].ttype in T.Literal and condition[1].value == "="
+            and condition[0].value == condition[2].value and _ends_condition(tokens, i + 3))
+
+
+@lru_cache(maxsize=2048)
+def analyze(sql_query: str) -> Optional[Dict[str, Any]]:
+    """
+    Shape of one SELECT: tables read, cross joins (CROSS JOIN, a JOIN with no
+    or an always-true ON, a comma list with no WHERE), and whether the outer
+    query is bounded by a LIMIT or collapses to one row by aggregation.
+    None when the query is not a single parseable statement.
+    """
+    tokens = statement_tokens(sql_query)
+    tables = referenced_tables(sql_query)
+    if tokens is None or tables is None:
+        return None
+
+    scopes = [_Scope()]
+    cross_joins = 0
+    limit = None
+    aggregate = group_by = False
+    select_list = False
+
+    def finish(scope):
+        nonlocal cross_joins
+        cross_joins += scope.close_join()
+        if scope.from_items > 1 and not scope.has_where:
+            cross_joins += scope.from_items - 1
+
+    for i, token in enumerate(tokens):
+        scope = scopes[-1]
+        keyword = token.normalized if token.ttype in T.Keyword or token.ttype in T.DML else None
+
+        if token.ttype is T.Punctuation and token.value == "(":
+            scopes.append(_Scope(call=is_call_paren(tokens, i)))
+        elif token.ttype is T.Punctuation and token.value == ")":
+            if len(scopes) > 1:
+                finish(scopes.pop())
+        elif scope.call:
+            if select_list and token.value.lower() in AGGREGATES and i + 1 < len(tokens) and tokens[i + 1].value == "(":
+                aggregate = True
+        elif token.ttype is T.Punctuation and token.value == "," and scope.in_from and not scope.open_join:
+            scope.from_items += 1
+        elif keyword == "SELECT":
+            select_list = len(scopes) == 1
+        elif keyword == "FROM":
+            scope.in_from, scope.from_items = True, 1
+            if len(scopes) == 1:
+                select_list = False
+        elif keyword and keyword.endswith("JOIN"):
+            cross_joins += scope.close_join() or keyword == "CROSS JOIN"
+            scope.open_join = keyword != "CROSS JOIN" and not keyword.startswith("NATURAL")
+        elif keyword == "ON":
+            scope.open_join = False
+            cross_joins += _always_true_at(tokens, i + 1)
+        elif keyword == "USING":
+            scope.open_join = False
+        elif keyword in CLAUSE_KEYWORDS:
+            cross_joins += scope.close_join()
+            scope.in_from = False
+            scope.has_where = scope.has_where or keyword == "WHERE"
+            if len(scopes) == 1:
+                group_by = group_by or keyword == "GROUP BY"
+                if keyword in ("LIMIT", "FETCH"):
+                    following = next((t for t in tokens[i + 1:] if t.ttype in T.Literal.Number.Integer), None)
+                    limit = int(following.value) if following is not None else limit
+        elif select_list and token.value.lower() in AGGREGATES and i + 1 < len(tokens) and tokens[i + 1].value == "(":
+            aggregate = True
+    finish(scopes[0])
+
+    return {
+        "tables": tables,
+        "cross_joins": cross_joins,
+        "limit": limit,
+        "single_row": aggregate and not group_by,
+    }
+
+
+def _find_plan(node: Any) -> Optional[Dict]:
+    """The top "Plan" node of EXPLAIN (FORMAT JSON) output, however the RPC wrapped it."""
+    if isinstance(node, str):
+        try:
+            node = json.loads(node)
+        except ValueError:
+            return None
+    if isinstance(node, dict):
+        if isinstance(node.get("Plan"), dict):
+            return node["Plan"]
+        node = list(node.values())
+    if isinstance(node, list):
+        for item in node:
+            plan = _find_plan(item)
+            if plan is not None:
+                return plan
+    return None
+
+
+def database_row_counts(run_query: Callable[[str], Any],
+                        cached: Optional[Callable[[], Dict[str, int]]] = None) -> Callable[[], Dict[str, int]]:
+    """
+    row_counts() for SQLGuard from the database's own table sizes
+    (pg_class.reltuples), read with run_query(sql) -> rows. cached(), e.g. the
+    local replica's counts, only fills in tables Postgres has not analysed yet,
+    or all of them while the database cannot be asked.
+    """
+    def row_counts() -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        if cached is not None:
+            try:
+                counts.update(cached())
+            except Exception as e:
+                print(f"SQL guard could not read cached table sizes: {e}")
+        try:
+            rows = run_query(TABLE_SIZES_SQL) or []
+        except Exception as e:
+            print(f"SQL guard could not read table sizes from the database, using cached ones: {e}")
+            return counts
+        for row in [rows] if isinstance(rows, dict) else rows:
+            estimate = row.get("row_estimate") if isinstance(row, dict) else None
+            if estimate is not None and int(estimate) >= 0:
+                counts[row["table_name"]] = int(estimate)
+        return counts
+    return row_counts
+
+
+class SQLGuard:
+    """
+    Estimates a query before it runs and decides what to do with it.
+    Statically, table sizes come from row_counts() (see database_row_counts):
+    a cross join reads the product of its tables, anything else their sum,
+    and an unbounded result may be as large as the biggest table. With an
+    explain function the planner's own row and cost estimates are used instead,
+    falling back to static analysis if EXPLAIN fails. A result of unknown size,
+    including one the analysis cannot parse, is capped like an oversize one.
+    """
+
+    def __init__(self, row_counts: Callable[[], Dict[str, int]] = dict,
+                 explain: Optional[Callable[[str], Any]] = None,
+                 max_scan_rows: int = MAX_SCAN_ROWS, max_result_rows: int = MAX_RESULT_ROWS,
+                 max_cost: float = MAX_PLAN_COST, oversize_action: str = OVERSIZE_ACTION):
+        if oversize_action not in (LIMIT, STREAM):
+            raise ValueError(f"oversize action must be {LIMIT!r} or {STREAM!r}")
+        self.row_counts = row_counts
+        self.explain = explain
+        self.max_scan_rows = max_scan_rows
+        self.max_result_rows = max_result_rows
+        self.result_cap = min(max_result_rows, MAX_PAGE_SIZE)   # rows a LIMIT decision lets through
+        self.max_cost = max_cost
+        self.oversize_action = oversize_action
+        self._counts: Dict[str, int] = {}
+        self._counts_at = 0.0
+        self._lock = threading.Lock()
+
+    def table_sizes(self) -> Dict[str, int]:
+        with self._lock:
+            if time.monotonic() - self._counts_at > ROW_COUNTS_TTL:
+                try:
+                    self._counts = dict(self.row_counts())
+                except Exception as e:
+                    print(f"SQL guard could not read table sizes: {e}")
+                self._counts_at = time.monotonic()
+            return self._counts
+
+    def check(self, sql_query: str, bounded: bool = False, can_stream: bool = True) -> GuardDecision:
+        """
+        bounded: the caller already pages or streams the result, so only the read budget applies.
+        can_stream: False for callers that need the rows at once; an oversize result is then always a LIMIT.
+        """
+        oversize_action = self.oversize_action if can_stream else LIMIT
+        shape = analyze(sql_query)
+        if shape is None:
+            # valid Postgres the analysis does not follow: let it run, one bounded page at a time
+            decision = GuardDecision(ALLOW, ["query could not be analysed"])
+            return decision if bounded else self._oversize(decision, oversize_action, "unknown")
+
+        decision = self._explained(sql_query) if self.explain is not None else None
+        decision = decision or self._static(shape)
+
+        if decision.action == REJECT or bounded:
+            return decision
+        if shape["limit"] is not None and shape["limit"] <= self.max_result_rows:
+            decision.reasons.append(f"bounded by LIMIT {shape['limit']}")
+            return decision
+        rows = decision.estimated_rows
+        if shape["single_row"] or (rows is not None and rows <= self.max_result_rows):
+            return decision
+        return self._oversize(decision, oversize_action, "unknown" if rows is None else f"~{int(min(rows, 1e18))}")
+
+    def _oversize(self, decision: GuardDecision, action: str, size: str) -> GuardDecision:
+        decision.action = action
+        decision.limit = self.result_cap if action == LIMIT else None
+        decision.reasons.append(f"result size {size} rows over the {self.max_result_rows} row budget")
+        return decision
+
+    def _static(self, shape: Dict[str, Any]) -> GuardDecision:
+        sizes = self.table_sizes()
+        counts = [sizes.get(t) for t in shape["tables"]]
+        known = None not in counts
+        reasons = []
+        if shape["cross_joins"]:
+            reasons.append(f"{shape['cross_joins']} cross join(s)")
+
+        if not known:
+            if shape["cross_joins"]:
+                reasons.append("table sizes unknown, cannot bound a cross join")
+                return GuardDecision(REJECT, reasons)
+            return GuardDecision(ALLOW, reasons)
+
+        counts = [max(c, 1) for c in counts] or [1]
+        scan = math.prod(counts) if shape["cross_joins"] else sum(counts)
+        rows = 1 if shape["single_row"] else (scan if shape["cross_joins"] else max(counts))
+        if shape["limit"] is not None:
+            rows = min(rows, shape["limit"])
+        if scan > self.max_scan_rows:
+            reasons.append(f"reads ~{int(min(scan, 1e18))} rows, over the {self.max_scan_rows} row budget")
+            return GuardDecision(REJECT, reasons, estimated_scan_rows=scan, estimated_rows=rows)
+        return GuardDecision(ALLOW, reasons, estimated_scan_rows=scan, estimated_rows=rows)
+
+    def _explained(self, sql_query: str) -> Optional[GuardDecision]:
+        try:
+            plan = _find_plan(self.explain(sql_query))
+        except Exception as e:
+            print(f"EXPLAIN failed, falling back to static analysis: {e}")
+            return None
+        if plan is None:
+            return None
+
+        cost, rows = plan.get("Total Cost"), plan.get("Plan Rows")
+        if cost is not None and cost > self.max_cost:
+            return GuardDecision(REJECT, [f"planner cost {cost} over the {self.max_cost} budget"],
+                                 method="explain", estimated_rows=rows, estimated_cost=cost)
+        return GuardDecision(ALLOW, method="explain", estimated_rows=rows, estimated_cost=cost)
@@ -0,0 +1,160 @@
+"""
+SQL Normalize
+Canonical text of a SELECT, so formatting noise does not split the query cache,
+and the tables it reads, so cached results can be invalidated per table
+"""
+import re
+from typing import List, Optional
+
+import sqlparse
+from sqlparse import tokens as T
+
+# A quoted identifier that Postgres would also accept unquoted (it folds unquoted names to lower case)
+PLAIN_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_$]*$")
+
+# Keywords that end a FROM list at the same nesting level
+FROM_CLAUSE_END = {
+    "WHERE", "GROUP BY", "HAVING", "WINDOW", "ORDER BY", "LIMIT", "OFFSET", "FETCH",
+    "UNION", "UNION ALL", "INTERSECT", "EXCEPT", "FOR", "SELECT"
+}
+# Modifiers allowed between FROM/JOIN and the table
+FROM_ITEM_MODIFIERS = {"LATERAL", "ONLY"}
+
+
+def _canonical_token(token) -> str:
+    ttype, value = token.ttype, token.value
+
+    if ttype in T.Keyword:
+        # multi-word keywords ("order   by") collapse too
+        return " ".join(value.split()).upper()
+    if ttype in T.Name:
+        return value.lower()
+    if ttype in T.Literal.String.Symbol and value.startswith('"'):
+        inner = value[1:-1]
+        return inner if PLAIN_IDENTIFIER.match(inner) else value
+    return value
+
+
+def _is_noise(token) -> bool:
+    return token.is_whitespace or token.ttype in T.Comment or (token.ttype is T.Punctuation and token.value == ";")
+
+
+def statement_tokens(sql_query: str) -> Optional[list]:
+    """Meaningful tokens of the single statement in sql_query, or None if it holds several."""
+    statements = [
+        [t for t in s.flatten() if not _is_noise(t)]
+        for s in sqlparse.parse(sql_query)
+    ]
+    statements = [s for s in statements if s]
+    return statements[0] if len(statements) == 1 else None
+
+
+def is_call_paren(tokens: list, i: int) -> bool:
+    """
+    True if the "(" at tokens[i] opens a function's arguments, where FROM is
+    part of the syntax (extract(year from d), substring(s from 1 for 3)),
+    rather than a subquery or a parenthesised expression.
+    """
+    if i == 0 or tokens[i - 1].ttype not in T.Name:
+        return False
+    inner = tokens[i + 1] if i + 1 < len(tokens) else None
+    # exists(select ...), array(select ...): a subquery right after a name
+    return inner is None or not (inner.ttype in T.DML or inner.ttype in T.Keyword.CTE)
+
+
+def canonicalize_sql(sql_query: str) -> str:
+    """
+    Re-serialise one statement as its tokens joined by single spaces:
+    whitespace and comments dropped, keywords upper case, unquoted names
+    lower case, needlessly quoted identifiers unquoted, trailing semicolons
+    removed. String literals and case-sensitive quoted names are kept verbatim,
+    so two queries only share a canonical form when Postgres reads them alike.
+    Input that does not parse to a single statement is returned stripped, as is.
+    """
+    tokens = statement_tokens(sql_query)
+    if tokens is None:
+        return sql_query.strip()
+
+    return " ".join(_canonical_token(t) for t in tokens)
+
+
+def _identifier(token) -> Optional[str]:
+    """Table name as Postgres stores it: unquoted names fold to lower case."""
+    if token.ttype in T.Literal.String.Symbol and token.value.startswith('"'):
+        return token.value[1:-1]
+    if token.ttype in T.Name or token.ttype in T.Keyword:
+        return token.value.lower()
+    return None
+
+
+def referenced_tables(sql_query: str) -> Optional[List[str]]:
+    """
+    Tables read by a SELECT (including subqueries and joins), schema dropped
+    and CTE names excluded. Returns None when they cannot be known: several
+    statements, or a function call in a FROM position, which may read anything.
+    Errs on the side of extra names, never missing ones.
+    """
+    tokens = statement_tokens(sql_query)
+    if tokens is None:
+        return None
+
+    def punct(i, value):
+        return i < len(tokens) and tokens[i].ttype is T.Punctuation and tokens[i].value == value
+
+    # WITH name AS ( ... ) - references to these are not tables
+    ctes = {
+        _identifier(tokens[i]) for i in range(len(tokens) - 2)
+        if tokens[i + 1].normalized == "AS" and punct(i + 2, "(") and _identifier(tokens[i])
+    }
+
+    tables = set()
+    depth = 0
+    from_depths = set()   # nesting levels currently inside a FROM list
+    call_depths = set()   # nesting levels that are a function's arguments
+    expect_table = False
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        keyword = token.normalized if token.ttype in T.Keyword else None
+
+        if expect_table and not punct(i, "("):
+            if keyword in FROM_ITEM_MODIFIERS:
+                i += 1
+                continue
+            expect_table = False
+            name = _identifier(token)
+            # schema.table: keep the last component
+            while name is not None and punct(i + 1, ".") and i + 2 < len(tokens):
+                i += 2
+                name = _identifier(tokens[i])
+            if name is None:
+                return None
+            if punct(i + 1, "("):
+                return None
+            if name not in ctes:
+                tables.add(name)
+            i += 1
+            continue
+        expect_table = False
+
+        if token.ttype is T.Punctuation:
+            if token.value == "(":
+                depth += 1
+                if is_call_paren(tokens, i):
+                    call_depths.add(depth)
+            elif token.value == ")":
+                from_depths.discard(depth)
+                call_depths.discard(depth)
+                depth -= 1
+            elif token.value == "," and depth in from_depths:
+                expect_table = True
+        elif depth in call_depths:
+            pass
+        elif keyword == "FROM" or (keyword or "").endswith("JOIN"):
+            from_depths.add(depth)
+            expect_table = True
+        elif keyword in FROM_CLAUSE_END:
+            from_depths.discard(depth)
+        i += 1
+
+    return sorted(tables)
@@ -2,14 +2,28 @@
 supabase_redis_api.py
 """
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 import json
+import os
+import threading
 import time
 import hashlib
+import sqlite3
 import redis
-from supabase import create_client
+from common.supabase_pool import get_client
+from App.local_replica import LocalReplica
+
+from .sql_normalize import canonicalize_sql, referenced_tables
+from .local_cache import ALL_KEYS, LocalCache, publish_invalidation
+from .cache_codec import CacheCodec
+from .single_flight import SingleFlight
+from .cache_metrics import CacheMetrics
+from .security.pii_redaction import PIIRedactor, policies_from_env
+from .sql_guard import ALLOW, LIMIT, REJECT, STREAM, SQLGuard, database_row_counts
+from .query_stream import STREAM_FORMATS, STREAM_PAGE_SIZE, Page, iter_pages, json_array_stream, ndjson_stream
 
 SUPABASE_URL = <URL>
 SUPABASE_KEY = <KEY>
@@ -19,6 +33,30 @@ REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
 CACHE_TIMEOUT = 300  # 5 minutes (300 seconds)
+# An entry past its timeout is still served for this long while one caller refreshes it
+STALE_WINDOW = int(os.getenv("SQL_CACHE_STALE_WINDOW", 60))  # seconds, 0 disables
+
+# Entries are tagged with the tables they read and dropped by cache_listener.py
+# when one changes, so read-mostly tables can be cached far longer than the TTL
+TAG_PREFIX = "sql_cache_tag:"
+EPOCH_PREFIX = "sql_cache_epoch:"
+READ_MOSTLY_TABLES = set(filter(None, os.getenv("SQL_CACHE_READ_MOSTLY_TABLES", "products").split(",")))
+READ_MOSTLY_TIMEOUT = int(os.getenv("SQL_CACHE_READ_MOSTLY_TIMEOUT", 6 * 3600))  # 6 hours
+
+# Opt-in: queries over replicated tables run on the SQLite replica cache_listener.py
+# maintains, while that listener is alive and the query is in the subset SQLite
+# answers exactly like Postgres; everything else still goes to Supabase
+REPLICA_READS = os.getenv("SQL_REPLICA_READS", "false").lower() == "true"
+local_replica = LocalReplica()
+
+# Entries are written with the best installed serializer/compressor; cumulative
+# sizes before and after compression are counted here for cache_stats
+codec = CacheCodec()
+CODEC_STATS_KEY = "sql_cache_codec_stats"
+
+# Live keys scored by expiry time, so stats never walk the keyspace
+REGISTRY_KEY = "sql_cache_registry"
+CLEAR_BATCH = 1000
 
 try:
     redis_client = redis.Redis(
@@ -36,12 +74,38 @@ except Exception as e:
     REDIS_ENABLED = False
     print(f"Redis cache DISABLED: {str(e)}")
 
+# Hot responses are also kept serialised in this process, in front of Redis
+local_cache = LocalCache()
+if REDIS_ENABLED:
+    local_cache.listen(redis_client)
+
+# Concurrent misses on one key run a single query (see single_flight)
+flights = SingleFlight(redis_client if REDIS_ENABLED else None)
+
+# This cache's own hit/miss counts and latencies, shared by every process
+metrics = CacheMetrics(redis_client if REDIS_ENABLED else None)
+metrics.start()
+
 # Initialize Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Cost guard in front of every query: table sizes from Postgres' own estimates
+# (the replica's counts only where it has none), or the planner's estimates
+# for the query itself when the RPC accepts EXPLAIN
+GUARD_EXPLAIN = os.getenv("SQL_GUARD_EXPLAIN", "false").lower() == "true"
+
+def run_sql(sql_query):
+    return supabase.rpc('execute_any_query', {'sql_text': sql_query}).execute().data
+
+def explain_query(sql_query):
+    return run_sql(f"EXPLAIN (FORMAT JSON) {sql_query}")
+
+sql_guard = SQLGuard(database_row_counts(run_sql, cached=local_replica.row_counts),
+                     explain=explain_query if GUARD_EXPLAIN else None)
 
 def generate_cache_key(sql_query):
-    """Generate unique cache key from SQL query"""
-    query_hash = hashlib.md5(sql_query.encode('utf-8')).hexdigest()
+    """Generate unique cache key from SQL query, so formatting-only variants share one entry"""
+    query_hash = hashlib.md5(canonicalize_sql(sql_query).encode('utf-8')).hexdigest()
     return f"sql_cache:{query_hash}"
 
 def get_cached_result(cache_key):
@@ -55,11 +119,16 @@ def get_cached_result(cache_key):
         retrieval_time = round((time.time() - start_time) * 1000, 2)
         
         if cached_data:
-            result = json.loads(cached_data.decode('utf-8'))
+            decode_start = time.time()
+            result = codec.decode(cached_data)
+            decode_time = round((time.time() - decode_start) * 1000, 2)
+            info = result['cache_info']
             result['cache_info']['hit'] = True
             result['cache_info']['source'] = 'redis_cache'
+            result['cache_info']['stale'] = time.time() > info['cached_at'] + info['timeout']
             result['cache_info']['retrieval_time_ms'] = retrieval_time
-            print(f"Cache retrieval time: {retrieval_time}ms")
+            result['cache_info']['decode_time_ms'] = decode_time
+            print(f"Cache retrieval time: {retrieval_time}ms (+{decode_time}ms decode, {len(cached_data)} bytes)")
             return result
             
     except Exception as e:
@@ -67,10 +136,32 @@ def get_cached_result(cache_key):
     
     return None
 
-def set_cached_result(cache_key, data, timeout=CACHE_TIMEOUT):
-    """Store result in Redis cache"""
+def cache_timeout_for(tables, requested=None):
+    """Requested timeout, else the long one when every table read is read-mostly"""
+    if requested is not None:
+        return requested
+    if tables and all(t in READ_MOSTLY_TABLES for t in tables):
+        return READ_MOSTLY_TIMEOUT
+    return CACHE_TIMEOUT
+
+def table_epochs(tables):
+    """Invalidation counters of the tables, read before running the query"""
+    if not REDIS_ENABLED or not tables:
+        return []
+    try:
+        return redis_client.mget([EPOCH_PREFIX + t for t in tables])
+    except Exception as e:
+        print(f"Cache epoch read error: {e}")
+        return None
+
+def set_cached_result(cache_key, data, timeout=CACHE_TIMEOUT, tables=None, epochs=None):
+    """
+    Store result in Redis cache, tagged with the tables it reads.
+    epochs are the table_epochs() taken before the query ran: if a table was
+    invalidated while it ran, the result may predate the change and is not cached.
+    """
     if not REDIS_ENABLED:
-        return
+        return False
     
     try:
         # Prepare cache info
@@ -78,64 +169,167 @@ def set_cached_result(cache_key, data, timeout=CACHE_TIMEOUT):
             'hit': False,
             'source': 'supabase_fresh',
             'cached_at': time.time(),
-            'timeout': timeout
+            'timeout': timeout,
+            'tables': tables
         }
         data['cache_info'] = cache_info
-        serialized = json.dumps(data)
-        redis_client.setex(cache_key, timeout, serialized)
+        serialized, raw_size = codec.encode(data)
+
+        with redis_client.pipeline() as pipe:
+            if tables and epochs is not None:
+                # an invalidation between this check and EXEC aborts the write
+                epoch_keys = [EPOCH_PREFIX + t for t in tables]
+                pipe.watch(*epoch_keys)
+                if pipe.mget(epoch_keys) != epochs:
+                    print("Tables changed while querying, result not cached")
+                    return False
+            pipe.multi()
+            # kept past its timeout for the stale-while-revalidate window
+            pipe.setex(cache_key, timeout + STALE_WINDOW, serialized)
+            now = time.time()
+            pipe.zadd(REGISTRY_KEY, {cache_key: now + timeout + STALE_WINDOW})
+            # drop what expired since the last write; amortised over writes, never a full scan
+            pipe.zremrangebyscore(REGISTRY_KEY, "-inf", now)
+            pipe.hincrby(CODEC_STATS_KEY, "entries", 1)
+            pipe.hincrby(CODEC_STATS_KEY, "raw_bytes", raw_size)
+            pipe.hincrby(CODEC_STATS_KEY, "stored_bytes", len(serialized))
+            for table in tables or []:
+                pipe.sadd(TAG_PREFIX + table, cache_key)
+                # the tag outlives every entry in it; stale members are only extra deletes
+                pipe.expire(TAG_PREFIX + table, max(timeout + STALE_WINDOW, READ_MOSTLY_TIMEOUT))
+            pipe.execute()
         
-        print(f"Cached for {timeout} seconds")
+        print(f"Cached for {timeout} seconds ({codec.name}, {raw_size} -> {len(serialized)} bytes)")
+        return True
         
+    except redis.WatchError:
+        print("Tables changed while caching, result not cached")
     except Exception as e:
         print(f"Cache write error: {e}")
+    return False
+
+def cache_locally(cache_key, result, generation):
+    """Keep the response bytes of a Redis-cached result in this process, for its remaining TTL"""
+    info = result['cache_info']
+    remaining = info['cached_at'] + info['timeout'] - time.time()
+    local_result = dict(result, cache_info={
+        'hit': True,
+        'source': 'local_cache',
+        'cached_at': info['cached_at'],
+        'timeout': info['timeout'],
+        'tables': info.get('tables')
+    })
+    local_cache.put(cache_key, response_body(local_result), remaining, generation)
 
+def load_result(sql_query, cache_key, tables, cache_timeout, generation, page=None, guard=None):
+    """Run the query and cache a successful result in both tiers"""
+    epochs = table_epochs(tables)
+    result = execute_supabase_query(sql_query, page, tables)
+    if guard is not None:
+        result['guard'] = guard
+
+    # Cache successful results
+    if result['success'] and REDIS_ENABLED:
+        if set_cached_result(cache_key, result, timeout=cache_timeout, tables=tables, epochs=epochs):
+            cache_locally(cache_key, result, generation)
+    return result
+
+def refresh_in_background(sql_query, cache_key, tables, cache_timeout, page=None, guard=None):
+    """Recompute a stale entry off the request path; one refresher per key across threads and processes"""
+    if flights.in_flight(cache_key):
+        return
+    # taken before the thread starts, so concurrent stale hits do not each spawn a refresh
+    token = flights.try_lead(cache_key)
+    if token is None:
+        return
 
-PII_KEYS = {"name", "email", "username", "password"}
+    def refresh():
+        try:
+            load_result(sql_query, cache_key, tables, cache_timeout, local_cache.generation, page, guard)
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+        finally:
+            flights.release(cache_key, token)
+
+    threading.Thread(target=refresh, name="sql-cache-refresh", daemon=True).start()
+
+def response_body(result):
+    """The bytes JsonResponse would send"""
+    return json.dumps(result, cls=DjangoJSONEncoder).encode('utf-8')
+
+def invalidate_tables(tables):
+    """Drop every cached result that reads one of the tables; returns the number of keys removed"""
+    if not REDIS_ENABLED:
+        return 0
+
+    removed = 0
+    for table in tables:
+        tag = TAG_PREFIX + table
+        # bump the epoch first so a query already running does not re-cache old rows
+        redis_client.incr(EPOCH_PREFIX + table)
+        keys = list(redis_client.smembers(tag))
+        if not keys:
+            continue
+        pipe = redis_client.pipeline()
+        pipe.delete(*keys)
+        # only the members read here: keys tagged meanwhile hold fresh rows and stay tracked
+        pipe.srem(tag, *keys)
+        pipe.zrem(REGISTRY_KEY, *keys)
+        removed += pipe.execute()[0]
+        publish_invalidation(redis_client, keys)
+    return removed
+
+
+pii_redactor = PIIRedactor(policies_from_env())
 
 def redact_pii(data):
-    # Case 1: list of rows
-    if isinstance(data, list):
-        return [
-            {
-                k: ("REDACTED" if k.lower() in PII_KEYS else v)
-                for k, v in row.items()
-            }
-            for row in data
-        ]
+    """Mask PII columns per SQL_PII_POLICIES; rewrites the freshly fetched rows in place"""
+    return pii_redactor.redact(data)
 
-    # Case 2: single row
-    if isinstance(data, dict):
-        return {
-            k: ("REDACTED" if k.lower() in PII_KEYS else v)
-            for k, v in data.items()
-        }
+def fetch_rows(sql_query, tables=None):
+    """Rows and their source: the local replica when it is fresh, holds every table read and the query is dialect-safe, else the Supabase RPC"""
+    if REPLICA_READS and local_replica.covers(tables):
+        try:
+            return local_replica.query(sql_query, tables), "local_replica"
+        except sqlite3.Error as e:
+            print(f"Replica cannot run this query ({e}), asking Supabase")
+    return run_sql(sql_query), "supabase"
 
-    return data
+def run_query_rows(sql_query, tables=None):
+    """One query as redacted rows; used for each page of a stream"""
+    data, _ = fetch_rows(sql_query, tables)
+    if isinstance(data, dict):
+        data = [data]
+    return redact_pii(data or [])
 
-def execute_supabase_query(sql_query):
-    """Execute query directly on Supabase"""
+def execute_supabase_query(sql_query, page=None, tables=None):
+    """Execute query on Supabase (or the local replica); page (already applied to sql_query) adds the paging cursors"""
     print("Querying Supabase...")
     start_time = time.time()
     
     try:
-        response = supabase.rpc('execute_any_query', {'sql_text': sql_query}).execute()
+        data, source = fetch_rows(sql_query, tables)
         execution_time = round((time.time() - start_time) * 1000, 2)
         
-        data = response.data
         safe_data = redact_pii(data)
         row_count = len(data) if isinstance(data, list) else 1
         
-        print(f" Supabase query successful")
+        print(f" {source} query successful")
         print(f" Query time: {execution_time}ms")
         print(f" Rows returned: {row_count}")
         
-        return {
+        result = {
             "success": True,
             "query": sql_query,
             "row_count": row_count,
             "data": safe_data,
-            "execution_time_ms": execution_time
+            "execution_time_ms": execution_time,
+            "source": source
         }
+        if page is not None:
+            # cursor columns are never PII columns, so masking leaves the cursor intact
+            result["pagination"] = page.describe(safe_data if isinstance(safe_data, list) else [safe_data])
+        return result
         
     except Exception as e:
         execution_time = round((time.time() - start_time) * 1000, 2)
@@ -163,13 +357,14 @@ def execute_sql_query(request):
     print("\n" + "="*70)
     print("SQL QUERY API WITH REDIS CACHE")
     print("="*70)
+    request_start = time.time()
     
     try:
         # Parse request
         data = json.loads(request.body)
         sql_query = data.get('query', '').strip()
         bust_cache = data.get('bust_cache', False)
-        cache_timeout = data.get('cache_timeout', CACHE_TIMEOUT)
+        cache_timeout = data.get('cache_timeout')
         print(data)
         query_display = sql_query[:100] + "..." if len(sql_query) > 100 else sql_query
         print(f"Query: {query_display}")
@@ -185,21 +380,92 @@ def execute_sql_query(request):
                 "success": False,
                 "error": "Only SELECT queries are allowed"
             }, status=403)
+
+        # stream: "ndjson" / "json" runs the query page by page, uncached;
+        # page_size / offset / cursor_column / cursor return one cached page
+        stream_format = data.get('stream')
+        try:
+            if stream_format and stream_format not in STREAM_FORMATS:
+                raise ValueError(f"stream must be one of {sorted(STREAM_FORMATS)}")
+            page = Page.from_request(data, default_size=STREAM_PAGE_SIZE if stream_format else None)
+            # the next cursor is read from the returned rows, which are masked by then
+            if page is not None and page.cursor_column and pii_redactor.policy(page.cursor_column):
+                raise ValueError(f"cursor_column {page.cursor_column!r} is masked as PII; page by another column")
+        except ValueError as e:
+            return JsonResponse({
+                "success": False,
+                "error": str(e)
+            }, status=400)
+
+        # cost guard: over the read budget is refused; an oversize result is
+        # capped to a first page or streamed, unless the caller already pages it
+        decision = sql_guard.check(sql_query, bounded=bool(stream_format) or page is not None)
+        if decision.action == REJECT:
+            print(f"GUARD REJECTED: {'; '.join(decision.reasons)}")
+            print("="*70)
+            return JsonResponse({
+                "success": False,
+                "error": "Query rejected by the cost guard",
+                "guard": decision.to_dict()
+            }, status=403)
+        if decision.action == STREAM:
+            stream_format, page = "json", Page(STREAM_PAGE_SIZE)
+        elif decision.action == LIMIT:
+            page = Page(decision.limit)
+        guard = decision.to_dict()
+        if decision.action != ALLOW:
+            print(f"GUARD {decision.action.upper()}: {'; '.join(decision.reasons)}")
+
+        if stream_format:
+            print(f"STREAMING ({stream_format}, {page.size} rows per page)")
+            print("="*70)
+            tables = referenced_tables(sql_query)
+            pages = iter_pages(lambda sql: run_query_rows(sql, tables), sql_query, page)
+            extra = {"guard": guard}
+            body = ndjson_stream(pages, extra) if stream_format == "ndjson" else json_array_stream(pages, sql_query, extra)
+            return StreamingHttpResponse(body, content_type=STREAM_FORMATS[stream_format])
+
+        if page is not None:
+            sql_query = page.sql(sql_query)
         
         # Generate cache key
         cache_key = generate_cache_key(sql_query)
         print(f"Cache key: {cache_key}")
+
+        # None when the tables cannot be known; such entries only expire by TTL
+        tables = referenced_tables(sql_query)
+        cache_timeout = cache_timeout_for(tables, cache_timeout)
         
         if bust_cache and REDIS_ENABLED:
             print("Cache bust requested")
             try:
                 redis_client.delete(cache_key)
+                redis_client.zrem(REGISTRY_KEY, cache_key)
+                publish_invalidation(redis_client, [cache_key])
             except:
                 pass
 
+        # read before touching Redis, so an invalidation meanwhile keeps the result out of the local tier
+        generation = local_cache.generation
+
         if not bust_cache:
+            body = local_cache.get(cache_key)
+            if body is not None:
+                print("LOCAL CACHE HIT")
+                print("="*70)
+                metrics.record("local_hit", (time.time() - request_start) * 1000)
+                return HttpResponse(body, content_type="application/json")
+
             cached_result = get_cached_result(cache_key)
+            if cached_result and cached_result['cache_info']['stale']:
+                # serve the expired value now; one caller refreshes it behind us
+                print("STALE CACHE HIT, refreshing in background")
+                refresh_in_background(sql_query, cache_key, tables, cache_timeout, page, guard)
+                print("="*70)
+                metrics.record("stale_hit", (time.time() - request_start) * 1000)
+                return JsonResponse(cached_result)
             if cached_result:
+                cache_locally(cache_key, cached_result, generation)
                 print("CACHE HIT")
                 print(f"Total response: {cached_result['cache_info'].get('retrieval_time_ms', '?')}ms")
                 
@@ -210,16 +476,21 @@ def execute_sql_query(request):
                         print(f"📄 Sample (cached): {json.dumps(data_to_show[0], default=str)[:80]}...")
                 
                 print("="*70)
+                metrics.record("hit", (time.time() - request_start) * 1000)
                 return JsonResponse(cached_result)
         
         print("❌ CACHE MISS")
         
         # execute query
-        result = execute_supabase_query(sql_query)
-        
-        # Cache successful results
-        if result['success'] and REDIS_ENABLED:
-            set_cached_result(cache_key, result, timeout=cache_timeout)
+        if bust_cache:
+            result = load_result(sql_query, cache_key, tables, cache_timeout, generation, page, guard)
+        else:
+            # concurrent misses on this key wait for one query instead of each running it
+            result = flights.do(
+                cache_key,
+                lambda: load_result(sql_query, cache_key, tables, cache_timeout, generation, page, guard),
+                recheck=lambda: get_cached_result(cache_key)
+            )
         
         # Print results
         if result['success']:
@@ -234,6 +505,7 @@ def execute_sql_query(request):
         
         print(f"Total response: {result.get('execution_time_ms', 0)}ms")
         print("="*70)
+        metrics.record("miss", (time.time() - request_start) * 1000)
         
         return JsonResponse(result)
         
@@ -265,22 +537,50 @@ def cache_stats(request):
     try:
         # Get basic info
         info = redis_client.info()
-    
-        cache_keys = redis_client.keys("sql_cache:*")
+
+        # every read below is O(1) or O(log N) in the number of cached queries
+        now = time.time()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zcount(REGISTRY_KEY, now, "+inf")
+        pipe.zrevrangebyscore(REGISTRY_KEY, "+inf", now, start=0, num=5)
+        live_keys, sample_keys = pipe.execute()
+
+        # include this process's latest counts
+        metrics.flush()
+        usage = metrics.snapshot()
         
         stats = {
             "redis_status": "connected",
             "redis_version": info.get('redis_version', 'N/A'),
             "connected_clients": info.get('connected_clients', 0),
             "used_memory": f"{info.get('used_memory_human', 'N/A')}",
-            "total_cache_keys": len(cache_keys),
-            "hit_rate": f"{info.get('keyspace_hits', 0)} / {info.get('keyspace_hits', 0) + info.get('keyspace_misses', 1)}",
-            "hit_percentage": f"{info.get('keyspace_hits', 0) / max(info.get('keyspace_hits', 0) + info.get('keyspace_misses', 1), 1) * 100:.2f}%",
+            "total_cache_keys": live_keys,
+            "hit_rate": usage["hit_rate"],
+            "hit_percentage": usage["hit_percentage"],
+            "latency": usage["latency"],
             "uptime_days": info.get('uptime_in_days', 0)
         }
         
-        if cache_keys:
-            stats["sample_cache_keys"] = [k.decode('utf-8')[:50] + "..." for k in cache_keys[:5]]
+        if sample_keys:
+            stats["sample_cache_keys"] = [k.decode('utf-8')[:50] + "..." for k in sample_keys]
+
+        # this process's in-memory tier, and the misses it answered without a query of their own
+        stats["local_cache"] = local_cache.stats()
+        stats["coalesced_misses"] = flights.coalesced
+        stats["local_replica"] = {"reads_enabled": REPLICA_READS, **local_replica.stats()}
+
+        # cumulative over every entry written since the counters were created
+        written = {k.decode('utf-8'): int(v) for k, v in redis_client.hgetall(CODEC_STATS_KEY).items()}
+        raw_bytes, stored_bytes = written.get("raw_bytes", 0), written.get("stored_bytes", 0)
+        stats["codec"] = {
+            "format": codec.name,
+            "compress_threshold_bytes": codec.threshold,
+            "entries_written": written.get("entries", 0),
+            "raw_bytes_written": raw_bytes,
+            "stored_bytes_written": stored_bytes,
+            "bytes_saved": raw_bytes - stored_bytes,
+            "compression_ratio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None
+        }
         
         return JsonResponse({
             "success": True,
@@ -293,6 +593,19 @@ def cache_stats(request):
             "error": str(e)
         })
 
+def unlink_matching(pattern):
+    """SCAN in batches and UNLINK (freed in the background), so Redis never blocks on the whole keyspace"""
+    removed = 0
+    batch = []
+    for key in redis_client.scan_iter(match=pattern, count=CLEAR_BATCH):
+        batch.append(key)
+        if len(batch) >= CLEAR_BATCH:
+            removed += redis_client.unlink(*batch)
+            batch = []
+    if batch:
+        removed += redis_client.unlink(*batch)
+    return removed
+
 @csrf_exempt
 def clear_cache(request):
     """Clear all cached SQL queries"""
@@ -303,14 +616,17 @@ def clear_cache(request):
         })
     
     try : 
-        cache_keys = redis_client.keys("sql_cache:*")
-        
-        if cache_keys:
-            deleted = redis_client.delete(*cache_keys)
+        deleted = unlink_matching("sql_cache:*")
+        unlink_matching(TAG_PREFIX + "*")
+        redis_client.unlink(REGISTRY_KEY)
+        # then every process drops its in-memory tier too
+        publish_invalidation(redis_client, [ALL_KEYS])
+
+        if deleted:
             return JsonResponse({
                 "success": True,
                 "message": f"Cleared {deleted} cached queries",
-                "keys_cleared": len(cache_keys)
+                "keys_cleared": deleted
             })
         else:
             return JsonResponse({
@@ -0,0 +1,446 @@
+"""
+Local Replica
+On-disk SQLite copy of the monitored tables, bootstrapped over REST and kept current from realtime change events
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import sqlparse
+from sqlparse import tokens as T
+
+REPLICA_PATH = Path(os.getenv("LOCAL_REPLICA_PATH", Path(__file__).resolve().parent.parent / "local_replica.sqlite3"))
+# table -> primary key; upserts and deletes from realtime are matched on it
+REPLICATED_TABLES: Dict[str, str] = {
+    "products": "product_id",
+    "pricing_history": "pricing_id",
+    "revenue_stats": "stats_id",
+    "deliveries": "delivery_id",
+    "factory_performance": "factory_id",
+    "weather_conditions": "weather_id",
+    "review_sentiments": "sentiment_id",
+}
+
+# reads go back to Supabase once the listener has not checked in for this long
+MAX_LAG = float(os.getenv("LOCAL_REPLICA_MAX_LAG", 30))
+HEARTBEAT_INTERVAL = 10   # seconds between the listener's heartbeats
+
+META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS _replica_meta (
+    table_name TEXT PRIMARY KEY,
+    row_count INTEGER NOT NULL,
+    bootstrapped_at REAL NOT NULL,
+    last_event_at REAL
+)
+"""
+# Postgres type of every replicated column, to type new columns and decode results
+COLUMNS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS _replica_columns (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    source_type TEXT NOT NULL,
+    PRIMARY KEY (table_name, column_name)
+)
+"""
+HEARTBEAT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS _replica_heartbeat (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    beat_at REAL NOT NULL
+)
+"""
+UPSERT_EVENTS = {"INSERT", "UPDATE"}
+
+INTEGER_TYPES = {"smallint", "integer", "bigint", "int2", "int4", "int8"}
+NUMERIC_TYPES = {"numeric", "decimal", "real", "double precision", "float4", "float8"}
+JSON_TYPES = {"json", "jsonb"}
+
+# The replica only answers queries whose result cannot differ from Postgres.
+# Everything else (other functions, ORDER BY with its NULL placement and text
+# collation, text range comparisons, date literals, division) goes to Supabase.
+SAFE_FUNCTIONS = {"count", "coalesce", "nullif", "abs", "length"}
+UNSAFE_KEYWORDS = {"ORDER BY", "CAST", "INTERVAL", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP",
+                   "LOCALTIME", "LOCALTIMESTAMP", "COLLATE"}
+# keywords that may precede a parenthesis without calling a function
+STRUCTURAL_KEYWORDS = {"SELECT", "FROM", "WHERE", "HAVING", "ON", "USING", "AS", "IN", "EXISTS", "AND", "OR",
+                       "NOT", "ANY", "ALL", "SOME", "CASE", "WHEN", "THEN", "ELSE", "IS", "LIKE", "DISTINCT",
+                       "UNION", "UNION ALL", "INTERSECT", "EXCEPT", "LIMIT", "OFFSET", "BETWEEN"}
+RANGE_OPERATORS = {"<", ">", "<=", ">="}
+DATE_LITERAL = re.compile(r"^'\d{4}-\d{2}-\d{2}")
+BOOLEAN_WORDS = {"t", "f", "true", "false", "y", "n", "yes", "no", "on", "off"}
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _is_json(source_type: str) -> bool:
+    return source_type in JSON_TYPES or source_type.endswith("[]") or source_type == "array"
+
+
+def _affinity(source_type: str) -> str:
+    """SQLite column type for a Postgres type; numbers must be stored as numbers to compare as numbers."""
+    if source_type in INTEGER_TYPES or source_type == "boolean":
+        return "INTEGER"
+    if source_type in NUMERIC_TYPES or source_type.startswith("numeric"):
+        return "NUMERIC"
+    return "TEXT"
+
+
+def _infer_type(value: Any) -> str:
+    """Postgres type of a JSON value, for columns the source schema does not describe."""
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "double precision"
+    if isinstance(value, (dict, list)):
+        return "jsonb"
+    return "text"
+
+
+def _value(value: Any, source_type: str) -> Any:
+    # SQLite has no JSON or boolean type: JSON is stored as its text, booleans as 0/1
+    if value is not None and (_is_json(source_type) or isinstance(value, (dict, list))):
+        return json.dumps(value, default=str)
+    return value
+
+
+def _decoder(source_type: str) -> Optional[Callable[[Any], Any]]:
+    if source_type == "boolean":
+        return bool
+    if _is_json(source_type):
+        return json.loads
+    return None
+
+
+def dialect_issue(sql_query: str) -> Optional[str]:
+    """Why SQLite could answer this query differently from Postgres, or None if it cannot."""
+    tokens = [t for t in sqlparse.parse(sql_query)[0].flatten()
+              if not t.is_whitespace and t.ttype not in T.Comment] if sql_query.strip() else []
+    for i, token in enumerate(tokens):
+        value = token.normalized
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if token.ttype in T.Keyword and value in UNSAFE_KEYWORDS:
+            return f"{value} behaves differently in SQLite"
+        if token.ttype in T.Operator and token.value in ("/", "::"):
+            return f"operator {token.value} behaves differently in SQLite"
+        if following is not None and following.value == "(" and (
+                token.ttype in T.Name or (token.ttype in T.Keyword and value not in STRUCTURAL_KEYWORDS
+                                          and not value.endswith("JOIN"))):
+            if token.value.lower() not in SAFE_FUNCTIONS:
+                return f"function {token.value}() is not known to match Postgres"
+        if token.ttype in T.String.Symbol and token.value != token.value.lower():
+            return f"quoted identifier {token.value} would match without case in SQLite"
+        if token.ttype in T.String.Single:
+            if DATE_LITERAL.match(token.value):
+                return "date/time literals compare as text in SQLite"
+            if "\\" in token.value or token.value[1:-1].lower() in BOOLEAN_WORDS:
+                return f"literal {token.value} is read differently by Postgres"
+        if (token.ttype in T.Operator.Comparison and token.value in RANGE_OPERATORS) or value == "BETWEEN":
+            neighbours = tokens[max(i - 1, 0):i + 4]
+            if any(t.ttype in T.String.Single for t in neighbours):
+                return "text range comparisons follow Postgres collation"
+    return None
+
+
+class LocalReplica:
+    """
+    One process (the realtime listener) writes: bootstrap() copies each table
+    once, apply() replays every change event on it. Events that arrive while a
+    table is being copied are held back and replayed after the copy, so the
+    snapshot cannot overwrite them. Columns are typed from the Postgres schema
+    (schema(), else the copied values), so numbers compare as numbers.
+
+    Readers open the file read-only and may run in any process; the database is
+    in WAL mode, so reads never wait on writes. They are only served while the
+    listener's heartbeat is recent and the query is in the dialect-safe subset.
+    """
+
+    def __init__(self, path: Path = REPLICA_PATH, tables: Optional[Dict[str, str]] = None,
+                 fetch: Optional[Callable[..., List[Dict]]] = None,
+                 schema: Optional[Callable[[], Dict[str, Dict[str, str]]]] = None, max_lag: float = MAX_LAG):
+        self.path = Path(path)
+        self.tables = REPLICATED_TABLES if tables is None else tables
+        self.fetch = fetch
+        self.schema = schema
+        self.max_lag = max_lag
+        self._pending: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._types: Dict[str, Dict[str, str]] = {}   # table -> column -> Postgres type
+
+    # ---------- writer side ----------
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def bootstrap(self, force: bool = False) -> Dict[str, int]:
+        """Copy every table that is not in the replica yet (all of them with force); returns rows per table."""
+        if self.fetch is None:
+            raise RuntimeError("LocalReplica needs a fetch function to bootstrap")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for schema in (META_SCHEMA, COLUMNS_SCHEMA, HEARTBEAT_SCHEMA):
+                db.execute(schema)
+            # tables copied before columns were typed are copied again
+            done = {row[0] for row in db.execute(
+                "SELECT table_name FROM _replica_meta WHERE table_name IN (SELECT table_name FROM _replica_columns)"
+            )}
+
+        todo = [table for table in self.tables if force or table not in done]
+        with self._lock:
+            for table in todo:
+                self._pending[table] = []
+
+        source = self._source_schema() if todo else {}
+        copied = {}
+        try:
+            for table in todo:
+                key = self.tables[table]
+                started = time.time()
+                rows = self.fetch(table, order=f"{key}.asc")
+                types = self._column_types(source.get(table) or {}, key, rows)
+                columns = ", ".join(
+                    f"{_quote(column)} {_affinity(source_type)}" + (" PRIMARY KEY" if column == key else "")
+                    for column, source_type in types.items()
+                )
+                with self._lock, self._db() as db:
+                    db.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                    db.execute(f"CREATE TABLE {_quote(table)} ({columns})")
+                    db.execute("DELETE FROM _replica_columns WHERE table_name = ?", (table,))
+                    db.executemany(
+                        "INSERT INTO _replica_columns (table_name, column_name, source_type) VALUES (?, ?, ?)",
+                        [(table, column, source_type) for column, source_type in types.items()]
+                    )
+                    self._types[table] = types
+                    self._upsert(db, table, rows)
+                    db.execute(
+                        "INSERT OR REPLACE INTO _replica_meta (table_name, row_count, bootstrapped_at) VALUES (?, ?, ?)",
+                        (table, len(rows), time.time())
+                    )
+                held = self._release(table)
+                copied[table] = len(rows)
+                print(f"🗄️ Replica: {table} copied, {len(rows)} rows in {time.time() - started:.1f}s, {held} events replayed")
+        finally:
+            # tables left uncopied by an error still get their held events, if they exist from an earlier bootstrap
+            for table in todo:
+                self._release(table)
+        return copied
+
+    def _source_schema(self) -> Dict[str, Dict[str, str]]:
+        if self.schema is None:
+            return {}
+        try:
+            return {table: {column: t.lower() for column, t in columns.items()}
+                    for table, columns in self.schema().items()}
+        except Exception as e:
+            print(f"🗄️ Replica: source schema unavailable, typing columns from their values ({e})")
+            return {}
+
+    @staticmethod
+    def _column_types(source: Dict[str, str], key: str, rows: List[Dict]) -> Dict[str, str]:
+        """Postgres types of the key, the schema's columns and any column only the rows show."""
+        types = dict(source)
+        for row in rows:
+            for column, value in row.items():
+                if value is not None and column not in types:
+                    types[column] = _infer_type(value)
+        for row in rows:
+            for column in row:
+                types.setdefault(column, "text")
+        key_type = types.pop(key, None) or next((_infer_type(r[key]) for r in rows if r.get(key) is not None), "text")
+        return {key: key_type, **types}
+
+    def heartbeat(self):
+        """Called by the listener every HEARTBEAT_INTERVAL while it is connected; readers trust the replica only then."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute(HEARTBEAT_SCHEMA)
+            db.execute(
+                "INSERT INTO _replica_heartbeat (id, beat_at) VALUES (1, ?) "
+                "ON CONFLICT (id) DO UPDATE SET beat_at = excluded.beat_at",
+                (time.time(),)
+            )
+
+    def _release(self, table: str) -> int:
+        """Replay the events held back while the table was copied; returns how many."""
+        with self._lock:
+            held = self._pending.pop(table, None) or []
+            self._apply_events(table, held)
+        return len(held)
+
+    def apply(self, payload: Any) -> bool:
+        """Replay one realtime change payload; returns False for tables that are not replicated."""
+        if not isinstance(payload, dict):
+            return False
+        data = payload.get("data", payload)
+        table = data.get("table")
+        if table not in self.tables:
+            return False
+        event = {
+            "type": (data.get("type") or data.get("eventType") or "").upper(),
+            "record": data.get("record") or data.get("new") or {},
+            "old_record": data.get("old_record") or data.get("old") or {},
+        }
+        # writes are serialised, so events land in the order they were applied
+        with self._lock:
+            if table in self._pending:
+                self._pending[table].append(event)
+            else:
+                self._apply_events(table, [event])
+        return True
+
+    def _apply_events(self, table: str, events: List[Dict]):
+        if not events:
+            return
+        key = self.tables[table]
+        with self._db() as db:
+            if not self._table_exists(db, table):
+                return   # not copied yet; the bootstrap snapshot will include these changes
+            for event in events:
+                if event["type"] in UPSERT_EVENTS:
+                    self._upsert(db, table, [event["record"]])
+                elif event["type"] == "DELETE" and key in event["old_record"]:
+                    db.execute(f"DELETE FROM {_quote(table)} WHERE {_quote(key)} = ?", (event["old_record"][key],))
+            # an upsert may insert or update, so recount rather than adjust
+            db.execute(
+                f"UPDATE _replica_meta SET row_count = (SELECT count(*) FROM {_quote(table)}), last_event_at = ? "
+                "WHERE table_name = ?",
+                (time.time(), table)
+            )
+
+    def _table_exists(self, db, table: str) -> bool:
+        return table in self._types or db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    def _upsert(self, db, table: str, rows: Iterable[Dict]):
+        """Insert or update by primary key, writing only the columns each row carries."""
+        key = self.tables[table]
+        by_shape: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            if row and row.get(key) is not None:
+                by_shape.setdefault(tuple(row), []).append(row)
+        for columns, group in by_shape.items():
+            types = self._ensure_columns(db, table, columns, group[0])
+            names = ", ".join(map(_quote, columns))
+            # realtime leaves unchanged TOASTed columns out of an UPDATE; those keep their value
+            updates = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in columns if c != key)
+            conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            db.executemany(
+                f"INSERT INTO {_quote(table)} ({names}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT ({_quote(key)}) {conflict}",
+                ([_value(row[c], types[c]) for c in columns] for row in group)
+            )
+
+    def _ensure_columns(self, db, table: str, columns: Iterable[str], sample: Dict) -> Dict[str, str]:
+        """Add columns the replica has not seen yet (e.g. added upstream after the bootstrap); returns the table's types."""
+        known = self._types.get(table)
+        if known is None:
+            known = self._types[table] = dict(db.execute(
+                "SELECT column_name, source_type FROM _replica_columns WHERE table_name = ?", (table,)
+            ).fetchall())
+        for column in columns:
+            if column not in known:
+                source_type = _infer_type(sample[column])
+                db.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)} {_affinity(source_type)}")
+                db.execute(
+                    "INSERT OR REPLACE INTO _replica_columns (table_name, column_name, source_type) VALUES (?, ?, ?)",
+                    (table, column, source_type)
+                )
+                known[column] = source_type
+        return known
+
+    # ---------- reader side ----------
+    @contextmanager
+    def _reader(self):
+        db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5)
+        # LIKE is case-sensitive in Postgres
+        db.execute("PRAGMA case_sensitive_like = ON")
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def covers(self, tables: Optional[Iterable[str]]) -> bool:
+        """True if every table is replicated and bootstrapped, and the listener keeping it current is alive."""
+        tables = set(tables or ())
+        if not tables or not tables <= set(self.tables) or not self.path.exists():
+            return False
+        try:
+            with self._reader() as db:
+                ready = {row[0] for row in db.execute(
+                    "SELECT table_name FROM _replica_meta WHERE table_name IN (SELECT table_name FROM _replica_columns)"
+                )}
+                beat = db.execute("SELECT beat_at FROM _replica_heartbeat WHERE id = 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return tables <= ready and beat is not None and time.time() - beat[0] <= self.max_lag
+
+    def query(self, sql_query: str, tables: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Rows of one read-only query over tables, with booleans and JSON decoded
+        back to what Postgres returns. Raises sqlite3.NotSupportedError for SQL
+        outside the dialect-safe subset, sqlite3.Error for SQL SQLite cannot run.
+        """
+        issue = dialect_issue(sql_query)
+        if issue:
+            raise sqlite3.NotSupportedError(issue)
+        with self._reader() as db:
+            decoders = self._decoders(db, tables)
+            rows = [dict(row) for row in db.execute(sql_query)]
+        decoded = [(column, decoders[column]) for column in (rows[0] if rows else ()) if column in decoders]
+        for column, decode in decoded:
+            for row in rows:
+                if row[column] is not None:
+                    row[column] = decode(row[column])
+        return rows
+
+    def _decoders(self, db, tables: Optional[Iterable[str]]) -> Dict[str, Callable[[Any], Any]]:
+        """Result column -> decoder; a name typed differently by two of the tables cannot be decoded safely."""
+        tables = list(tables or self.tables)
+        types: Dict[str, set] = {}
+        for column, source_type in db.execute(
+            f"SELECT column_name, source_type FROM _replica_columns WHERE table_name IN ({', '.join('?' * len(tables))})",
+            tables
+        ):
+            types.setdefault(column, set()).add(_decoder(source_type))
+        decoders = {}
+        for column, found in types.items():
+            if len(found) > 1:
+                raise sqlite3.NotSupportedError(f"column {column} has different types across the tables read")
+            decoder = found.pop()
+            if decoder is not None:
+                decoders[column] = decoder
+        return decoders
+
+    def row_counts(self) -> Dict[str, int]:
+        """Rows per replicated table, kept current by every applied event."""
+        tables = self.stats().get("tables") or {}
+        return {table: meta["row_count"] for table, meta in tables.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            return {"path": str(self.path), "tables": {}}
+        try:
+            with self._reader() as db:
+                tables = {row["table_name"]: dict(row) for row in db.execute("SELECT * FROM _replica_meta")}
+                beat = db.execute("SELECT beat_at FROM _replica_heartbeat WHERE id = 1").fetchone()
+        except sqlite3.Error as e:
+            return {"path": str(self.path), "error": str(e)}
+        lag = round(time.time() - beat[0], 1) if beat else None
+        return {"path": str(self.path), "tables": tables, "heartbeat_lag_s": lag,
+                "fresh": lag is not None and lag <= self.max_lag}
@@ -1,13 +1,13 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client
+from common.supabase_pool import get_client
 
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_client(SUPABASE_URL, SUPABASE_KEY)
 
 def fetch_table(table_name):
     return supabase.table(table_name).select("*").execute().data
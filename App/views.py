@@ -3,11 +3,9 @@ import time
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from sklearn.ensemble import IsolationForest
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import bcrypt
-import requests
 from django.core.mail import send_mail
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -23,6 +21,10 @@ from App.audit_trail import (
     log_agent_cycle, verify_audit_integrity, get_audit_cycles,
     search_audit_trail, generate_audit_report, get_cycle_details
 )
+from common.snapshot import TableSnapshot
+from common.supabase_rest import fetch_frame, fetch_records
+from common.supabase_pool import http_client
+from common.model_store import IsolationForestStore
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 
@@ -37,22 +39,16 @@ REST_HEADERS = {
     "Content-Type": "application/json"
 }
 
-# Create a robust requests session for better connection handling
-session = requests.Session()
-adapter = requests.adapters.HTTPAdapter(max_retries=3)
-session.mount("https://", adapter)
-session.mount("http://", adapter)
+# Shared pooled keep-alive session (timeouts and retries live in supabase_pool)
+session = http_client()
 
 @csrf_exempt
 def boardroom_ui(request):
     return render(request, "war_room.html")
 
-def fetch_supabase(table):
-    url = f"{SUPABASE_URL}/rest/v1/{table}"
+def fetch_supabase(table, select="*"):
     try:
-        res = session.get(url, headers=REST_HEADERS, timeout=10)
-        res.raise_for_status()
-        return res.json()
+        return fetch_records(SUPABASE_URL, REST_HEADERS, table, select, session=session)
     except Exception as e:
         print(f"Supabase Error ({table}): {str(e)}")
         return []
@@ -169,7 +165,7 @@ def customer_signup(request):
         }
         
         try:
-            res = requests.post(f"{SUPABASE_URL}/rest/v1/customers", headers=REST_HEADERS, json=data)
+            res = session.post(f"{SUPABASE_URL}/rest/v1/customers", headers=REST_HEADERS, json=data)
             if res.status_code == 201 or res.status_code == 200:
                 messages.success(request, "Account created successfully! Please login.")
                 return redirect("/customer/login/")
@@ -188,7 +184,7 @@ def customer_dashboard(request):
 
     # Fetch customer details from Supabase
     url = f"{SUPABASE_URL}/rest/v1/customers?customer_id=eq.{customer_id}&select=*"
-    res = requests.get(url, headers=REST_HEADERS)
+    res = session.get(url, headers=REST_HEADERS)
     customer = res.json()[0]
 
     context = {
@@ -206,83 +202,78 @@ def customer_dashboard(request):
 # }
 
 
-def fetch_supabase(table):
-    url = f"{SUPABASE_URL}/rest/v1/{table}"
-    res = requests.get(url, headers=REST_HEADERS)
-    res.raise_for_status()
-    return res.json()
+def fetch_supabase(table, select="*", filters=None, order=None):
+    """Whole table as a list of dicts, paged with Range headers."""
+    return fetch_records(SUPABASE_URL, REST_HEADERS, table, select, filters=filters, order=order, session=session)
+
+def fetch_supabase_frame(table, select="*", filters=None, order=None):
+    """Whole table as a DataFrame, built page by page."""
+    return fetch_frame(SUPABASE_URL, REST_HEADERS, table, select, filters=filters, order=order, session=session)
 
 # ---------- ML ANOMALY DETECTION ----------
 
+revenue_model = IsolationForestStore("revenue_iforest")
+
 # --------- REVENUE OUTLIERS ----------
-def detect_revenue_anomalies_ml():
-    rows = fetch_supabase("revenue_stats")
-    if not rows:
+def detect_revenue_anomalies_ml(snapshot=None):
+    df = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("revenue_stats")
+    if df.empty:
         return []
 
     # revenue values
-    revenue = np.array([float(r["total_revenue"]) for r in rows]).reshape(-1, 1)
-
-    # isolation forest
-    model = IsolationForest(contamination="auto", random_state=42)
-    preds = model.fit_predict(revenue)
+    revenue = df["total_revenue"].astype(float).to_numpy()
 
-    # use central tendency from normal points only
-    normal_values = [float(rows[i]["total_revenue"]) for i, p in enumerate(preds) if p == 1]
-
-    if not normal_values:
+    # isolation forest: refit only when the store says it is due
+    if revenue_model.needs_refit(total_rows=len(revenue)) and not revenue_model.fit(revenue):
         return []  # fallback safety
 
-    center = np.median(normal_values)
+    # central tendency of the normal points at fit time
+    center = revenue_model.center
 
     anomalies = []
 
-    for i, p in enumerate(preds):
-        if p == -1:
-            r = rows[i]
-            value = float(r["total_revenue"])
+    for r in df[revenue_model.flag(revenue)].to_dict("records"):
+        value = float(r["total_revenue"])
 
-            if value > center:
-                anomaly_type = "revenue_spike"
-                msg = "Unusual spike in revenue detected"
-            else:
-                anomaly_type = "revenue_drop"
-                msg = "Unusual drop in revenue detected"
-
-            anomalies.append({
-                "type": anomaly_type,
-                "stats_id": r["stats_id"],
-                "product_id": r["product_id"],
-                "total_revenue": r["total_revenue"],
-                "calculated_for": r["calculated_for"],
-                "center_reference": center,
-                "message": msg
-            })
+        if value > center:
+            anomaly_type = "revenue_spike"
+            msg = "Unusual spike in revenue detected"
+        else:
+            anomaly_type = "revenue_drop"
+            msg = "Unusual drop in revenue detected"
+
+        anomalies.append({
+            "type": anomaly_type,
+            "stats_id": r["stats_id"],
+            "product_id": r["product_id"],
+            "total_revenue": r["total_revenue"],
+            "calculated_for": r["calculated_for"],
+            "center_reference": center,
+            "message": msg
+        })
 
     return anomalies
 
 
 
 # --------- DELIVERY DELAY (MAD ROBUST) ----------
-def detect_delivery_delay_anomalies_mad():
-    deliveries = fetch_supabase("deliveries")
-
-    delays = []
-    valid = []
+def detect_delivery_delay_anomalies_mad(snapshot=None):
+    deliveries = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("deliveries")
+    if deliveries.empty:
+        return []
 
-    for d in deliveries:
-        if d.get("actual_delivery_date"):
-            delay = (
-                pd.to_datetime(d["actual_delivery_date"]) -
-                pd.to_datetime(d["promised_delivery_date"])
-            ).days
-            delays.append(delay)
-            valid.append(d)
+    delivered = deliveries[deliveries["actual_delivery_date"].notna()]
+    delays = (
+        pd.to_datetime(delivered["actual_delivery_date"]) -
+        pd.to_datetime(delivered["promised_delivery_date"])
+    ).dt.days
+    valid = delivered[delays.notna()]
+    delays = delays.dropna()
 
     if len(delays) < 5:
         return []
 
-    series = pd.Series(delays)
+    series = delays
 
     median = series.median()
     mad = (np.abs(series - median)).median()
@@ -291,27 +282,29 @@ def detect_delivery_delay_anomalies_mad():
         return []
 
     modified_z = 0.6745 * (series - median) / mad
+    flagged = (modified_z.abs() >= 3.5).to_numpy()
 
     anomalies = []
-    for d, mz, delay in zip(valid, modified_z, delays):
-        if abs(mz) >= 3.5:
-            anomalies.append({
-                "type": "delivery_delay",
-                "delivery_id": d["delivery_id"],
-                "order_id": d["order_id"],
-                "delay_days": int(delay),
-                "modified_z": float(mz),
-                "message": "Abnormal delivery delay detected"
-            })
+    for d, mz, delay in zip(valid[flagged].to_dict("records"), modified_z[flagged], delays[flagged]):
+        anomalies.append({
+            "type": "delivery_delay",
+            "delivery_id": d["delivery_id"],
+            "order_id": d["order_id"],
+            "delay_days": int(delay),
+            "modified_z": float(mz),
+            "message": "Abnormal delivery delay detected"
+        })
 
     return anomalies
 
 
 # --------- PRICE CHANGE ANOMALIES ----------
-def detect_price_change_anomalies():
-    history = fetch_supabase("pricing_history")
+def detect_price_change_anomalies(snapshot=None):
+    history = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("pricing_history")
+    if history.empty:
+        return []
 
-    df = pd.DataFrame(history).sort_values(["product_id", "start_date"])
+    df = history.sort_values(["product_id", "start_date"])
 
     df["pct_change"] = df.groupby("product_id")["price"].pct_change()
 
@@ -330,42 +323,39 @@ def detect_price_change_anomalies():
 
 
 # --------- SENTIMENT DRIFT ----------
-def detect_sentiment_drift():
-    sentiments = fetch_supabase("review_sentiments")
+def detect_sentiment_drift(snapshot=None):
+    sentiments = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("review_sentiments")
 
-    scores = [float(s["sentiment_score"]) for s in sentiments]
-
-    if len(scores) < 10:
+    if len(sentiments) < 10:
         return []
 
-    series = pd.Series(scores)
+    series = sentiments["sentiment_score"].astype(float)
 
     rolling = series.rolling(window=10).mean()
     drift = np.gradient(rolling)
 
+    flagged = np.abs(drift) > 0.25
+
     anomalies = []
-    for i, d in enumerate(drift):
-        if abs(d) > 0.25:
-            anomalies.append({
-                "type": "sentiment_drift",
-                "sentiment_id": sentiments[i]["sentiment_id"],
-                "drift": float(d),
-                "message": "Customer sentiment is drifting unusually"
-            })
+    for s, d in zip(sentiments[flagged].to_dict("records"), drift[flagged]):
+        anomalies.append({
+            "type": "sentiment_drift",
+            "sentiment_id": s["sentiment_id"],
+            "drift": float(d),
+            "message": "Customer sentiment is drifting unusually"
+        })
 
     return anomalies
 
 
 # --------- FACTORY ----------
-import numpy as np
-
-def detect_factory_throughput_anomalies():
-    rows = fetch_supabase("factory_performance")
-    if not rows:
+def detect_factory_throughput_anomalies(snapshot=None):
+    rows = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("factory_performance")
+    if rows.empty:
         return []
 
-    throughputs = np.array([r["throughput_percentage"] for r in rows], dtype=float)
-    backlogs = np.array([r["backlog_units"] for r in rows], dtype=float)
+    throughputs = rows["throughput_percentage"].to_numpy(dtype=float)
+    backlogs = rows["backlog_units"].to_numpy(dtype=float)
 
     # --- Data-driven thresholds (Z-score style) ---
     # k controls sensitivity: 2 = conservative, 3 = very strict, 1.5 = sensitive
@@ -387,37 +377,34 @@ def detect_factory_throughput_anomalies():
     else:
         backlog_high_threshold = backlog_mean + k * backlog_std
 
+    low_throughput = throughputs < throughput_low_threshold
+    high_backlog = backlogs > backlog_high_threshold
+
     anomalies = []
-    for r in rows:
-        low_throughput = r["throughput_percentage"] < throughput_low_threshold
-        high_backlog = r["backlog_units"] > backlog_high_threshold
-
-        if low_throughput or high_backlog:
-            anomalies.append({
-                "type": "factory_issue",
-                "factory_id": r["factory_id"],
-                "throughput": r["throughput_percentage"],
-                "backlog": r["backlog_units"],
-                "message": "Factory throughput low or backlog high (data-driven thresholds)",
-                "units_produced": r["units_produced"],
-                "derived_thresholds": {
-                    "throughput_low_threshold": throughput_low_threshold,
-                    "backlog_high_threshold": backlog_high_threshold,
-                }
-            })
+    for r in rows[low_throughput | high_backlog].to_dict("records"):
+        anomalies.append({
+            "type": "factory_issue",
+            "factory_id": r["factory_id"],
+            "throughput": r["throughput_percentage"],
+            "backlog": r["backlog_units"],
+            "message": "Factory throughput low or backlog high (data-driven thresholds)",
+            "units_produced": r["units_produced"],
+            "derived_thresholds": {
+                "throughput_low_threshold": throughput_low_threshold,
+                "backlog_high_threshold": backlog_high_threshold,
+            }
+        })
 
     return anomalies
 
 
 # --------- WEATHER ----------
-import numpy as np
-
-def detect_weather_risk():
-    weather = fetch_supabase("weather_conditions")
-    if not weather:
+def detect_weather_risk(snapshot=None):
+    weather = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("weather_conditions")
+    if weather.empty:
         return []
 
-    severities = np.array([float(r["severity_level"]) for r in weather])
+    severities = weather["severity_level"].to_numpy(dtype=float)
 
     # Quartiles
     q1 = np.percentile(severities, 25)
@@ -442,20 +429,19 @@ def detect_weather_risk():
             "message": "Weather risk likely to impact logistics (data-driven threshold)",
             "derived_threshold": high_severity_threshold
         }
-        for r in weather
-        if r["severity_level"] >= high_severity_threshold
+        for r in weather[severities >= high_severity_threshold].to_dict("records")
     ]
 
 def business_insights(request):
     return render(request, "business_dashboard.html")
 
 # --------- MARKET SHARE ----------
-def detect_market_share_sudden_change():
-    stats = fetch_supabase("revenue_stats")
-    if not stats:
+def detect_market_share_sudden_change(snapshot=None):
+    stats = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("revenue_stats")
+    if stats.empty:
         return []
 
-    df = pd.DataFrame(stats).sort_values(by=["product_id", "calculated_for"])
+    df = stats.sort_values(by=["product_id", "calculated_for"])
 
     df["rev_change"] = df.groupby("product_id")["revenue_share_percent"].diff()
     df["unit_change"] = df.groupby("product_id")["unit_share_percent"].diff()
@@ -481,12 +467,12 @@ def detect_market_share_sudden_change():
 
 
 # --------- INVENTORY ----------
-def detect_inventory_anomalies_ml():
-    products = fetch_supabase("products")
-    if not products:
+def detect_inventory_anomalies_ml(snapshot=None):
+    products = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("products")
+    if products.empty:
         return []
 
-    stocks = np.array([float(p.get("current_stock", 0)) for p in products])
+    stocks = products["current_stock"].fillna(0).to_numpy(dtype=float)
 
     q1 = np.percentile(stocks, 25)
     q3 = np.percentile(stocks, 75)
@@ -495,25 +481,22 @@ def detect_inventory_anomalies_ml():
     lower = q1 - 1.5 * iqr
     upper = q3 + 1.5 * iqr
 
-    anomalies = []
-
-    for p in products:
-        s = float(p.get("current_stock", 0))
+    # first matching condition wins, same precedence as an if/elif chain
+    reasons = np.select(
+        [stocks < 0, stocks == 0, (stocks < lower) | (stocks > upper)],
+        ["negative_stock", "stockout", "iqr_outlier"],
+        default=""
+    )
+    flagged = reasons != ""
 
-        if s < 0:
-            reason = "negative_stock"
-        elif s == 0:
-            reason = "stockout"
-        elif s < lower or s > upper:
-            reason = "iqr_outlier"
-        else:
-            continue
+    anomalies = []
 
+    for p, s, reason in zip(products[flagged].to_dict("records"), stocks[flagged], reasons[flagged]):
         anomalies.append({
             "type": "inventory_anomaly",
             "product_id": p["product_id"],
-            "current_stock": s,
-            "reason": reason,
+            "current_stock": float(s),
+            "reason": str(reason),
             "message": "Inventory level anomaly detected"
         })
 
@@ -537,14 +520,17 @@ def notify(action):
     )
 def run_ml_proactive_agent():
 
-    revenue_anoms = detect_revenue_anomalies_ml()
-    delivery_anoms = detect_delivery_delay_anomalies_mad()
-    inventory_anoms = detect_inventory_anomalies_ml()
-    price_change_anoms = detect_price_change_anomalies()
-    sentiment_drift_anoms = detect_sentiment_drift()
-    factory_throughput_anoms = detect_factory_throughput_anomalies()
-    weather_risk_anoms = detect_weather_risk()
-    market_share_change_anoms = detect_market_share_sudden_change()
+    # one snapshot per cycle: revenue_stats is read by two detectors but fetched once
+    snapshot = TableSnapshot(fetch_supabase_frame)
+
+    revenue_anoms = detect_revenue_anomalies_ml(snapshot)
+    delivery_anoms = detect_delivery_delay_anomalies_mad(snapshot)
+    inventory_anoms = detect_inventory_anomalies_ml(snapshot)
+    price_change_anoms = detect_price_change_anomalies(snapshot)
+    sentiment_drift_anoms = detect_sentiment_drift(snapshot)
+    factory_throughput_anoms = detect_factory_throughput_anomalies(snapshot)
+    weather_risk_anoms = detect_weather_risk(snapshot)
+    market_share_change_anoms = detect_market_share_sudden_change(snapshot)
 
     actions = []
 
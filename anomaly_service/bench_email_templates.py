@@ -0,0 +1,292 @@
+"""
+Email Template Benchmark
+Renders 10k alert e-mails with the inline f-strings notify() used before the
+templates module and with the email_templates layouts, with and without the
+cached chrome
+
+    python bench_email_templates.py [n_alerts]
+"""
+import random
+import sys
+import time
+
+from core import email_templates
+
+N_ALERTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+
+def make_actions(n):
+    rng = random.Random(42)
+    actions = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            actions.append({"type": "delivery_anomaly", "message": "ML detected abnormal order delay",
+                            "order_id": i, "delivery_id": 10_000 + i, "weather_id": rng.randint(1, 50)})
+        elif kind == 1:
+            actions.append({"type": "price_change_anomaly", "message": "Significant price change detected",
+                            "product_id": rng.randint(1, 500), "price_change": rng.uniform(-0.9, 2.0)})
+        else:
+            actions.append({"type": "inventory_anomaly", "message": "ML detected abnormal inventory level",
+                            "product_id": rng.randint(1, 500), "stock": rng.randint(-10, 10_000)})
+    return actions
+
+
+def render_alert(action, page):
+    html = page(email_templates.admin_content("Anomaly Detected", email_templates.admin_section(action)), "#FF6B6B")
+    if action["type"] == "delivery_anomaly":
+        content, _ = email_templates.delivery_notice(action["order_id"], action["delivery_id"], "N/A")
+        html += page(content, "#FFA726")
+    elif action["type"] == "price_change_anomaly":
+        content, _ = email_templates.price_notice(action["product_id"], action["price_change"])
+        html += page(content, "#42A5F5")
+    return html
+
+
+def uncached_page(content_html, header_color="#FF6B6B"):
+    # the whole stylesheet formatted per e-mail
+    return email_templates.CHROME.format(content_html=content_html, header_color=header_color)
+
+
+# ---------- BASELINE ----------
+# create_email_template() and notify() as they were in core/views.py
+
+def create_email_template(content_html, header_color="#FF6B6B"):
+    """Create a responsive email template with modern styling"""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <style>
+            body {{
+                margin: 0;
+                padding: 0;
+                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+                background-color: #f5f5f5;
+            }}
+            .email-container {{
+                max-width: 600px;
+                margin: 20px auto;
+                background-color: #ffffff;
+                border-radius: 12px;
+                overflow: hidden;
+                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+            }}
+            .header {{
+                background: linear-gradient(135deg, {header_color} 0%, {header_color}dd 100%);
+                padding: 30px;
+                text-align: center;
+                color: white;
+            }}
+            .header h1 {{
+                margin: 0;
+                font-size: 24px;
+                font-weight: 600;
+            }}
+            .content {{
+                padding: 30px;
+                color: #333333;
+                line-height: 1.6;
+            }}
+            .details-box {{
+                background-color: #f8f9fa;
+                border-left: 4px solid {header_color};
+                padding: 20px;
+                margin: 20px 0;
+                border-radius: 4px;
+            }}
+            .detail-item {{
+                display: flex;
+                padding: 8px 0;
+                border-bottom: 1px solid #e9ecef;
+            }}
+            .detail-item:last-child {{
+                border-bottom: none;
+            }}
+            .detail-label {{
+                font-weight: 600;
+                color: #495057;
+                min-width: 140px;
+            }}
+            .detail-value {{
+                color: #212529;
+            }}
+            .footer {{
+                background-color: #f8f9fa;
+                padding: 20px 30px;
+                text-align: center;
+                color: #6c757d;
+                font-size: 14px;
+                border-top: 1px solid #e9ecef;
+            }}
+            .button {{
+                display: inline-block;
+                padding: 12px 24px;
+                background-color: {header_color};
+                color: white;
+                text-decoration: none;
+                border-radius: 6px;
+                margin: 20px 0;
+                font-weight: 500;
+            }}
+            .icon {{
+                font-size: 48px;
+                margin-bottom: 10px;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            {content_html}
+        </div>
+    </body>
+    </html>
+    """
+
+
+def baseline_render(action):
+    # notify() before the templates module, minus the sending
+    # Build details HTML
+    details_html = ""
+    for k, v in action.items():
+        if k != "message":
+            details_html += f"""
+            <div class="detail-item">
+                <span class="detail-label">{k.replace('_', ' ').title()}:</span>
+                <span class="detail-value">{v}</span>
+            </div>
+            """
+    
+    admin_content = f"""
+        <div class="header">
+            <div class="icon">⚠️</div>
+            <h1>Anomaly Detected</h1>
+        </div>
+        <div class="content">
+            <p style="font-size: 16px; color: #212529;">{action["message"]}</p>
+            <div class="details-box">
+                <h3 style="margin-top: 0; color: #495057;">Details</h3>
+                {details_html}
+            </div>
+        </div>
+        <div class="footer">
+            <p>This is an automated alert from your monitoring system.</p>
+            <p style="margin: 5px 0;">© {2025} Your Company. All rights reserved.</p>
+        </div>
+    """
+    
+    html = create_email_template(admin_content, "#FF6B6B")
+    plain_text = action["message"]
+
+    # Customer notifications
+    if action['type'] == 'delivery_anomaly':
+        add_cont = ''
+        day_count = action['delay'] if 'delay' in action else 'N/A'
+        customer_content = f"""
+            <div class="header" style="background: linear-gradient(135deg, #FFA726 0%, #FF9800 100%);">
+                <div class="icon">🚚</div>
+                <h1>Delivery Delay Notice</h1>
+            </div>
+            <div class="content">
+                <p style="font-size: 16px;">Dear Customer,</p>
+                <p>We regret to inform you that your delivery is experiencing an unexpected delay.</p>
+                <p><strong style="color: #FF6B6B;">{add_cont}</strong></p>
+                <div class="details-box">
+                    <div class="detail-item">
+                        <span class="detail-label">Order ID:</span>
+                        <span class="detail-value"><strong>{action['order_id']}</strong></span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Delivery ID:</span>
+                        <span class="detail-value">{action['delivery_id']}</span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Delay Duration:</span>
+                        <span class="detail-value" style="color: #FF6B6B; font-weight: 600;">{day_count} days</span>
+                    </div>
+                </div>
+                
+                <p>We sincerely apologize for the inconvenience and are working diligently to resolve this issue as quickly as possible.</p>
+                <p style="margin-top: 24px;">Thank you for your understanding.</p>
+                <p style="margin-top: 20px; color: #495057;"><strong>Best regards,</strong><br>Customer Service Team</p>
+            </div>
+            <div class="footer">
+                <p>Need assistance? Contact our support team.</p>
+                <p style="margin: 5px 0;">© {2025} Your Company. All rights reserved.</p>
+            </div>
+        """
+        
+        html += create_email_template(customer_content, "#FFA726")
+        plain_text = f"Dear Customer,\n\nWe regret to inform you that your delivery with ID {action['delivery_id']} is experiencing an abnormal delay. We apologize for the inconvenience caused and are working to resolve this issue promptly.\n\nThank you for your understanding.\n\nBest regards,\nCustomer Service Team"
+        
+        
+    elif action['type'] == 'price_change_anomaly':
+        price_change_percent = action['price_change'] * 100
+        change_direction = "increased" if price_change_percent > 0 else "decreased"
+        change_color = "#FF6B6B" if price_change_percent > 0 else "#4CAF50"
+        
+        customer_content = f"""
+            <div class="header" style="background: linear-gradient(135deg, #42A5F5 0%, #1E88E5 100%);">
+                <div class="icon">💰</div>
+                <h1>Price Update Notification</h1>
+            </div>
+            <div class="content">
+                <p style="font-size: 16px;">Dear Customer,</p>
+                <p>We would like to inform you of a price change for one of our products.</p>
+                
+                <div class="details-box">
+                    <div class="detail-item">
+                        <span class="detail-label">Product ID:</span>
+                        <span class="detail-value"><strong>{action['product_id']}</strong></span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Price Change:</span>
+                        <span class="detail-value" style="color: {change_color}; font-weight: 600; font-size: 18px;">
+                            {price_change_percent:+.2f}%
+                        </span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Status:</span>
+                        <span class="detail-value">Price has {change_direction}</span>
+                    </div>
+                </div>
+                
+                <p>Please visit our website for complete and updated pricing details.</p>
+                <p style="margin-top: 24px;">Thank you for your continued support.</p>
+                <p style="margin-top: 20px; color: #495057;"><strong>Best regards,</strong><br>Customer Service Team</p>
+            </div>
+            <div class="footer">
+                <p>Questions about pricing? Contact our sales team.</p>
+                <p style="margin: 5px 0;">© {2025} Your Company. All rights reserved.</p>
+            </div>
+        """
+        
+        html += create_email_template(customer_content, "#42A5F5")
+        plain_text = f"Dear Customer,\n\nWe would like to inform you that there has been a price change for the product with ID {action['product_id']}. The price has changed by {price_change_percent:.2f}%. Please check our website for the updated pricing details.\n\nThank you for your continued support.\n\nBest regards,\nCustomer Service Team"
+    return html, plain_text
+
+
+def bench(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<32} {elapsed * 1000:9.1f} ms  {elapsed / N_ALERTS * 1e6:7.1f} us/alert")
+    return result
+
+
+if __name__ == "__main__":
+    actions = make_actions(N_ALERTS)
+    print(f"Rendering {N_ALERTS} alerts")
+
+    bench("per-alert, inline f-strings", lambda: [baseline_render(a)[0] for a in actions])
+    bench("per-alert, chrome re-formatted", lambda: [render_alert(a, uncached_page) for a in actions])
+    bench("per-alert, cached chrome", lambda: [render_alert(a, email_templates.page) for a in actions])
+    digest = bench("single digest, cached chrome", lambda: email_templates.page(
+        email_templates.admin_content(
+            f"{N_ALERTS} Anomalies Detected",
+            "".join(email_templates.admin_section(a, a["type"]) for a in actions)
+        )
+    ))
+    print(f"digest size: {len(digest) / 1e6:.1f} MB")
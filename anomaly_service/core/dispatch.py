@@ -0,0 +1,195 @@
+"""
+Detector Dispatch
+Routes Supabase realtime change events to the detectors that read the changed table
+"""
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .executor import ActionList, DetectorExecutor
+
+# Refit a detector's baseline from a full scan once it is older than this
+BASELINE_MAX_AGE = 600  # seconds
+
+INCREMENTAL_EVENTS = {"INSERT", "UPDATE"}
+
+
+class ChangeEvent:
+    """A single row change delivered by the Supabase realtime channel"""
+
+    def __init__(self, table: str, event_type: str,
+                 record: Optional[Dict] = None, old_record: Optional[Dict] = None):
+        self.table = table
+        self.event_type = (event_type or "").upper()
+        self.record = record or {}
+        self.old_record = old_record or {}
+
+    @classmethod
+    def from_payload(cls, payload: Any) -> Optional["ChangeEvent"]:
+        """
+        Build an event from a realtime callback payload.
+        Accepts both the python client shape ({"data": {"table", "type", "record", "old_record"}})
+        and the JS shape ({"table", "eventType", "new", "old"}). Returns None if no table is present.
+        """
+        if not isinstance(payload, dict):
+            return None
+
+        data = payload.get("data", payload)
+        table = data.get("table")
+        if not table:
+            return None
+
+        return cls(
+            table=table,
+            event_type=data.get("type") or data.get("eventType"),
+            record=data.get("record") or data.get("new"),
+            old_record=data.get("old_record") or data.get("old"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "event_type": self.event_type,
+            "record": self.record,
+            "old_record": self.old_record
+        }
+
+
+class BaselineCache:
+    """Thread-safe store of the per-detector statistics fitted by the last full scan"""
+
+    def __init__(self, max_age: float = BASELINE_MAX_AGE):
+        self.max_age = max_age
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def store(self, name: str, baseline: Dict[str, Any], max_age: Optional[float] = None):
+        """max_age overrides the default for detectors that schedule their own refits"""
+        with self._lock:
+            self._entries[name] = {
+                "baseline": baseline,
+                "fitted_at": time.time(),
+                "max_age": self.max_age if max_age is None else max_age
+            }
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return the baseline for a detector, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(name)
+        if not entry or time.time() - entry["fitted_at"] > entry["max_age"]:
+            return None
+        return entry["baseline"]
+
+    def invalidate(self, name: str):
+        with self._lock:
+            self._entries.pop(name, None)
+
+
+class Detector:
+    """Registry entry describing one anomaly detector"""
+
+    def __init__(self, name: str, tables: List[str], detect: Callable[[Any], List[Dict]],
+                 score: Callable[[pd.DataFrame, Dict], List[Dict]],
+                 to_action: Callable[[Dict], Dict]):
+        self.name = name
+        self.tables = tables
+        self.detect = detect          # full scan over a TableSnapshot, also stores a fresh baseline
+        self.score = score            # scores changed rows against a cached baseline
+        self.to_action = to_action    # anomaly -> action dict
+
+
+class DetectorDispatcher:
+    """
+    Runs every detector, or only the ones affected by a change event.
+    Each run shares one snapshot from snapshot_factory, so a table read by
+    several detectors is fetched once. The executor fetches those tables and
+    runs the detectors concurrently; actions still come back in registration
+    order, with timings attached.
+    """
+
+    def __init__(self, baselines: BaselineCache, snapshot_factory: Callable[[], Any],
+                 executor: Optional[DetectorExecutor] = None):
+        self.baselines = baselines
+        self.snapshot_factory = snapshot_factory
+        self.executor = executor or DetectorExecutor()
+        self.detectors: List[Detector] = []
+
+    def register(self, detector: Detector):
+        self.detectors.append(detector)
+
+    def detectors_for(self, table: str) -> List[Detector]:
+        return [d for d in self.detectors if table in d.tables]
+
+    def run_full(self) -> ActionList:
+        snapshot = self.snapshot_factory()
+        jobs = [(d, "full", partial(d.detect, snapshot)) for d in self.detectors]
+        return self._execute(snapshot, jobs)
+
+    def run_event(self, event: ChangeEvent) -> ActionList:
+        return self.run_events([event])
+
+    def run_events(self, events: List[ChangeEvent]) -> ActionList:
+        """
+        Run only the detectors reading a changed table.
+        Inserted/updated rows are scored together, in arrival order, against the
+        cached baseline; a missing or expired baseline falls back to a full scan
+        of that detector, which refits it. A delete drops the baseline so the
+        next run refits without the removed row.
+        """
+        snapshot = self.snapshot_factory()
+        jobs = []
+        for detector in self.detectors:
+            changed = [e for e in events if e.table in detector.tables]
+            if not changed:
+                continue
+
+            upserts = [e.record for e in changed if e.event_type in INCREMENTAL_EVENTS]
+            if len(upserts) < len(changed):
+                self.baselines.invalidate(detector.name)
+            if not upserts:
+                continue
+
+            baseline = self.baselines.get(detector.name)
+            if baseline is None:
+                jobs.append((detector, "full", partial(detector.detect, snapshot)))
+            else:
+                jobs.append((detector, "incremental", partial(detector.score, pd.DataFrame(upserts), baseline)))
+
+        return self._execute(snapshot, jobs)
+
+    def _execute(self, snapshot, jobs: List[Tuple[Detector, str, Callable]]) -> ActionList:
+        started = time.monotonic()
+
+        # I/O phase: only full scans read the snapshot
+        tables = [t for d, mode, _ in jobs if mode == "full" for t in d.tables]
+        table_timings = self.executor.prefetch(snapshot, tables)
+
+        runnable, detector_timings = [], {}
+        for detector, mode, fn in jobs:
+            failed = [t for t in detector.tables if mode == "full" and isinstance(table_timings.get(t), str)]
+            if failed:
+                # its table never arrived; running it would just block on the same fetch
+                detector_timings[detector.name] = {"mode": mode, "status": "fetch_failed", "seconds": 0.0}
+            else:
+                runnable.append((detector.name, fn))
+
+        outcomes = self.executor.run(runnable)
+
+        actions = ActionList()
+        for detector, mode, _ in jobs:
+            outcome = outcomes.get(detector.name)
+            if outcome is None:
+                continue
+            anomalies = outcome.pop("result") or []
+            actions.extend(detector.to_action(a) for a in anomalies)
+            detector_timings[detector.name] = {"mode": mode, **outcome, "anomalies": len(anomalies)}
+
+        actions.timings = {
+            "tables": table_timings,
+            "detectors": {d.name: detector_timings[d.name] for d, _, _ in jobs},
+            "total_s": round(time.monotonic() - started, 3),
+        }
+        return actions
@@ -0,0 +1,258 @@
+"""
+Email Templates
+Alert e-mail layouts as module-level str.format strings; every value put into
+the HTML is escaped, while content_html / sections are already-rendered HTML
+"""
+import functools
+from html import escape
+from typing import Any, Dict, Tuple
+
+
+# ---------- LAYOUTS ----------
+
+CHROME = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <style>
+            body {{
+                margin: 0;
+                padding: 0;
+                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+                background-color: #f5f5f5;
+            }}
+            .email-container {{
+                max-width: 600px;
+                margin: 20px auto;
+                background-color: #ffffff;
+                border-radius: 12px;
+                overflow: hidden;
+                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+            }}
+            .header {{
+                background: linear-gradient(135deg, {header_color} 0%, {header_color}dd 100%);
+                padding: 30px;
+                text-align: center;
+                color: white;
+            }}
+            .header h1 {{
+                margin: 0;
+                font-size: 24px;
+                font-weight: 600;
+            }}
+            .content {{
+                padding: 30px;
+                color: #333333;
+                line-height: 1.6;
+            }}
+            .details-box {{
+                background-color: #f8f9fa;
+                border-left: 4px solid {header_color};
+                padding: 20px;
+                margin: 20px 0;
+                border-radius: 4px;
+            }}
+            .detail-item {{
+                display: flex;
+                padding: 8px 0;
+                border-bottom: 1px solid #e9ecef;
+            }}
+            .detail-item:last-child {{
+                border-bottom: none;
+            }}
+            .detail-label {{
+                font-weight: 600;
+                color: #495057;
+                min-width: 140px;
+            }}
+            .detail-value {{
+                color: #212529;
+            }}
+            .footer {{
+                background-color: #f8f9fa;
+                padding: 20px 30px;
+                text-align: center;
+                color: #6c757d;
+                font-size: 14px;
+                border-top: 1px solid #e9ecef;
+            }}
+            .button {{
+                display: inline-block;
+                padding: 12px 24px;
+                background-color: {header_color};
+                color: white;
+                text-decoration: none;
+                border-radius: 6px;
+                margin: 20px 0;
+                font-weight: 500;
+            }}
+            .icon {{
+                font-size: 48px;
+                margin-bottom: 10px;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="email-container">
+            {content_html}
+        </div>
+    </body>
+    </html>
+    """
+
+DETAIL_ROW = """
+            <div class="detail-item">
+                <span class="detail-label">{label}:</span>
+                <span class="detail-value">{value}</span>
+            </div>
+            """
+
+ADMIN_PAGE = """
+        <div class="header">
+            <div class="icon">⚠️</div>
+            <h1>{title}</h1>
+        </div>
+        <div class="content">
+            {sections}
+        </div>
+        <div class="footer">
+            <p>This is an automated alert from your monitoring system.</p>
+            <p style="margin: 5px 0;">© 2025 Your Company. All rights reserved.</p>
+        </div>
+    """
+
+ADMIN_SECTION = """
+            <p style="font-size: 16px; color: #212529;">{message}</p>
+            <div class="details-box">
+                <h3 style="margin-top: 0; color: #495057;">{heading}</h3>
+                {details}
+            </div>
+    """
+
+DELIVERY_NOTICE = """
+            <div class="header" style="background: linear-gradient(135deg, #FFA726 0%, #FF9800 100%);">
+                <div class="icon">🚚</div>
+                <h1>Delivery Delay Notice</h1>
+            </div>
+            <div class="content">
+                <p style="font-size: 16px;">Dear Customer,</p>
+                <p>We regret to inform you that your delivery is experiencing an unexpected delay.</p>
+                <p><strong style="color: #FF6B6B;">{add_cont}</strong></p>
+                <div class="details-box">
+                    <div class="detail-item">
+                        <span class="detail-label">Order ID:</span>
+                        <span class="detail-value"><strong>{order_id}</strong></span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Delivery ID:</span>
+                        <span class="detail-value">{delivery_id}</span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Delay Duration:</span>
+                        <span class="detail-value" style="color: #FF6B6B; font-weight: 600;">{day_count} days</span>
+                    </div>
+                </div>
+                
+                <p>We sincerely apologize for the inconvenience and are working diligently to resolve this issue as quickly as possible.</p>
+                <p style="margin-top: 24px;">Thank you for your understanding.</p>
+                <p style="margin-top: 20px; color: #495057;"><strong>Best regards,</strong><br>Customer Service Team</p>
+            </div>
+            <div class="footer">
+                <p>Need assistance? Contact our support team.</p>
+                <p style="margin: 5px 0;">© 2025 Your Company. All rights reserved.</p>
+            </div>
+        """
+
+PRICE_NOTICE = """
+            <div class="header" style="background: linear-gradient(135deg, #42A5F5 0%, #1E88E5 100%);">
+                <div class="icon">💰</div>
+                <h1>Price Update Notification</h1>
+            </div>
+            <div class="content">
+                <p style="font-size: 16px;">Dear Customer,</p>
+                <p>We would like to inform you of a price change for one of our products.</p>
+                
+                <div class="details-box">
+                    <div class="detail-item">
+                        <span class="detail-label">Product ID:</span>
+                        <span class="detail-value"><strong>{product_id}</strong></span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Price Change:</span>
+                        <span class="detail-value" style="color: {change_color}; font-weight: 600; font-size: 18px;">
+                            {price_change_percent:+.2f}%
+                        </span>
+                    </div>
+                    <div class="detail-item">
+                        <span class="detail-label">Status:</span>
+                        <span class="detail-value">Price has {change_direction}</span>
+                    </div>
+                </div>
+                
+                <p>Please visit our website for complete and updated pricing details.</p>
+                <p style="margin-top: 24px;">Thank you for your continued support.</p>
+                <p style="margin-top: 20px; color: #495057;"><strong>Best regards,</strong><br>Customer Service Team</p>
+            </div>
+            <div class="footer">
+                <p>Questions about pricing? Contact our sales team.</p>
+                <p style="margin: 5px 0;">© 2025 Your Company. All rights reserved.</p>
+            </div>
+        """
+
+DELIVERY_TEXT = "Dear Customer,\n\nWe regret to inform you that your delivery with ID {delivery_id} is experiencing an abnormal delay. We apologize for the inconvenience caused and are working to resolve this issue promptly.\n\nThank you for your understanding.\n\nBest regards,\nCustomer Service Team"
+
+PRICE_TEXT = "Dear Customer,\n\nWe would like to inform you that there has been a price change for the product with ID {product_id}. The price has changed by {price_change_percent:.2f}%. Please check our website for the updated pricing details.\n\nThank you for your continued support.\n\nBest regards,\nCustomer Service Team"
+
+
+# ---------- RENDERING ----------
+
+@functools.lru_cache(maxsize=32)
+def _chrome(header_color: str) -> Tuple[str, str]:
+    # str.format rescans the whole stylesheet on every call; everything around
+    # the content depends only on the colour, so format it once per colour
+    head, tail = CHROME.format(header_color=escape(header_color), content_html="\0").split("\0")
+    return head, tail
+
+def page(content_html: str, header_color: str = "#FF6B6B") -> str:
+    """Full responsive e-mail around content_html"""
+    head, tail = _chrome(header_color)
+    return head + content_html + tail
+
+def details_html(action: Dict[str, Any]) -> str:
+    return "".join(
+        DETAIL_ROW.format(label=escape(k.replace('_', ' ').title()), value=escape(str(v)))
+        for k, v in action.items() if k != "message"
+    )
+
+def admin_section(action: Dict[str, Any], heading: str = "Details") -> str:
+    return ADMIN_SECTION.format(
+        message=escape(str(action["message"])),
+        heading=escape(heading),
+        details=details_html(action)
+    )
+
+def admin_content(title: str, sections: str) -> str:
+    return ADMIN_PAGE.format(title=escape(title), sections=sections)
+
+def delivery_notice(order_id: Any, delivery_id: Any, day_count: Any, add_cont: str = "") -> Tuple[str, str]:
+    """(content html, plain text) of the customer delivery delay notice"""
+    html = DELIVERY_NOTICE.format(
+        order_id=escape(str(order_id)),
+        delivery_id=escape(str(delivery_id)),
+        day_count=escape(str(day_count)),
+        add_cont=escape(add_cont)
+    )
+    return html, DELIVERY_TEXT.format(delivery_id=delivery_id)
+
+def price_notice(product_id: Any, price_change: float) -> Tuple[str, str]:
+    """(content html, plain text) of the customer price change notice"""
+    price_change_percent = price_change * 100
+    html = PRICE_NOTICE.format(
+        product_id=escape(str(product_id)),
+        price_change_percent=price_change_percent,
+        change_direction="increased" if price_change_percent > 0 else "decreased",
+        change_color="#FF6B6B" if price_change_percent > 0 else "#4CAF50"
+    )
+    return html, PRICE_TEXT.format(product_id=product_id, price_change_percent=price_change_percent)
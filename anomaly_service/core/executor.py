@@ -0,0 +1,106 @@
+"""
+Detector Executor
+Runs the table fetches and the detectors of one cycle concurrently, each under its own timeout
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DETECTOR_TIMEOUT = float(os.getenv("DETECTOR_TIMEOUT", 60))      # seconds per detector
+FETCH_TIMEOUT = float(os.getenv("DETECTOR_FETCH_TIMEOUT", 45))   # seconds per table
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", 8))
+
+
+class ActionList(list):
+    """The actions of a cycle, with per-table and per-detector timings in .timings"""
+
+    def __init__(self, actions: Iterable[Dict] = (), timings: Optional[Dict[str, Any]] = None):
+        super().__init__(actions)
+        self.timings = timings or {}
+
+
+class DetectorExecutor:
+    """
+    Two phases per cycle:
+    - I/O: every table some detector needs is fetched into the shared snapshot
+      in parallel, so the cycle waits for the slowest table, not the sum.
+    - Detectors: each runs in its own thread and is awaited up to `timeout`.
+
+    Python threads cannot be killed, so a detector that times out keeps running
+    in the background; its result is dropped and the detector is skipped by
+    later cycles until it finishes, so one slow table cannot pile up threads.
+    CPU-bound model fits leave the GIL to a process pool (see model_store).
+    """
+
+    def __init__(self, max_workers: int = DETECTOR_WORKERS, timeout: float = DETECTOR_TIMEOUT,
+                 fetch_timeout: float = FETCH_TIMEOUT):
+        self.timeout = timeout
+        self.fetch_timeout = fetch_timeout
+        self._fetch_pool = ThreadPoolExecutor(max_workers, thread_name_prefix="detector-fetch")
+        self._run_pool = ThreadPoolExecutor(max_workers, thread_name_prefix="detector")
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def prefetch(self, snapshot, tables: Iterable[str]) -> Dict[str, Any]:
+        """Load tables into the snapshot concurrently; returns seconds or a failure status per table."""
+        started = time.monotonic()
+        futures = {t: self._fetch_pool.submit(self._timed, snapshot.frame, t) for t in dict.fromkeys(tables)}
+
+        timings = {}
+        for table, future in futures.items():
+            remaining = max(0.0, started + self.fetch_timeout - time.monotonic())
+            try:
+                timings[table] = round(future.result(timeout=remaining)[1], 3)
+            except FutureTimeout:
+                timings[table] = "timeout"
+                print(f"⏱️ Fetching {table} exceeded {self.fetch_timeout}s")
+            except Exception as e:
+                timings[table] = "error"
+                print(f"❌ Fetching {table} failed: {e}")
+        return timings
+
+    def run(self, jobs: List[Tuple[str, Callable[[], List[Dict]]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Run (name, fn) jobs concurrently.
+        Returns {name: {"status", "seconds", "result"}}; result is None unless status is "ok".
+        """
+        started = time.monotonic()
+        futures = {}
+        outcomes: Dict[str, Dict[str, Any]] = {}
+
+        for name, fn in jobs:
+            with self._lock:
+                busy = name in self._running
+                if not busy:
+                    self._running.add(name)
+            if busy:
+                outcomes[name] = {"status": "still_running", "seconds": 0.0, "result": None}
+                continue
+            futures[name] = self._run_pool.submit(self._tracked, name, fn)
+
+        for name, future in futures.items():
+            remaining = max(0.0, started + self.timeout - time.monotonic())
+            try:
+                result, seconds = future.result(timeout=remaining)
+                outcomes[name] = {"status": "ok", "seconds": round(seconds, 3), "result": result}
+            except FutureTimeout:
+                print(f"⏱️ Detector {name} exceeded {self.timeout}s, dropping its result")
+                outcomes[name] = {"status": "timeout", "seconds": round(time.monotonic() - started, 3), "result": None}
+            except Exception as e:
+                print(f"❌ Detector {name} failed: {e}")
+                outcomes[name] = {"status": "error", "seconds": round(time.monotonic() - started, 3), "result": None}
+        return outcomes
+
+    @staticmethod
+    def _timed(fn: Callable, *args) -> Tuple[Any, float]:
+        t0 = time.monotonic()
+        return fn(*args), time.monotonic() - t0
+
+    def _tracked(self, name: str, fn: Callable) -> Tuple[Any, float]:
+        try:
+            return self._timed(fn)
+        finally:
+            with self._lock:
+                self._running.discard(name)
@@ -0,0 +1,163 @@
+"""
+Fingerprint Index
+TTL index of anomalies already recorded / alerted, so stale outliers are not re-inserted or re-emailed
+"""
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import redis
+except ImportError:  # redis is optional; the in-process index is the default
+    redis = None
+
+FINGERPRINT_TTL = int(os.getenv("ANOMALY_FINGERPRINT_TTL", 24 * 3600))  # seconds
+FINGERPRINT_REDIS_URL = os.getenv("ANOMALY_FINGERPRINT_REDIS_URL")
+# values within ~10% of each other share a bucket; a bigger move is a new anomaly
+VALUE_BUCKET_RATIO = float(os.getenv("ANOMALY_FINGERPRINT_BUCKET_RATIO", 0.1))
+
+# per anomaly type: the field(s) naming the entity and the field whose value is bucketed
+FingerprintFields = Dict[str, Tuple[Union[str, Tuple[str, ...]], Optional[str]]]
+
+
+def value_bucket(value: Any, ratio: float = VALUE_BUCKET_RATIO) -> str:
+    """Log-scale bucket of a numeric value; non-numeric values are used as they are."""
+    if value is None:
+        return "-"
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if math.isnan(x):
+        return "-"
+    if x == 0:
+        return "0"
+    sign = "+" if x > 0 else "-"
+    return f"{sign}{math.floor(math.log(abs(x)) / math.log1p(ratio))}"
+
+
+def fingerprint(kind: str, entity: Any, value: Any = None) -> str:
+    """detector type + entity id + value bucket"""
+    if isinstance(entity, tuple):
+        entity = "|".join(str(e) for e in entity)
+    return f"{kind}:{entity}:{value_bucket(value)}"
+
+
+def fingerprint_for(record: Dict[str, Any], fields: FingerprintFields) -> Optional[str]:
+    """Fingerprint of an anomaly/action dict, or None for types without a mapping."""
+    kind = record.get("type")
+    if kind not in fields:
+        return None
+    entity_fields, value_field = fields[kind]
+    if isinstance(entity_fields, str):
+        entity = record.get(entity_fields)
+    else:
+        entity = tuple(record.get(f) for f in entity_fields)
+    return fingerprint(kind, entity, record.get(value_field) if value_field else None)
+
+
+class MemoryBackend:
+    """Process-local fingerprints with expiry times"""
+
+    def __init__(self):
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if now >= self._next_purge:
+                self._expires = {k: t for k, t in self._expires.items() if t > now}
+                self._next_purge = now + 60
+            if self._expires.get(key, 0) > now:
+                return False
+            self._expires[key] = now + ttl
+            return True
+
+    def release(self, key: str):
+        with self._lock:
+            self._expires.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+
+class RedisBackend:
+    """Fingerprints shared by every process via SET NX EX"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def claim(self, key: str, ttl: float) -> bool:
+        return bool(self.client.set(f"anomaly_fp:{key}", 1, nx=True, ex=int(ttl)))
+
+    def release(self, key: str):
+        self.client.delete(f"anomaly_fp:{key}")
+
+
+def make_backend(redis_url: Optional[str] = FINGERPRINT_REDIS_URL):
+    if redis_url and redis is not None:
+        try:
+            client = redis.Redis.from_url(redis_url, socket_connect_timeout=5, socket_timeout=5)
+            client.ping()
+            print("Anomaly fingerprints: Redis backend ENABLED")
+            return RedisBackend(client)
+        except Exception as e:
+            print(f"Anomaly fingerprints: Redis unavailable, using in-process index: {e}")
+    return MemoryBackend()
+
+
+class FingerprintIndex:
+    """
+    Remembers which anomalies were already handled for `ttl` seconds.
+    claim() marks a fingerprint and says whether it was new; a caller whose
+    insert/send then fails should release() it so the next cycle retries.
+    If the Redis backend errors, the index falls back to the in-process one.
+    """
+
+    def __init__(self, namespace: str, ttl: float = FINGERPRINT_TTL, backend=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = backend if backend is not None else make_backend()
+        self._fallback = MemoryBackend()
+        self.new = 0
+        self.suppressed = 0
+
+    def _call(self, method: str, key: str, *args):
+        try:
+            return getattr(self.backend, method)(key, *args)
+        except Exception as e:
+            print(f"Anomaly fingerprints: {method} failed, using in-process index: {e}")
+            return getattr(self._fallback, method)(key, *args)
+
+    def claim(self, fp: str) -> bool:
+        fresh = self._call("claim", f"{self.namespace}:{fp}", self.ttl)
+        if fresh:
+            self.new += 1
+        else:
+            self.suppressed += 1
+        return fresh
+
+    def release(self, fp: str):
+        self._call("release", f"{self.namespace}:{fp}")
+
+    def filter_new(self, records: Iterable[Dict[str, Any]], fields: FingerprintFields) -> List[Dict[str, Any]]:
+        """Records not seen within the TTL; records without a fingerprint always pass."""
+        fresh = []
+        for record in records:
+            fp = fingerprint_for(record, fields)
+            if fp is None or self.claim(fp):
+                fresh.append(record)
+        return fresh
+
+    def release_all(self, records: Iterable[Dict[str, Any]], fields: FingerprintFields):
+        for record in records:
+            fp = fingerprint_for(record, fields)
+            if fp is not None:
+                self.release(fp)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"namespace": self.namespace, "ttl_s": self.ttl, "new": self.new, "suppressed": self.suppressed}
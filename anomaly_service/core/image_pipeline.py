@@ -0,0 +1,94 @@
+"""
+Image Pipeline
+Lazily loaded, device-aware Stable Diffusion pipeline for ad backgrounds
+"""
+import os
+import threading
+import time
+from typing import Any, Optional
+
+MODEL_ID = os.getenv("SD_MODEL_ID", "runwayml/stable-diffusion-v1-5")
+DEVICE = os.getenv("SD_DEVICE")                      # cuda / mps / cpu; autodetected when unset
+STEPS = int(os.getenv("SD_STEPS", 30))
+FAST_MODE = os.getenv("SD_FAST_MODE", "0") == "1"    # fewer denoising steps, e.g. for CPU hosts
+FAST_STEPS = int(os.getenv("SD_FAST_STEPS", 12))
+
+
+class StableDiffusionLoader:
+    """
+    The pipeline is only built on the first generate() (or an explicit load()),
+    so processes that import core.views for the detectors never import torch
+    or touch the multi-GB weights.
+
+    Device: SD_DEVICE, else CUDA, else Apple MPS, else CPU. Half precision is
+    only used on CUDA; MPS and CPU run float32, which they support reliably.
+    """
+
+    def __init__(self, model_id: str = MODEL_ID, device: Optional[str] = DEVICE,
+                 steps: int = STEPS, fast_mode: bool = FAST_MODE, fast_steps: int = FAST_STEPS):
+        self.model_id = model_id
+        self.requested_device = device
+        self.steps = steps
+        self.fast_mode = fast_mode
+        self.fast_steps = fast_steps
+
+        self.device: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._pipe = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._pipe is not None
+
+    def _select_device(self, torch) -> str:
+        if self.requested_device:
+            return self.requested_device
+        if torch.cuda.is_available():
+            return "cuda"
+        mps = getattr(torch.backends, "mps", None)
+        if mps is not None and mps.is_available():
+            return "mps"
+        return "cpu"
+
+    def load(self):
+        """Build the pipeline once; concurrent callers wait for the same load."""
+        if self._pipe is not None:
+            return self._pipe
+
+        with self._lock:
+            if self._pipe is None:
+                started = time.time()
+                import torch
+                from diffusers import StableDiffusionPipeline
+
+                device = self._select_device(torch)
+                dtype = torch.float16 if device == "cuda" else torch.float32
+
+                pipe = StableDiffusionPipeline.from_pretrained(self.model_id, torch_dtype=dtype).to(device)
+                pipe.enable_attention_slicing()
+                pipe.enable_vae_slicing()
+
+                self.device = device
+                self.load_seconds = round(time.time() - started, 1)
+                self._pipe = pipe
+                print(f"🎨 Stable Diffusion loaded on {device} ({dtype}) in {self.load_seconds}s")
+        return self._pipe
+
+    def steps_for(self, fast: Optional[bool] = None) -> int:
+        """Denoising steps generate() runs with, for fast (default: SD_FAST_MODE)."""
+        return self.fast_steps if (self.fast_mode if fast is None else fast) else self.steps
+
+    def generate(self, prompt: str, steps: Optional[int] = None, guidance_scale: float = 7.5,
+                 fast: Optional[bool] = None, **kwargs: Any):
+        """One image for prompt; fast (or SD_FAST_MODE) uses fast_steps instead of steps."""
+        pipe = self.load()
+        if steps is None:
+            steps = self.steps_for(fast)
+
+        return pipe(
+            prompt=prompt,
+            num_inference_steps=steps,
+            guidance_scale=guidance_scale,
+            **kwargs
+        ).images[0]
@@ -0,0 +1,203 @@
+"""
+Alert Outbox
+Durable queue of alert e-mails, delivered over one pooled SMTP connection with rate limiting and retries
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+OUTBOX_PATH = Path(os.getenv("ALERT_OUTBOX_PATH", Path(__file__).resolve().parent.parent / "alert_outbox.sqlite3"))
+RATE_PER_MINUTE = int(os.getenv("ALERT_RATE_PER_MINUTE", 30))
+MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", 8))
+RETRY_BASE = 30  # seconds; doubled on every failed attempt
+# a message still 'sending' this long after its claim belongs to a process that died mid-send
+CLAIM_TIMEOUT = int(os.getenv("ALERT_CLAIM_TIMEOUT", 600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    text_body TEXT NOT NULL,
+    html_body TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    from_email TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    claimed_at REAL
+)
+"""
+
+
+class RateLimiter:
+    """Token bucket: `rate_per_minute` sends, with bursts up to one minute's worth"""
+
+    def __init__(self, rate_per_minute: int = RATE_PER_MINUTE):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n: int) -> int:
+        """Take up to n tokens; returns how many were granted."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            granted = min(n, int(self.tokens))
+            self.tokens -= granted
+            return granted
+
+
+class AlertOutbox:
+    """
+    Alerts are written to a SQLite queue before any SMTP work, so a crash or an
+    SMTP outage never loses them. flush() delivers due messages over a single
+    connection, within the rate limit; failures are retried with exponential
+    backoff and kept as 'dead' after max_attempts for inspection. Several
+    processes may share the queue: a claim is one atomic UPDATE, and a claim
+    older than claim_timeout is taken to be abandoned and is sent again.
+    """
+
+    def __init__(self, path: Path = OUTBOX_PATH, rate_limiter: Optional[RateLimiter] = None,
+                 max_attempts: int = MAX_ATTEMPTS, connection_factory=get_connection,
+                 claim_timeout: int = CLAIM_TIMEOUT):
+        self.path = Path(path)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_attempts = max_attempts
+        self.connection_factory = connection_factory
+        self.claim_timeout = claim_timeout
+        self._flush_lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._db() as db:
+            db.execute(SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(outbox)")}
+            if "claimed_at" not in columns:   # outbox created before claims were timestamped
+                db.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def enqueue(self, subject: str, text_body: str, html_body: str, recipients: List[str],
+                from_email: Optional[str] = None):
+        now = time.time()
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO outbox (subject, text_body, html_body, recipients, from_email, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (subject, text_body, html_body, json.dumps(recipients), from_email, now, now)
+            )
+
+    def _claim_due(self, limit: int) -> List[tuple]:
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._db() as db:
+            # the status check in the outer WHERE makes the claim atomic: a row
+            # another process claimed in between is not returned twice
+            rows = db.execute(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? "
+                "WHERE id IN (SELECT id FROM outbox WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?) AND status = 'queued' "
+                "RETURNING id, subject, text_body, html_body, recipients, from_email, attempts",
+                (now, now, limit)
+            ).fetchall()
+        return sorted(rows)
+
+    def _requeue_stale(self):
+        """Messages claimed by a process that died mid-send go out again."""
+        with self._db() as db:
+            db.execute(
+                "UPDATE outbox SET status = 'queued', claimed_at = NULL "
+                "WHERE status = 'sending' AND (claimed_at IS NULL OR claimed_at < ?)",
+                (time.time() - self.claim_timeout,)
+            )
+
+    def _due_count(self) -> int:
+        self._requeue_stale()
+        with self._db() as db:
+            return db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status = 'queued' AND next_attempt_at <= ?", (time.time(),)
+            ).fetchone()[0]
+
+    def flush(self) -> Dict[str, int]:
+        """Deliver whatever is due and allowed by the rate limit."""
+        with self._flush_lock:
+            due = self._due_count()
+            if not due:
+                return {"sent": 0, "failed": 0, "deferred": 0}
+
+            granted = self.rate_limiter.take(due)
+            rows = self._claim_due(granted)
+            sent = failed = 0
+
+            if rows:
+                try:
+                    connection = self.connection_factory()
+                    connection.open()
+                except Exception as e:
+                    self._failed([r[0] for r in rows], {r[0]: r[6] for r in rows}, e)
+                    return {"sent": 0, "failed": len(rows), "deferred": due - len(rows)}
+
+                try:
+                    for row_id, subject, text_body, html_body, recipients, from_email, attempts in rows:
+                        msg = EmailMultiAlternatives(
+                            subject=subject,
+                            body=text_body,
+                            from_email=from_email,
+                            to=json.loads(recipients),
+                            connection=connection
+                        )
+                        msg.attach_alternative(html_body, "text/html")
+                        try:
+                            # one message per call so a rejected recipient fails only its own alert
+                            connection.send_messages([msg])
+                            self._sent(row_id)
+                            sent += 1
+                        except Exception as e:
+                            self._failed([row_id], {row_id: attempts}, e)
+                            failed += 1
+                finally:
+                    connection.close()
+
+            return {"sent": sent, "failed": failed, "deferred": due - len(rows)}
+
+    def _sent(self, row_id: int):
+        with self._db() as db:
+            db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+
+    def _failed(self, row_ids: List[int], attempts: Dict[int, int], error: Exception):
+        print(f"❌ Alert delivery failed for {len(row_ids)} message(s): {error}")
+        now = time.time()
+        with self._db() as db:
+            for row_id in row_ids:
+                tries = attempts[row_id] + 1
+                status = "dead" if tries >= self.max_attempts else "queued"
+                delay = RETRY_BASE * 2 ** (tries - 1) * random.uniform(0.8, 1.2)
+                db.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (status, tries, now + delay, str(error)[:500], row_id)
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return {"queued": counts.get("queued", 0), "sending": counts.get("sending", 0), "dead": counts.get("dead", 0)}
@@ -0,0 +1,207 @@
+"""
+Poster Renderer
+One diffusion background per category and brand, cached on disk and cropped or padded into every ad format,
+plus the cached fonts, logos and QR codes overlaid on it
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import qrcode
+from PIL import Image, ImageFilter, ImageFont
+
+POSTER_FORMATS: Dict[str, Tuple[int, int]] = {
+    "square": (1024, 1024),
+    "portrait": (1024, 1350),
+    "landscape": (1350, 1024)
+}
+
+BACKGROUND_CACHE_DIR = Path(os.getenv(
+    "AD_BACKGROUND_CACHE_DIR", Path(__file__).resolve().parent.parent / "ad_backgrounds"
+))
+# Crop away at most this share of the base image; wider aspect changes are padded instead
+MAX_CROP = float(os.getenv("AD_MAX_CROP", 0.25))
+QR_CACHE_SIZE = int(os.getenv("AD_QR_CACHE_SIZE", 512))
+# generations of one key are serialised on one of these; memory stays fixed however large the catalogue
+LOCK_STRIPES = 64
+
+
+def background_key(category: str, brand: str, prompt: str, steps: Optional[int] = None) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    # a low-step (fast mode) background must not be reused where full quality is asked for
+    raw = f"{category}\0{brand}\0{prompt_hash}\0{steps}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class BackgroundCache:
+    """PNG backgrounds on disk, keyed by (category, brand, prompt hash, steps)"""
+
+    def __init__(self, cache_dir: Path = BACKGROUND_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.png"
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        path = self._path(key)
+        try:
+            with Image.open(path) as img:
+                img.load()
+                self.hits += 1
+                return img.convert("RGB")
+        except (FileNotFoundError, OSError):
+            self.misses += 1
+            return None
+
+    def put(self, key: str, img: Image.Image):
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        img.save(tmp, format="PNG")
+        os.replace(tmp, path)
+
+
+def _salient_offset(energy: np.ndarray, window: int) -> int:
+    """Start of the `window`-long span holding the most edge energy."""
+    if window >= len(energy):
+        return 0
+    csum = np.concatenate(([0.0], np.cumsum(energy)))
+    sums = csum[window:] - csum[:-window]
+    return int(np.argmax(sums))
+
+
+def smart_crop(img: Image.Image, aspect: float) -> Image.Image:
+    """Crop to aspect (w / h), keeping the region with the most detail."""
+    w, h = img.size
+    edges = np.asarray(img.convert("L").filter(ImageFilter.FIND_EDGES), dtype=np.float32)
+
+    if w / h > aspect:
+        crop_w = max(1, round(h * aspect))
+        left = _salient_offset(edges.sum(axis=0), crop_w)
+        return img.crop((left, 0, left + crop_w, h))
+
+    crop_h = max(1, round(w / aspect))
+    top = _salient_offset(edges.sum(axis=1), crop_h)
+    return img.crop((0, top, w, top + crop_h))
+
+
+def pad_to(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """Fit img inside size over a blurred, stretched copy of itself (no outpainting)."""
+    target_w, target_h = size
+    canvas = img.resize(size).filter(ImageFilter.GaussianBlur(radius=max(size) // 40))
+
+    scale = min(target_w / img.width, target_h / img.height)
+    inner = img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+    canvas.paste(inner, ((target_w - inner.width) // 2, (target_h - inner.height) // 2))
+    return canvas
+
+
+def fit_format(img: Image.Image, size: Tuple[int, int], max_crop: float = MAX_CROP) -> Image.Image:
+    """Derive one poster format: smart crop when little is lost, blurred padding otherwise."""
+    target_aspect = size[0] / size[1]
+    aspect = img.width / img.height
+    lost = 1 - min(aspect, target_aspect) / max(aspect, target_aspect)
+
+    if lost <= max_crop:
+        return smart_crop(img, target_aspect).resize(size, Image.LANCZOS)
+    return pad_to(img, size)
+
+
+class PosterRenderer:
+    """
+    Generates one base background per (category, brand, prompt, steps) and
+    derives every format from it, instead of running the diffusion pipeline
+    once per format. The prompt should describe the category and brand only,
+    the product name belongs in the overlay: backgrounds are kept on disk, so
+    re-advertising a product, or a sibling SKU, skips generation entirely.
+    """
+
+    def __init__(self, generate: Callable[[str, Optional[int]], Image.Image], cache: Optional[BackgroundCache] = None,
+                 formats: Dict[str, Tuple[int, int]] = POSTER_FORMATS):
+        self.generate = generate
+        self.cache = cache or BackgroundCache()
+        self.formats = formats
+        self._locks = tuple(threading.Lock() for _ in range(LOCK_STRIPES))
+
+    def _lock(self, key: str) -> threading.Lock:
+        # the key is a hex digest, so its prefix is already evenly spread
+        return self._locks[int(key[:8], 16) % len(self._locks)]
+
+    def background(self, prompt: str, category: str, brand: str, steps: Optional[int] = None) -> Image.Image:
+        key = background_key(category, brand, prompt, steps)
+        # two inserts for the same brand and category generate once
+        with self._lock(key):
+            img = self.cache.get(key)
+            if img is None:
+                img = self.generate(prompt, steps).convert("RGB")
+                self.cache.put(key, img)
+                print(f"🎨 Generated background {key}")
+            else:
+                print(f"♻️ Reusing cached background {key}")
+        return img
+
+    def render(self, prompt: str, category: str, brand: str, steps: Optional[int] = None) -> Dict[str, Image.Image]:
+        base = self.background(prompt, category, brand, steps)
+        return {name: fit_format(base, size) for name, size in self.formats.items()}
+
+
+class AssetCache:
+    """
+    Overlay assets shared by every poster: fonts by (path, size), logos by
+    (brand, size) and QR codes by URL, the latter bounded as an LRU since every
+    product has its own. Cached images are only ever pasted, never modified.
+    """
+
+    def __init__(self, qr_cache_size: int = QR_CACHE_SIZE):
+        self.qr_cache_size = qr_cache_size
+        self._logos: Dict[Tuple[str, Tuple[int, int]], Image.Image] = {}
+        self._qr: "OrderedDict[Tuple[str, int], Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def font(path: str, size: int) -> ImageFont.FreeTypeFont:
+        return ImageFont.truetype(path, size)
+
+    def logo(self, brand: str, logo_path: Optional[str], size: Tuple[int, int] = (220, 220)) -> Optional[Image.Image]:
+        key = (brand, size)
+        with self._lock:
+            cached = self._logos.get(key)
+        if cached is not None:
+            return cached
+        # a missing logo is not cached, so one dropped into logos/ later is picked up
+        if not logo_path or not os.path.exists(logo_path):
+            return None
+
+        with Image.open(logo_path) as src:
+            logo = src.convert("RGBA").resize(size)
+        with self._lock:
+            self._logos[key] = logo
+        return logo
+
+    def qr(self, url: str, size: int = 220) -> Image.Image:
+        key = (url, size)
+        with self._lock:
+            cached = self._qr.get(key)
+            if cached is not None:
+                self._qr.move_to_end(key)
+                return cached
+
+        img = qrcode.make(url).resize((size, size))
+        with self._lock:
+            self._qr[key] = img
+            while len(self._qr) > self.qr_cache_size:
+                self._qr.popitem(last=False)
+        return img
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def color_wash(size: Tuple[int, int], color: Tuple[int, ...]) -> Image.Image:
+        return Image.new("RGBA", size, tuple(color) + (90,))
@@ -0,0 +1,361 @@
+"""
+Streaming Quantiles
+Incrementally maintained quantile / median / MAD statistics for the robust detectors
+"""
+import bisect
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from common.model_store import MODEL_DIR
+
+# Up to this many values are kept exactly; beyond it the sketch becomes a t-digest
+EXACT_LIMIT = int(os.getenv("QUANTILE_EXACT_LIMIT", 50_000))
+DIGEST_COMPRESSION = 200
+SAVE_INTERVAL = 30  # seconds between incremental saves of the same sketch
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl). Memory and query cost depend only on the
+    compression, not on how many values were added.
+    """
+
+    def __init__(self, compression: float = DIGEST_COMPRESSION):
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[float] = []
+
+    def add(self, x: float):
+        self._buffer.append(x)
+        self.count += 1
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def _k(self, q: float) -> float:
+        # k1 scale function: small centroids at the tails, large ones near the median
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + [(x, 1.0) for x in self._buffer])
+        self._buffer = []
+
+        means, weights = [points[0][0]], [points[0][1]]
+        seen = 0.0
+        k_left = self._k(0.0)
+        for mean, weight in points[1:]:
+            q_right = (seen + weights[-1] + weight) / self.count
+            if self._k(q_right) - k_left <= 1:
+                total = weights[-1] + weight
+                means[-1] += (mean - means[-1]) * weight / total
+                weights[-1] = total
+            else:
+                seen += weights[-1]
+                k_left = self._k(seen / self.count)
+                means.append(mean)
+                weights.append(weight)
+
+        self.means, self.weights = means, weights
+
+    def _centers(self) -> List[float]:
+        centers, seen = [], 0.0
+        for w in self.weights:
+            centers.append(seen + w / 2)
+            seen += w
+        return centers
+
+    def quantile(self, q: float) -> float:
+        self._compress()
+        if not self.means:
+            return math.nan
+        target = q * self.count
+        centers = self._centers()
+
+        if target <= centers[0]:
+            return _lerp(0.0, self.min, centers[0], self.means[0], target)
+        if target >= centers[-1]:
+            return _lerp(centers[-1], self.means[-1], self.count, self.max, target)
+
+        i = bisect.bisect_right(centers, target) - 1
+        return _lerp(centers[i], self.means[i], centers[i + 1], self.means[i + 1], target)
+
+    def cdf(self, x: float) -> float:
+        self._compress()
+        if not self.means or x < self.min:
+            return 0.0
+        if x >= self.max:
+            return 1.0
+        centers = self._centers()
+
+        if x <= self.means[0]:
+            return _lerp(self.min, 0.0, self.means[0], centers[0], x) / self.count
+        if x >= self.means[-1]:
+            return _lerp(self.means[-1], centers[-1], self.max, self.count, x) / self.count
+
+        i = bisect.bisect_right(self.means, x) - 1
+        return _lerp(self.means[i], centers[i], self.means[i + 1], centers[i + 1], x) / self.count
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "means": self.means,
+            "weights": self.weights,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "TDigest":
+        digest = cls(state["compression"])
+        digest.means, digest.weights = state["means"], state["weights"]
+        digest.count, digest.min, digest.max = state["count"], state["min"], state["max"]
+        return digest
+
+
+def _lerp(x0: float, y0: float, x1: float, y1: float, x: float) -> float:
+    if x1 == x0:
+        return y0
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+class RunningQuantiles:
+    """
+    Quantiles, median and MAD of a stream of values, updated one value at a time.
+
+    Small streams keep a sorted list, which gives the same answers as
+    np.percentile / Series.median (linear interpolation) and supports remove().
+    Once a stream outgrows exact_limit it is folded into a t-digest; from then on
+    results are approximate and remove() is a no-op until the next full refit.
+    Results are cached between updates, so repeated queries are O(1).
+    """
+
+    def __init__(self, values: Iterable[float] = (), exact_limit: int = EXACT_LIMIT):
+        self.exact_limit = exact_limit
+        self.values: Optional[List[float]] = sorted(float(v) for v in values)
+        self.digest: Optional[TDigest] = None
+        self._cache: Dict[Any, float] = {}
+        if len(self.values) > exact_limit:
+            self._to_digest()
+
+    @property
+    def exact(self) -> bool:
+        return self.digest is None
+
+    def __len__(self) -> int:
+        return len(self.values) if self.exact else int(self.digest.count)
+
+    def _to_digest(self):
+        self.digest = TDigest()
+        for v in self.values:
+            self.digest.add(v)
+        self.values = None
+
+    def add(self, x: float):
+        self._cache.clear()
+        if self.exact:
+            bisect.insort(self.values, float(x))
+            if len(self.values) > self.exact_limit:
+                self._to_digest()
+        else:
+            self.digest.add(float(x))
+
+    def remove(self, x: float):
+        if not self.exact:
+            return
+        i = bisect.bisect_left(self.values, float(x))
+        if i < len(self.values) and self.values[i] == float(x):
+            self.values.pop(i)
+            self._cache.clear()
+
+    def quantile(self, q: float) -> float:
+        key = ("q", q)
+        if key not in self._cache:
+            self._cache[key] = self._exact_quantile(q) if self.exact else self.digest.quantile(q)
+        return self._cache[key]
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    def mad(self) -> float:
+        """Median absolute deviation from the median (unscaled, like the pandas version it replaces)."""
+        if "mad" not in self._cache:
+            self._cache["mad"] = self._exact_mad() if self.exact else self._digest_mad()
+        return self._cache["mad"]
+
+    def _exact_quantile(self, q: float) -> float:
+        n = len(self.values)
+        if not n:
+            return math.nan
+        pos = q * (n - 1)
+        lo = int(math.floor(pos))
+        hi = min(lo + 1, n - 1)
+        return self.values[lo] + (self.values[hi] - self.values[lo]) * (pos - lo)
+
+    def _exact_mad(self) -> float:
+        n = len(self.values)
+        if not n:
+            return math.nan
+        m = self.median()
+        if n % 2:
+            return self._kth_distance(m, n // 2)
+        return (self._kth_distance(m, n // 2 - 1) + self._kth_distance(m, n // 2)) / 2
+
+    def _kth_distance(self, m: float, k: int) -> float:
+        """
+        k-th smallest |x - m| (0-based) in O(log n): the distances below and above
+        the median form two sorted sequences, so this is k-th of two sorted arrays.
+        """
+        v = self.values
+        p = bisect.bisect_left(v, m)
+        la, lb = p, len(v) - p
+
+        def a(i):  # distances of values below m, ascending
+            return m - v[p - 1 - i]
+
+        def b(j):  # distances of values at/above m, ascending
+            return v[p + j] - m
+
+        take = k + 1
+        lo, hi = max(0, take - lb), min(take, la)
+        while lo <= hi:
+            i = (lo + hi) // 2
+            j = take - i
+            a_left = a(i - 1) if i > 0 else -math.inf
+            a_right = a(i) if i < la else math.inf
+            b_left = b(j - 1) if j > 0 else -math.inf
+            b_right = b(j) if j < lb else math.inf
+
+            if a_left > b_right:
+                hi = i - 1
+            elif b_left > a_right:
+                lo = i + 1
+            else:
+                return max(a_left, b_left)
+        return math.nan
+
+    def _digest_mad(self) -> float:
+        # smallest d with half the mass inside [m - d, m + d]; bisection on the digest CDF
+        m = self.median()
+        lo, hi = 0.0, max(self.digest.max - m, m - self.digest.min, 0.0)
+        for _ in range(60):
+            mid = (lo + hi) / 2
+            if self.digest.cdf(m + mid) - self.digest.cdf(m - mid) < 0.5:
+                lo = mid
+            else:
+                hi = mid
+        return hi
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.exact:
+            return {"mode": "exact", "exact_limit": self.exact_limit, "values": self.values}
+        return {"mode": "digest", "exact_limit": self.exact_limit, "digest": self.digest.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "RunningQuantiles":
+        sketch = cls(exact_limit=state["exact_limit"])
+        if state["mode"] == "exact":
+            sketch.values = state["values"]
+        else:
+            sketch.values = None
+            sketch.digest = TDigest.from_dict(state["digest"])
+        return sketch
+
+
+class KeyedQuantiles:
+    """
+    RunningQuantiles over rows identified by a key (primary key of the table).
+    Upserting a key replaces its previous value, so an UPDATE event moves a
+    value instead of counting the row twice. Keys are only tracked while the
+    sketch is exact; a t-digest cannot forget values anyway.
+    """
+
+    def __init__(self, items: Iterable = (), exact_limit: int = EXACT_LIMIT):
+        items = [(k, float(v)) for k, v in items if v is not None and not math.isnan(v)]
+        self.sketch = RunningQuantiles((v for _, v in items), exact_limit=exact_limit)
+        self.by_key: Dict[Any, float] = dict(items) if self.sketch.exact else {}
+
+    def __len__(self) -> int:
+        return len(self.sketch)
+
+    def upsert(self, key: Any, value: Optional[float]):
+        """Set a row's value; None / NaN removes the row from the sketch."""
+        old = self.by_key.pop(key, None)
+        if old is not None:
+            self.sketch.remove(old)
+        if value is None or math.isnan(value):
+            return
+
+        self.sketch.add(value)
+        if self.sketch.exact:
+            self.by_key[key] = float(value)
+        else:
+            self.by_key = {}
+
+    def quantile(self, q: float) -> float:
+        return self.sketch.quantile(q)
+
+    def median(self) -> float:
+        return self.sketch.median()
+
+    def mad(self) -> float:
+        return self.sketch.mad()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sketch": self.sketch.to_dict(), "keys": list(self.by_key.items())}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "KeyedQuantiles":
+        keyed = cls()
+        keyed.sketch = RunningQuantiles.from_dict(state["sketch"])
+        keyed.by_key = {k: v for k, v in state["keys"]}
+        return keyed
+
+
+class SketchStore:
+    """JSON persistence for detector sketches, so thresholds survive restarts"""
+
+    def __init__(self, model_dir: Path = MODEL_DIR, save_interval: float = SAVE_INTERVAL):
+        self.model_dir = Path(model_dir)
+        self.save_interval = save_interval
+        self._last_saved: Dict[str, float] = {}
+
+    def _path(self, name: str) -> Path:
+        return self.model_dir / f"{name}.sketch.json"
+
+    def save(self, name: str, state: Dict[str, Any], force: bool = False):
+        """Write a detector's state; incremental saves are throttled unless forced."""
+        now = time.time()
+        if not force and now - self._last_saved.get(name, 0) < self.save_interval:
+            return
+        self._last_saved[name] = now
+
+        try:
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self._path(name).with_suffix(".tmp")
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, self._path(name))
+        except Exception as e:
+            print(f"Sketch store: could not save {name}: {e}")
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        path = self._path(name)
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text())
+        except Exception as e:
+            print(f"Sketch store: could not load {name}: {e}")
+            return None
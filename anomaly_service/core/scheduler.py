@@ -0,0 +1,118 @@
+"""
+Detection Scheduler
+Debounced, single-flight execution of detection runs for the realtime listeners
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+DEFAULT_WINDOW = 0.5        # seconds to keep coalescing after the first event
+DEFAULT_MAX_PENDING = 1000  # queued events before backpressure kicks in
+
+
+class DetectionScheduler:
+    """
+    Coalesces realtime events into batches and runs them one at a time.
+
+    - The first event of a batch opens a coalescing window; everything that
+      arrives within it is handed to `run` together.
+    - Only one run is in flight. Events arriving meanwhile queue up and form
+      the single pending batch that runs next.
+    - The queue is bounded. When it is full, new events are dropped and the
+      next run is a full rescan (`run(None)`), so no change goes undetected.
+    """
+
+    def __init__(self, run: Callable[[Optional[List[Any]]], Awaitable[Any]],
+                 window: float = DEFAULT_WINDOW, max_pending: int = DEFAULT_MAX_PENDING):
+        self.run = run
+        self.window = window
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._overflowed = False
+        self._pending_since: Optional[float] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.in_flight = False
+        self.events_received = 0
+        self.events_dropped = 0
+        self.batches_run = 0
+        self.full_rescans = 0
+        self.last_batch_size = 0
+        self.last_lag_s = 0.0
+        self.max_lag_s = 0.0
+        self.last_run_s = 0.0
+
+    def start(self) -> asyncio.Task:
+        """Start the worker; must be called from inside the running event loop."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._loop())
+        return self._worker
+
+    def submit(self, payload: Any):
+        """Enqueue an event without blocking; safe to call from a sync realtime callback."""
+        self.events_received += 1
+        now = time.monotonic()
+        try:
+            self.queue.put_nowait((now, payload))
+            if self._pending_since is None:
+                self._pending_since = now
+        except asyncio.QueueFull:
+            self.events_dropped += 1
+            self._overflowed = True
+
+    def metrics(self) -> Dict[str, Any]:
+        oldest_lag = 0.0
+        if self._pending_since is not None:
+            oldest_lag = time.monotonic() - self._pending_since
+
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "oldest_event_lag_s": round(oldest_lag, 3),
+            "in_flight": self.in_flight,
+            "events_received": self.events_received,
+            "events_dropped": self.events_dropped,
+            "batches_run": self.batches_run,
+            "full_rescans": self.full_rescans,
+            "last_batch_size": self.last_batch_size,
+            "last_lag_s": round(self.last_lag_s, 3),
+            "max_lag_s": round(self.max_lag_s, 3),
+            "last_run_s": round(self.last_run_s, 3),
+        }
+
+    def _drain(self) -> List[Any]:
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+    async def _loop(self):
+        while True:
+            first = await self.queue.get()
+
+            # coalescing window: let the burst land before running
+            if self.window > 0:
+                await asyncio.sleep(self.window)
+            items = [first] + self._drain()
+            self._pending_since = None
+
+            batch = [payload for _, payload in items]
+            if self._overflowed:
+                # events were dropped; only a full rescan is guaranteed to see them
+                self._overflowed = False
+                self.full_rescans += 1
+                batch = None
+
+            self.last_batch_size = len(items)
+            self.last_lag_s = time.monotonic() - items[0][0]
+            self.max_lag_s = max(self.max_lag_s, self.last_lag_s)
+
+            self.in_flight = True
+            started = time.monotonic()
+            try:
+                await self.run(batch)
+            except Exception as e:
+                print(f"❌ Detection run failed: {e}")
+            finally:
+                self.in_flight = False
+                self.last_run_s = time.monotonic() - started
+                self.batches_run += 1
@@ -4,13 +4,10 @@ from xmlrpc import client
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from sklearn.ensemble import IsolationForest
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from supabase import create_client, Client
 from django.core.mail import EmailMultiAlternatives
 from email.mime.image import MIMEImage
-import requests
 from django.core.mail import send_mail
 from django.core.mail import EmailMultiAlternatives
 
@@ -22,28 +19,28 @@ from email.mime.multipart import MIMEMultipart
 from django.core.mail import get_connection
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
-import torch
-from diffusers import StableDiffusionPipeline
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
-import os
-pipe = StableDiffusionPipeline.from_pretrained(
-    "runwayml/stable-diffusion-v1-5",
-    torch_dtype=torch.float16
-).to("cuda")
-
-pipe.enable_attention_slicing()
-pipe.enable_vae_slicing()
+from PIL import ImageDraw
+from django.conf import settings
+from common.snapshot import TableSnapshot
+from common.supabase_rest import fetch_frame, fetch_records
+from common.supabase_pool import get_client, http_client, rest_headers
+from common.model_store import IsolationForestStore
+from .dispatch import BaselineCache, ChangeEvent, Detector, DetectorDispatcher
+from .quantiles import KeyedQuantiles, SketchStore
+from .fingerprints import FingerprintIndex
+from .outbox import AlertOutbox
+from . import email_templates
+from .image_pipeline import StableDiffusionLoader
+from .posters import AssetCache, PosterRenderer
+
+# Built on the first ad render, so detector-only processes never load torch
+image_pipeline = StableDiffusionLoader()
 # --- Configuration ---
 SUPABASE_URL = "<SUPABASE_URL>"
 SUPABASE_KEY = "<SUPABASE_APIKEY>"
 
 
-headers = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
+headers = rest_headers(SUPABASE_KEY)
 
 
     
@@ -55,7 +52,7 @@ def fetch_supabase_last_row(table):
         "limit": 1
     }
     try:
-        res = requests.get(url, headers=headers, params=params)
+        res = http_client().get(url, headers=headers, params=params)
         res.raise_for_status()
         data = res.json()
         return data[0] if data else None
@@ -72,7 +69,7 @@ def fetch_latest_price_for_product(product_id):
         "limit": 1
     }
     try:
-        res = requests.get(url, headers=headers, params=params)
+        res = http_client().get(url, headers=headers, params=params)
         res.raise_for_status()
         data = res.json()
         return data[0] if data else None
@@ -80,12 +77,13 @@ def fetch_latest_price_for_product(product_id):
         print(f"Error fetching price: {e}")
         return None
 
-def generate_background(prompt):
-    return pipe(
-        prompt=prompt,
-        num_inference_steps=30,
-        guidance_scale=7.5
-    ).images[0]
+def generate_background(prompt, steps=None):
+    return image_pipeline.generate(prompt, steps=steps, guidance_scale=7.5)
+
+# one background per category and brand, cropped/padded into every format and cached on disk
+poster_renderer = PosterRenderer(generate_background)
+# fonts, logos and QR codes are read/rendered once, not per poster
+ad_assets = AssetCache()
 
 
 def add_overlay_elements(
@@ -101,15 +99,15 @@ def add_overlay_elements(
     draw = ImageDraw.Draw(img)
 
     # fonts (change path if needed)
-    title_font = ImageFont.truetype("arialbd.ttf", 80)
-    subtitle_font = ImageFont.truetype("arial.ttf", 50)
-    price_font = ImageFont.truetype("arialbd.ttf", 65)
-    small_font = ImageFont.truetype("arial.ttf", 40)
+    title_font = ad_assets.font("arialbd.ttf", 80)
+    subtitle_font = ad_assets.font("arial.ttf", 50)
+    price_font = ad_assets.font("arialbd.ttf", 65)
+    small_font = ad_assets.font("arial.ttf", 40)
 
     w, h = img.size
 
     # brand color wash
-    color_layer = Image.new("RGBA", img.size, brand_color + (90,))
+    color_layer = ad_assets.color_wash(img.size, tuple(brand_color))
     img.paste(color_layer, (0, 0), color_layer)
 
     # Product title
@@ -123,20 +121,27 @@ def add_overlay_elements(
 
 
     # logo
-    if logo_path and os.path.exists(logo_path):
-        logo = Image.open(logo_path).convert("RGBA")
-        logo = logo.resize((220, 220))
+    logo = ad_assets.logo(brand, logo_path)
+    if logo is not None:
         img.paste(logo, (w - 300, h - 300), logo)
 
     # QR code
     if qr_url:
-        qr = qrcode.make(qr_url)
-        qr = qr.resize((220, 220))
+        qr = ad_assets.qr(qr_url)
         img.paste(qr, (80, h - 340))
 
     return img
 
 
+def add_overlay_batch(posters):
+    """
+    Overlay many posters in one pass, e.g. a catalogue launch.
+    posters: dicts of add_overlay_elements keyword arguments; every poster shares
+    the cached fonts, logos and QR codes, so only the drawing is repeated.
+    """
+    return [add_overlay_elements(**poster) for poster in posters]
+
+
 
 def automate_ad():
 
@@ -149,8 +154,9 @@ def automate_ad():
     latest_price_row = fetch_latest_price_for_product(product_id)
     latest_price = latest_price_row["price"] if latest_price_row else 999
 
+    # category and brand only: sibling SKUs share the background, the product name is in the overlay
     base_prompt = (
-        f"Luxury commercial advertising poster background for {product['product_name']} "
+        f"Luxury commercial advertising poster background "
         f"in category {product['sub_category']} for brand {product['brand']}. "
         f"Product hero lighting, studio photography, black or dark premium background, "
         f"glow edges, reflections, cinematic shadows, minimal layout space for typography, "
@@ -158,27 +164,24 @@ def automate_ad():
     ) 
 
     try:
-        # ---- generate three formats ----
-        sizes = {
-            "square": (1024, 1024),
-            "portrait": (1024, 1350),
-            "landscape": (1350, 1024)
-        }
-
-        for name, size in sizes.items():
-            bg = generate_background(base_prompt)
-            bg = bg.resize(size)
-
-            final = add_overlay_elements(
-                bg,
-                product["product_name"],
-                product["brand"],
-                latest_price,
-                logo_path=f"logos/{product['brand']}.png",
-                qr_url=f"https://yourshop.com/product/{product_id}",
-                brand_color=(0, 0, 0)
-            )
+        # ---- one background, three formats ----
+        formats = poster_renderer.render(base_prompt, product["sub_category"], product["brand"],
+                                         steps=image_pipeline.steps_for())
+
+        finals = add_overlay_batch([
+            {
+                "img": bg,
+                "product_name": product["product_name"],
+                "brand": product["brand"],
+                "price": latest_price,
+                "logo_path": f"logos/{product['brand']}.png",
+                "qr_url": f"https://yourshop.com/product/{product_id}",
+                "brand_color": (0, 0, 0)
+            }
+            for bg in formats.values()
+        ])
 
+        for name, final in zip(formats, finals):
             out = f"ad_{product_id}_{name}.png"
             final.save(out)
             print(f"✅ generated {out}")
@@ -236,119 +239,79 @@ def send_html_email(subject, text_body, html_body, to):
 
 def create_email_template(content_html, header_color="#FF6B6B"):
     """Create a responsive email template with modern styling"""
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>
-            body {{
-                margin: 0;
-                padding: 0;
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                background-color: #f5f5f5;
-            }}
-            .email-container {{
-                max-width: 600px;
-                margin: 20px auto;
-                background-color: #ffffff;
-                border-radius: 12px;
-                overflow: hidden;
-                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            }}
-            .header {{
-                background: linear-gradient(135deg, {header_color} 0%, {header_color}dd 100%);
-                padding: 30px;
-                text-align: center;
-                color: white;
-            }}
-            .header h1 {{
-                margin: 0;
-                font-size: 24px;
-                font-weight: 600;
-            }}
-            .content {{
-                padding: 30px;
-                color: #333333;
-                line-height: 1.6;
-            }}
-            .details-box {{
-                background-color: #f8f9fa;
-                border-left: 4px solid {header_color};
-                padding: 20px;
-                margin: 20px 0;
-                border-radius: 4px;
-            }}
-            .detail-item {{
-                display: flex;
-                padding: 8px 0;
-                border-bottom: 1px solid #e9ecef;
-            }}
-            .detail-item:last-child {{
-                border-bottom: none;
-            }}
-            .detail-label {{
-                font-weight: 600;
-                color: #495057;
-                min-width: 140px;
-            }}
-            .detail-value {{
-                color: #212529;
-            }}
-            .footer {{
-                background-color: #f8f9fa;
-                padding: 20px 30px;
-                text-align: center;
-                color: #6c757d;
-                font-size: 14px;
-                border-top: 1px solid #e9ecef;
-            }}
-            .button {{
-                display: inline-block;
-                padding: 12px 24px;
-                background-color: {header_color};
-                color: white;
-                text-decoration: none;
-                border-radius: 6px;
-                margin: 20px 0;
-                font-weight: 500;
-            }}
-            .icon {{
-                font-size: 48px;
-                margin-bottom: 10px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="email-container">
-            {content_html}
-        </div>
-    </body>
-    </html>
-    """
+    # the styled chrome is rendered once per colour and cached (see email_templates)
+    return email_templates.page(content_html, header_color)
 
 
 
 
 
-def fetch_supabase(table):
-    url = f"{SUPABASE_URL}/rest/v1/{table}"
-    res = requests.get(url, headers=headers)
-    res.raise_for_status()
-    return res.json()
+def fetch_supabase(table, select="*", filters=None, order=None):
+    """Whole table as a list of dicts, paged with Range headers."""
+    return fetch_records(SUPABASE_URL, headers, table, select, filters=filters, order=order, session=http_client())
+
+def fetch_supabase_frame(table, select="*", filters=None, order=None):
+    """Whole table as a DataFrame, built page by page."""
+    return fetch_frame(SUPABASE_URL, headers, table, select, filters=filters, order=order, session=http_client())
+
+# ---------- ANOMALY FINGERPRINTS ----------
+# An outlier stays an outlier on every cycle; these indexes keep it from being
+# written to Anomaly or e-mailed again until its TTL passes or its value moves
+# to another bucket. Keyed by type: (entity id field(s), bucketed value field).
+ANOMALY_FINGERPRINTS = {
+    "revenue_spike": ("stats_id", "total_revenue"),
+    "revenue_drop": ("stats_id", "total_revenue"),
+    "delivery_delay": ("delivery_id", "delay_days"),
+    "inventory_anomaly": ("product_id", "current_stock"),
+    "price_spike": ("pricing_id", "pct_change"),
+    "sentiment_drift": ("sentiment_id", "sentiment_score"),
+    "factory_issue": ("factory_id", "throughput"),
+    "weather_risk": ("weather_id", "severity"),
+    "market_share_change": (("product_id", "calculated_for"), "revenue_share_percent"),
+}
+
+ACTION_FINGERPRINTS = {
+    "revenue_spike": (("product_id", "day"), "value"),
+    "revenue_drop": (("product_id", "day"), "value"),
+    "delivery_anomaly": ("delivery_id", None),
+    "inventory_anomaly": ("product_id", "stock"),
+    "price_change_anomaly": ("product_id", "price_change"),
+    "sentiment_drift_anomaly": ("sentiment_id", "sentiment_score"),
+    "factory_throughput_anomaly": ("factory_id", "throughput_percentage"),
+    "weather_risk_anomaly": ("weather_id", "severity_level"),
+    "market_share_change_anomaly": (("product_id", "calculated_for"), "revenue_share_percent"),
+}
+
+recorded_anomalies = FingerprintIndex("anomaly")
+sent_alerts = FingerprintIndex("alert")
 
 def update_anomaly(anomalies):
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    # only anomalies not already recorded within the TTL are inserted
+    anomalies = recorded_anomalies.filter_new(anomalies or [], ANOMALY_FINGERPRINTS)
+    if not anomalies:
+        return
+
     rows=[]
-    if(anomalies):
-        for a in anomalies:
-            row = {
-                "type": a['type'],
-                "description": a['an_desc']
-            }
-            rows.append(row)
-        supabase.table("Anomaly").insert(rows).execute()
+    for a in anomalies:
+        row = {
+            "type": a['type'],
+            "description": a['an_desc']
+        }
+        rows.append(row)
+    try:
+        get_client(SUPABASE_URL, SUPABASE_KEY).table("Anomaly").insert(rows).execute()
+    except Exception:
+        # not written, so let the next cycle try again
+        recorded_anomalies.release_all(anomalies, ANOMALY_FINGERPRINTS)
+        raise
+
+def alerts_to_send(actions):
+    """Actions whose alert was not already sent within the TTL."""
+    return sent_alerts.filter_new(actions, ACTION_FINGERPRINTS)
+
+def alert_failed(action):
+    """Forget a claimed alert whose e-mail could not be sent, so it is retried."""
+    sent_alerts.release_all([action], ACTION_FINGERPRINTS)
 
 def send_html_email(subject, text_fallback, html_content, recipients, image_path=None):
     msg = EmailMultiAlternatives(
@@ -369,317 +332,362 @@ def send_html_email(subject, text_fallback, html_content, recipients, image_path
 
     msg.send()
     
-def notify(action,all_actions):
-    # Admin notification
-    subject = f"⚠ Anomaly detected: {action['type']}"
-    
-    # Build details HTML
-    details_html = ""
-    for k, v in action.items():
-        if k != "message":
-            details_html += f"""
-            <div class="detail-item">
-                <span class="detail-label">{k.replace('_', ' ').title()}:</span>
-                <span class="detail-value">{v}</span>
-            </div>
-            """
-    
-    admin_content = f"""
-        <div class="header">
-            <div class="icon">⚠️</div>
-            <h1>Anomaly Detected</h1>
-        </div>
-        <div class="content">
-            <p style="font-size: 16px; color: #212529;">{action["message"]}</p>
-            <div class="details-box">
-                <h3 style="margin-top: 0; color: #495057;">Details</h3>
-                {details_html}
-            </div>
-        </div>
-        <div class="footer">
-            <p>This is an automated alert from your monitoring system.</p>
-            <p style="margin: 5px 0;">© {2025} Your Company. All rights reserved.</p>
-        </div>
-    """
-    
-    admin_html = create_email_template(admin_content, "#FF6B6B")
-    
-    # Send admin email
-    send_html_email(
-        subject,
-        action["message"],  # Plain text fallback
-        admin_html,
-        ["<BUSINESS_OWNER_MAIL>"]
+# ---------- ALERT DIGESTS ----------
+# A cycle's alerts are grouped per recipient into one digest e-mail each and
+# written to the durable outbox, which delivers them over a single SMTP
+# connection within the rate limit and retries failures.
+ADMIN_RECIPIENTS = ["<BUSINESS_OWNER_MAIL>"]
+CUSTOMER_RECIPIENTS = ["<CUSTOMER_MAILS>"]
+
+alert_outbox = AlertOutbox()
+
+def _admin_digest(actions):
+    if len(actions) == 1:
+        action = actions[0]
+        return (
+            f"⚠ Anomaly detected: {action['type']}",
+            email_templates.admin_content("Anomaly Detected", email_templates.admin_section(action)),
+            action["message"]  # Plain text fallback
+        )
+
+    sections = "".join(email_templates.admin_section(a, a["type"].replace("_", " ").title()) for a in actions)
+    text = "\n".join(f"- {a['type']}: {a['message']}" for a in actions)
+    return (
+        f"⚠ {len(actions)} anomalies detected",
+        email_templates.admin_content(f"{len(actions)} Anomalies Detected", sections),
+        f"{len(actions)} anomalies detected:\n{text}"
     )
-    
-    # Customer notifications
+
+def _customer_alert(action, weather):
+    """
+    (recipients, subject, content html, plain text, header color) for customer-facing alerts, else None.
+    weather is [weather_id] of the cycle's first weather risk action, or [] if there is none.
+    """
     if action['type'] == 'delivery_anomaly':
         subject = f"🚚 Delivery Delay Alert for Order {action['order_id']}"
         add_cont = ''
-        if "weather_risk_anomaly" in [a['type'] for a in all_actions] and action['weather_id'] == [next(a['weather_id'] for a in all_actions if a['type'] == 'weather_risk_anomaly')]:
+        if weather and action['weather_id'] == weather:
             add_cont = f"🚨 Delay in Delivery caused due to bad weather"
         day_count = action['delay'] if 'delay' in action else 'N/A'
-        customer_content = f"""
-            <div class="header" style="background: linear-gradient(135deg, #FFA726 0%, #FF9800 100%);">
-                <div class="icon">🚚</div>
-                <h1>Delivery Delay Notice</h1>
-            </div>
-            <div class="content">
-                <p style="font-size: 16px;">Dear Customer,</p>
-                <p>We regret to inform you that your delivery is experiencing an unexpected delay.</p>
-                <p><strong style="color: #FF6B6B;">{add_cont}</strong></p>
-                <div class="details-box">
-                    <div class="detail-item">
-                        <span class="detail-label">Order ID:</span>
-                        <span class="detail-value"><strong>{action['order_id']}</strong></span>
-                    </div>
-                    <div class="detail-item">
-                        <span class="detail-label">Delivery ID:</span>
-                        <span class="detail-value">{action['delivery_id']}</span>
-                    </div>
-                    <div class="detail-item">
-                        <span class="detail-label">Delay Duration:</span>
-                        <span class="detail-value" style="color: #FF6B6B; font-weight: 600;">{day_count} days</span>
-                    </div>
-                </div>
-                
-                <p>We sincerely apologize for the inconvenience and are working diligently to resolve this issue as quickly as possible.</p>
-                <p style="margin-top: 24px;">Thank you for your understanding.</p>
-                <p style="margin-top: 20px; color: #495057;"><strong>Best regards,</strong><br>Customer Service Team</p>
-            </div>
-            <div class="footer">
-                <p>Need assistance? Contact our support team.</p>
-                <p style="margin: 5px 0;">© {2025} Your Company. All rights reserved.</p>
-            </div>
-        """
-        
-        customer_html = create_email_template(customer_content, "#FFA726")
-        plain_text = f"Dear Customer,\n\nWe regret to inform you that your delivery with ID {action['delivery_id']} is experiencing an abnormal delay. We apologize for the inconvenience caused and are working to resolve this issue promptly.\n\nThank you for your understanding.\n\nBest regards,\nCustomer Service Team"
-        
-        send_html_email(
-            subject,
-            plain_text,
-            customer_html,
-            ["<CUSTOMER_MAILS>"]
+
+        customer_content, plain_text = email_templates.delivery_notice(
+            action['order_id'], action['delivery_id'], day_count, add_cont
         )
-        
+        return CUSTOMER_RECIPIENTS, subject, customer_content, plain_text, "#FFA726"
+
     elif action['type'] == 'price_change_anomaly':
         subject = f"💰 Price Update for Product {action['product_id']}"
-        price_change_percent = action['price_change'] * 100
-        change_direction = "increased" if price_change_percent > 0 else "decreased"
-        change_color = "#FF6B6B" if price_change_percent > 0 else "#4CAF50"
-        
-        customer_content = f"""
-            <div class="header" style="background: linear-gradient(135deg, #42A5F5 0%, #1E88E5 100%);">
-                <div class="icon">💰</div>
-                <h1>Price Update Notification</h1>
-            </div>
-            <div class="content">
-                <p style="font-size: 16px;">Dear Customer,</p>
-                <p>We would like to inform you of a price change for one of our products.</p>
-                
-                <div class="details-box">
-                    <div class="detail-item">
-                        <span class="detail-label">Product ID:</span>
-                        <span class="detail-value"><strong>{action['product_id']}</strong></span>
-                    </div>
-                    <div class="detail-item">
-                        <span class="detail-label">Price Change:</span>
-                        <span class="detail-value" style="color: {change_color}; font-weight: 600; font-size: 18px;">
-                            {price_change_percent:+.2f}%
-                        </span>
-                    </div>
-                    <div class="detail-item">
-                        <span class="detail-label">Status:</span>
-                        <span class="detail-value">Price has {change_direction}</span>
-                    </div>
-                </div>
-                
-                <p>Please visit our website for complete and updated pricing details.</p>
-                <p style="margin-top: 24px;">Thank you for your continued support.</p>
-                <p style="margin-top: 20px; color: #495057;"><strong>Best regards,</strong><br>Customer Service Team</p>
-            </div>
-            <div class="footer">
-                <p>Questions about pricing? Contact our sales team.</p>
-                <p style="margin: 5px 0;">© {2025} Your Company. All rights reserved.</p>
-            </div>
-        """
-        
-        customer_html = create_email_template(customer_content, "#42A5F5")
-        plain_text = f"Dear Customer,\n\nWe would like to inform you that there has been a price change for the product with ID {action['product_id']}. The price has changed by {price_change_percent:.2f}%. Please check our website for the updated pricing details.\n\nThank you for your continued support.\n\nBest regards,\nCustomer Service Team"
-        
-        send_html_email(
-            subject,
-            plain_text,
-            customer_html,
-           ["<CUSTOMER_MAILS>"]
-        )
+        customer_content, plain_text = email_templates.price_notice(action['product_id'], action['price_change'])
+        return CUSTOMER_RECIPIENTS, subject, customer_content, plain_text, "#42A5F5"
+
+    return None
+
+def build_alert_digests(actions, all_actions=None):
+    """One (subject, text, html, recipients) digest per recipient group for a cycle's actions."""
+    all_actions = actions if all_actions is None else all_actions
+    if not actions:
+        return []
+
+    subject, content, text = _admin_digest(actions)
+    digests = [(subject, text, create_email_template(content, "#FF6B6B"), ADMIN_RECIPIENTS)]
+
+    # looked up once per cycle rather than rescanning all_actions for every delivery alert
+    weather = [a['weather_id'] for a in all_actions if a['type'] == 'weather_risk_anomaly'][:1]
+
+    by_recipients = {}
+    for action in actions:
+        alert = _customer_alert(action, weather)
+        if alert:
+            by_recipients.setdefault(tuple(alert[0]), []).append(alert[1:])
+
+    for recipients, alerts in by_recipients.items():
+        if len(alerts) == 1:
+            subject, content, text, color = alerts[0]
+        else:
+            subject = f"📬 {len(alerts)} updates about your orders and products"
+            content = "".join(a[1] for a in alerts)
+            text = "\n\n----------\n\n".join(a[2] for a in alerts)
+            color = alerts[0][3]
+        digests.append((subject, text, create_email_template(content, color), list(recipients)))
+
+    return digests
+
+def notify_digest(actions, all_actions=None):
+    """Queue a cycle's alerts as per-recipient digests, then deliver what the rate limit allows."""
+    for subject, text, html, recipients in build_alert_digests(actions, all_actions):
+        alert_outbox.enqueue(subject, text, html, recipients)
+    return alert_outbox.flush()
+
+def notify(action,all_actions):
+    return notify_digest([action], all_actions)
+
 # ---------- ML ANOMALY DETECTION ----------
+# Every detector has a full-scan form (detect_*) that refits and caches its
+# baseline, and an incremental form (score_*_rows) used by the dispatcher to
+# score only the rows carried by a realtime change event. Both work on
+# DataFrames; rows become dicts only once they are flagged.
+
+baselines = BaselineCache()
+revenue_model = IsolationForestStore("revenue_iforest", model_dir=settings.MODEL_STORE_DIR)
+
+# MAD / IQR detectors keep streaming quantile sketches of their column,
+# updated row by row from events and saved so a restart starts warm
+sketches = SketchStore(settings.MODEL_STORE_DIR)
+
+# a fit persisted by an earlier process lets the first event skip the full scan
+if revenue_model.ready and not revenue_model.needs_refit():
+    baselines.store("revenue", {"store": revenue_model}, max_age=float("inf"))
+
+for _name in ("delivery", "weather", "inventory"):
+    _state = sketches.load(_name)
+    if _state:
+        baselines.store(_name, {"sketch": KeyedQuantiles.from_dict(_state)})
+
+def _fit_sketch(name, keys, values):
+    sketch = KeyedQuantiles(zip(keys.tolist(), values.tolist()))
+    baselines.store(name, {"sketch": sketch})
+    sketches.save(name, sketch.to_dict(), force=True)
+    return sketch
+
+def _update_sketch(name, sketch, keys, values):
+    for key, value in zip(keys.tolist(), values.tolist()):
+        sketch.upsert(key, value)
+    sketches.save(name, sketch.to_dict())
+
+def _records(columns):
+    """
+    Anomaly set built column by column (one vectorized expression per field),
+    turned into dicts once, where it leaves the detector for the Anomaly
+    insert, the actions and the API.
+    """
+    return pd.DataFrame(columns).to_dict("records")
 
 # --------- REVENUE OUTLIERS ----------
-def detect_revenue_anomalies_ml():
-    rows = fetch_supabase("revenue_stats")
-    if not rows:
+def _revenue_anomalies(rows, center):
+    value = rows["total_revenue"].astype(float)
+    anomaly_type = pd.Series(np.where(value > center, "revenue_spike", "revenue_drop"), index=rows.index)
+    msg = np.where(value > center, "Unusual spike in revenue detected", "Unusual drop in revenue detected")
+
+    return _records({
+        "type": anomaly_type,
+        "stats_id": rows["stats_id"],
+        "product_id": rows["product_id"],
+        "total_revenue": rows["total_revenue"],
+        "calculated_for": rows["calculated_for"],
+        "center_reference": center,
+        "message": msg,
+        "an_desc": "Sudden revenue change detected for product with product id:" + rows["product_id"].astype(int).astype(str)
+                   + " on " + rows["calculated_for"].astype(str) + ". " + anomaly_type.str.upper() + "!."
+    })
+
+def detect_revenue_anomalies_ml(snapshot=None):
+    df = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("revenue_stats")
+    if df.empty:
         return []
 
     # revenue values
-    revenue = np.array([float(r["total_revenue"]) for r in rows]).reshape(-1, 1)
+    revenue = df["total_revenue"].astype(float).to_numpy()
 
-    # isolation forest
-    model = IsolationForest(contamination="auto", random_state=42)
-    preds = model.fit_predict(revenue)
+    # isolation forest: refit only when the store says it is due
+    if revenue_model.needs_refit(total_rows=len(revenue)) and not revenue_model.fit(revenue):
+        return []  # fallback safety
 
-    # use central tendency from normal points only
-    normal_values = [float(rows[i]["total_revenue"]) for i, p in enumerate(preds) if p == 1]
+    # the store refits on its own schedule, so the cached baseline never expires
+    baselines.store("revenue", {"store": revenue_model}, max_age=float("inf"))
 
-    if not normal_values:
-        return []  # fallback safety
+    center = revenue_model.center
+    anomalies = _revenue_anomalies(df[revenue_model.flag(revenue)], center)
+    update_anomaly(anomalies)
 
-    center = np.median(normal_values)
+    return anomalies
 
-    anomalies = []
+def score_revenue_rows(df, baseline):
+    df = df[df["total_revenue"].notna()]
+    if df.empty:
+        return []
+
+    store = baseline["store"]
+    revenue = df["total_revenue"].astype(float).to_numpy()
 
-    for i, p in enumerate(preds):
-        if p == -1:
-            r = rows[i]
-            value = float(r["total_revenue"])
-
-            if value > center:
-                anomaly_type = "revenue_spike"
-                msg = "Unusual spike in revenue detected"
-            else:
-                anomaly_type = "revenue_drop"
-                msg = "Unusual drop in revenue detected"
-
-            anomalies.append({
-                "type": anomaly_type,
-                "stats_id": r["stats_id"],
-                "product_id": r["product_id"],
-                "total_revenue": r["total_revenue"],
-                "calculated_for": r["calculated_for"],
-                "center_reference": center,
-                "message": msg,
-                "an_desc" : f"Sudden revenue change detected for product with product id:{int(r['product_id'])} on {r['calculated_for']}. {anomaly_type.upper()}!."
-            })
+    anomalies = _revenue_anomalies(df[store.flag(revenue)], store.center)
     update_anomaly(anomalies)
 
+    # enough new rows or an old fit: drop the baseline so the next event refits from a full scan
+    store.record_new_rows(len(df))
+    if store.needs_refit():
+        baselines.invalidate("revenue")
     return anomalies
 
 
 
 # --------- DELIVERY DELAY (MAD ROBUST) ----------
-def detect_delivery_delay_anomalies_mad():
-    deliveries = fetch_supabase("deliveries")
+def _delivery_delays(df):
+    # numeric delay in days, NaN unless both dates exist
+    return (
+        pd.to_datetime(df["actual_delivery_date"]) -
+        pd.to_datetime(df["promised_delivery_date"])
+    ).dt.days
+
+def _delivery_anomaly(d, delay=None):
+    if delay is None:
+        an_desc = f"Abnormal delivery delay detected for order with order id: {d['order_id']} (status marked delayed)."
+    else:
+        an_desc = f"Abnormal delivery delay detected for order with order id: {d['order_id']} with a delay of {int(delay)} days."
+
+    return {
+        "type": "delivery_delay",
+        "delivery_id": d["delivery_id"],
+        "order_id": d["order_id"],
+        "delay_days": None if delay is None else int(delay),
+        "message": "Abnormal delivery delay detected",
+        "weather_id": d.get("weather_id"),
+        "an_desc": an_desc
+    }
 
-    delays = []
-    valid = []
-    anomalies = []
+def detect_delivery_delay_anomalies_mad(snapshot=None):
+    deliveries = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("deliveries")
+    if deliveries.empty:
+        return []
+
+    # --- MAD baseline from a sketch of every valid delay ---
+    sketch = _fit_sketch("delivery", deliveries["delivery_id"], _delivery_delays(deliveries))
+    return _flag_delivery_rows(deliveries, sketch)
+
+def score_delivery_rows(df, baseline):
+    if df.empty:
+        return []
+    sketch = baseline["sketch"]
+    _update_sketch("delivery", sketch, df["delivery_id"], _delivery_delays(df))
+    return _flag_delivery_rows(df, sketch)
+
+def _flag_delivery_rows(df, sketch):
+    # explicit status delayed -> anomaly regardless of MAD
+    anomalies = [_delivery_anomaly(d) for d in df[df["delivery_status"] == "delayed"].to_dict("records")]
+
+    # If MAD is zero (or there are no delays yet), skip z-score logic but still return status-based anomalies
+    if len(sketch):
+        median, mad = sketch.median(), sketch.mad()
+        if mad and not np.isnan(mad):
+            delays = _delivery_delays(df)
+            modified_z = 0.6745 * (delays - median) / mad
+            flagged = (modified_z.abs() >= 3.5).to_numpy()
+
+            anomalies.extend(
+                _delivery_anomaly(d, delay)
+                for d, delay in zip(df[flagged].to_dict("records"), delays[flagged])
+            )
 
-    # --- Step 1: Handle explicit delayed status and collect delays ---
-    for d in deliveries:
-
-        # 1A: explicit status delayed -> anomaly regardless of MAD
-        if d.get("delivery_status") == "delayed":
-            anomalies.append({
-                "type": "delivery_delay",
-                "delivery_id": d["delivery_id"],
-                "order_id": d["order_id"],
-                "delay_days": None,
-                "message": "Abnormal delivery delay detected",
-                "weather_id": d.get("weather_id"),
-                "an_desc": f"Abnormal delivery delay detected for order with order id: {d['order_id']} (status marked delayed)."
-            })
-
-        # 1B: compute numeric delay only if both dates exist
-        if d.get("actual_delivery_date") and d.get("promised_delivery_date"):
-            delay = (
-                pd.to_datetime(d["actual_delivery_date"]) -
-                pd.to_datetime(d["promised_delivery_date"])
-            ).days
-
-            delays.append(delay)
-            valid.append((d, delay))
-
-    # --- No valid delays to compute MAD on ---
-    if not delays:
-        update_anomaly(anomalies)
-        return anomalies
-
-    # --- Step 2: MAD-based anomaly detection ---
-    series = pd.Series(delays)
-
-    median = series.median()
-    mad = (np.abs(series - median)).median()
-
-    # If MAD is zero, skip z-score logic but still return status-based anomalies
-    if mad and not np.isnan(mad) and mad != 0:
-        modified_z = 0.6745 * (series - median) / mad
-
-        for (d, delay), mz in zip(valid, modified_z):
-            if abs(mz) >= 3.5:
-                anomalies.append({
-                    "type": "delivery_delay",
-                    "delivery_id": d["delivery_id"],
-                    "order_id": d["order_id"],
-                    "delay_days": int(delay),
-                    "message": "Abnormal delivery delay detected",
-                    "weather_id": d.get("weather_id"),
-                    "an_desc": f"Abnormal delivery delay detected for order with order id: {d['order_id']} with a delay of {int(delay)} days."
-                })
-
-    # --- Final update & return ---
     update_anomaly(anomalies)
     return anomalies
 
 
 
 # --------- PRICE CHANGE ANOMALIES ----------
-def detect_price_change_anomalies():
-    history = fetch_supabase("pricing_history")
+def _price_anomalies(rows, pct_change):
+    pct_change = pct_change.astype(float)
+    return _records({
+        "type": "price_spike",
+        "pricing_id": rows["pricing_id"],
+        "product_id": rows["product_id"],
+        "pct_change": pct_change,
+        "message": "Sudden abnormal price change detected",
+        "an_desc": "Sudden abnormal price change detected for product with product id:" + rows["product_id"].astype(str)
+                   + " with a price change of " + (pct_change * 100).map("{:.2f}".format) + "%."
+    })
+
+def detect_price_change_anomalies(snapshot=None):
+    history = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("pricing_history")
+    if history.empty:
+        return []
 
-    df = pd.DataFrame(history).sort_values(["product_id", "start_date"])
+    df = history.sort_values(["product_id", "start_date"])
 
     df["pct_change"] = df.groupby("product_id")["price"].pct_change()
 
+    # latest price per product is all an incoming row needs to be compared against
+    baselines.store("price", {"last_price": df.groupby("product_id")["price"].last().to_dict()})
+
     outliers = df[df["pct_change"].abs() > 0.35]
-    anomalies = []
-    for _, row in outliers.iterrows():
-        anomalies.append({
-            "type": "price_spike",
-            "pricing_id": row["pricing_id"],
-            "product_id": row["product_id"],
-            "pct_change": float(row["pct_change"]),
-            "message": "Sudden abnormal price change detected",
-            "an_desc" : f"Sudden abnormal price change detected for product with product id:{row['product_id']} with a price change of {float(row['pct_change'])*100:.2f}%."
-        })
+    anomalies = _price_anomalies(outliers, outliers["pct_change"])
     update_anomaly(anomalies)
 
     return anomalies
 
+def score_price_rows(df, baseline):
+    last_price = baseline["last_price"]
+    rows = df[df["price"].notna()]
+    if rows.empty:
+        return []
+
+    price = rows["price"].astype(float)
+    by_product = price.groupby(rows["product_id"])
+
+    # previous price: the product's earlier row in this batch, else the cached last price
+    previous = by_product.shift().fillna(rows["product_id"].map(last_price)).astype(float)
+    pct_change = price / previous - 1
+    flagged = previous.notna() & (previous != 0) & (pct_change.abs() > 0.35)
+
+    last_price.update(by_product.last().to_dict())
+
+    anomalies = _price_anomalies(rows[flagged], pct_change[flagged])
+    update_anomaly(anomalies)
+    return anomalies
+
 # --------- SENTIMENT DRIFT ----------
-def detect_sentiment_drift():
-    sentiments = fetch_supabase("review_sentiments")
+SENTIMENT_WINDOW = 10
+
+def _sentiment_anomaly(s, drift):
+    return {
+        "type": "sentiment_drift",
+        "sentiment_id": s["sentiment_id"],
+        "review_id": s.get("review_id"),
+        "sentiment_score": s.get("sentiment_score"),
+        "detected_issues": s.get("detected_issues"),
+        "drift": float(drift),
+        "message": "Customer sentiment is drifting unusually",
+        "an_desc" : f"Customer sentiment is drifting unusually with a drift value of {float(drift)} at sentiment id {s['sentiment_id']}."
+    }
 
-    scores = [float(s["sentiment_score"]) for s in sentiments]
+def detect_sentiment_drift(snapshot=None):
+    sentiments = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("review_sentiments")
 
-    if len(scores) < 10:
+    if len(sentiments) < SENTIMENT_WINDOW:
         return []
 
-    series = pd.Series(scores)
+    series = sentiments["sentiment_score"].astype(float)
 
-    rolling = series.rolling(window=10).mean()
+    rolling = series.rolling(window=SENTIMENT_WINDOW).mean()
     drift = np.gradient(rolling)
 
+    baselines.store("sentiment", {
+        "window": series.iloc[-SENTIMENT_WINDOW:].tolist(),
+        "last_mean": float(rolling.iloc[-1])
+    })
+
+    flagged = np.abs(drift) > 0.25
+    anomalies = [
+        _sentiment_anomaly(s, d)
+        for s, d in zip(sentiments[flagged].to_dict("records"), drift[flagged])
+    ]
+    update_anomaly(anomalies)
+    return anomalies
+
+def score_sentiment_rows(df, baseline):
     anomalies = []
-    for i, d in enumerate(drift):
-        if abs(d) > 0.25:
-            anomalies.append({
-                "type": "sentiment_drift",
-                "sentiment_id": sentiments[i]["sentiment_id"],
-                "drift": float(d),
-                "message": "Customer sentiment is drifting unusually",
-                "an_desc" : f"Customer sentiment is drifting unusually with a drift value of {float(d)} at sentiment id {sentiments[i]['sentiment_id']}."
-            })
+
+    for s in df[df["sentiment_score"].notna()].to_dict("records"):
+        window = (baseline["window"] + [float(s["sentiment_score"])])[-SENTIMENT_WINDOW:]
+        mean = float(np.mean(window))
+        previous = baseline["last_mean"]
+        baseline["window"], baseline["last_mean"] = window, mean
+
+        # appended point: one-sided gradient of the rolling mean, as np.gradient does at the edge
+        if len(window) < SENTIMENT_WINDOW or previous is None or np.isnan(previous):
+            continue
+        drift = mean - previous
+        if abs(drift) > 0.25:
+            anomalies.append(_sentiment_anomaly(s, drift))
+
     update_anomaly(anomalies)
     return anomalies
 
@@ -687,13 +695,13 @@ def detect_sentiment_drift():
 # --------- FACTORY ----------
 
 
-def detect_factory_throughput_anomalies():
-    rows = fetch_supabase("factory_performance")
-    if not rows:
+def detect_factory_throughput_anomalies(snapshot=None):
+    rows = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("factory_performance")
+    if rows.empty:
         return []
 
-    throughputs = np.array([r["throughput_percentage"] for r in rows], dtype=float)
-    backlogs = np.array([r["backlog_units"] for r in rows], dtype=float)
+    throughputs = rows["throughput_percentage"].to_numpy(dtype=float)
+    backlogs = rows["backlog_units"].to_numpy(dtype=float)
 
     # --- Data-driven thresholds (Z-score style) ---
     # k controls sensitivity: 2 = conservative, 3 = very strict, 1.5 = sensitive
@@ -715,25 +723,36 @@ def detect_factory_throughput_anomalies():
     else:
         backlog_high_threshold = backlog_mean + k * backlog_std
 
+    baseline = {
+        "throughput_low_threshold": throughput_low_threshold,
+        "backlog_high_threshold": backlog_high_threshold,
+    }
+    baselines.store("factory", baseline)
+
+    return score_factory_rows(rows, baseline)
+
+def score_factory_rows(df, baseline):
+    throughput_low_threshold = baseline["throughput_low_threshold"]
+    backlog_high_threshold = baseline["backlog_high_threshold"]
+
+    low_throughput = df["throughput_percentage"] < throughput_low_threshold
+    high_backlog = df["backlog_units"] > backlog_high_threshold
+
     anomalies = []
-    for r in rows:
-        low_throughput = r["throughput_percentage"] < throughput_low_threshold
-        high_backlog = r["backlog_units"] > backlog_high_threshold
-
-        if low_throughput or high_backlog:
-            anomalies.append({
-                "type": "factory_issue",
-                "factory_id": r["factory_id"],
-                "throughput": r["throughput_percentage"],
-                "backlog": r["backlog_units"],
-                "message": "Factory throughput low or backlog high (data-driven thresholds)",
-                "units_produced": r["units_produced"],
-                "derived_thresholds": {
-                    "throughput_low_threshold": throughput_low_threshold,
-                    "backlog_high_threshold": backlog_high_threshold,
-                },
-                "an_desc" : f"Factory throughput low or backlog high for factory with id:{r['factory_id']}."
-            })
+    for r in df[low_throughput | high_backlog].to_dict("records"):
+        anomalies.append({
+            "type": "factory_issue",
+            "factory_id": r["factory_id"],
+            "throughput": r["throughput_percentage"],
+            "backlog": r["backlog_units"],
+            "message": "Factory throughput low or backlog high (data-driven thresholds)",
+            "units_produced": r["units_produced"],
+            "derived_thresholds": {
+                "throughput_low_threshold": throughput_low_threshold,
+                "backlog_high_threshold": backlog_high_threshold,
+            },
+            "an_desc" : f"Factory throughput low or backlog high for factory with id:{r['factory_id']}."
+        })
     update_anomaly(anomalies)
     return anomalies
 
@@ -741,50 +760,81 @@ def detect_factory_throughput_anomalies():
 # --------- WEATHER ----------
 
 
-def detect_weather_risk():
-    weather = fetch_supabase("weather_conditions")
-    if not weather:
+def detect_weather_risk(snapshot=None):
+    weather = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("weather_conditions")
+    if weather.empty:
         return []
 
-    severities = np.array([float(r["severity_level"]) for r in weather])
+    sketch = _fit_sketch("weather", weather["weather_id"], weather["severity_level"].astype(float))
+    return _flag_weather_rows(weather, sketch)
+
+def score_weather_rows(df, baseline):
+    if df.empty:
+        return []
+    sketch = baseline["sketch"]
+    _update_sketch("weather", sketch, df["weather_id"], df["severity_level"].astype(float))
+    return _flag_weather_rows(df, sketch)
 
+def _weather_threshold(sketch):
     # Quartiles
-    q1 = np.percentile(severities, 25)
-    q3 = np.percentile(severities, 75)
+    q1 = sketch.quantile(0.25)
+    q3 = sketch.quantile(0.75)
     iqr = q3 - q1
 
-    # Data-driven high-risk threshold
-    high_severity_threshold = q3 + 1.5 * iqr
-
     # Fallback if data is flat
     if iqr == 0:
-        high_severity_threshold = q3  # everything above typical upper range
+        return q3  # everything above typical upper range
+
+    # Data-driven high-risk threshold
+    return q3 + 1.5 * iqr
+
+def _flag_weather_rows(df, sketch):
+    high_severity_threshold = _weather_threshold(sketch)
+
     anomalies=[]
-    for r in weather:
-        if r["severity_level"] >= high_severity_threshold:
-            anomalies.append({
-                "type": "weather_risk",
-                "weather_id": r["weather_id"],
-                "location": r["observed_location"],
-                "severity": r["severity_level"],
-                "weather_type": r["weather_type"],
-                "observation_at": r["observed_at"],
-                "message": "Weather risk likely to impact logistics (data-driven threshold)",
-                "derived_threshold": high_severity_threshold,
-                "an_desc" : f"Weather risk likely to impact logistics at location {r['observed_location']} with severity {r['severity_level']}."
-            })
+    for r in df[df["severity_level"].astype(float) >= high_severity_threshold].to_dict("records"):
+        anomalies.append({
+            "type": "weather_risk",
+            "weather_id": r["weather_id"],
+            "location": r["observed_location"],
+            "severity": r["severity_level"],
+            "weather_type": r["weather_type"],
+            "observation_at": r["observed_at"],
+            "message": "Weather risk likely to impact logistics (data-driven threshold)",
+            "derived_threshold": high_severity_threshold,
+            "an_desc" : f"Weather risk likely to impact logistics at location {r['observed_location']} with severity {r['severity_level']}."
+        })
     update_anomaly(anomalies)
     return anomalies
 
 
 
 # --------- MARKET SHARE ----------
-def detect_market_share_sudden_change():
-    stats = fetch_supabase("revenue_stats")
-    if not stats:
+def _market_share_anomalies(rows, rev_change, unit_change):
+    product_id = rows["product_id"].astype(int)
+    return _records({
+        "type": "market_share_change",
+        "product_id": product_id,
+        "calculated_for": rows["calculated_for"],
+        "revenue_share_percent": rows["revenue_share_percent"],
+        "unit_share_percent": rows["unit_share_percent"],
+        "message": "Sudden market share change detected",
+        "an_desc": "Sudden market share change detected for product with product id:" + product_id.astype(str)
+                   + " on " + rows["calculated_for"].astype(str)
+                   + " due to revenue share change of " + rev_change.astype(float).map(str)
+                   + " and unit share change of " + unit_change.astype(float).map(str) + "."
+    })
+
+def _last_shares(pid, rev, unit):
+    latest = pd.DataFrame({"rev": rev, "unit": unit}).groupby(pid).last()
+    return dict(zip(latest.index.tolist(), zip(latest["rev"].astype(float).tolist(), latest["unit"].astype(float).tolist())))
+
+def detect_market_share_sudden_change(snapshot=None):
+    stats = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("revenue_stats")
+    if stats.empty:
         return []
 
-    df = pd.DataFrame(stats).sort_values(by=["product_id", "calculated_for"])
+    df = stats.sort_values(by=["product_id", "calculated_for"])
 
     df["rev_change"] = df.groupby("product_id")["revenue_share_percent"].diff()
     df["unit_change"] = df.groupby("product_id")["unit_share_percent"].diff()
@@ -792,155 +842,213 @@ def detect_market_share_sudden_change():
     df["rev_std"] = df.groupby("product_id")["rev_change"].transform("std")
     df["unit_std"] = df.groupby("product_id")["unit_change"].transform("std")
 
+    latest = df.groupby("product_id").last()
+    baselines.store("market_share", {
+        "last": _last_shares(df["product_id"], df["revenue_share_percent"], df["unit_share_percent"]),
+        "rev_std": latest["rev_std"].to_dict(),
+        "unit_std": latest["unit_std"].to_dict(),
+    })
+
     amm = df[
         (abs(df["rev_change"]) > 2 * df["rev_std"]) |
         (abs(df["unit_change"]) > 2 * df["unit_std"])
     ]
-    anomalies=[]
-    for _, row in amm.iterrows():
-        anomalies.append({
-            "type": "market_share_change",
-            "product_id": int(row["product_id"]),
-            "calculated_for": row["calculated_for"],
-            "revenue_share_percent": row["revenue_share_percent"],
-            "unit_share_percent": row["unit_share_percent"],
-            "message": "Sudden market share change detected",
-            "an_desc" : f"Sudden market share change detected for product with product id:{int(row['product_id'])} on {row['calculated_for']} due to revenue share change of {float(row['rev_change']) if row['rev_change'] is not None else 'N/A'} and unit share change of {float(row['unit_change']) if row['unit_change'] is not None else 'N/A'}."
-        })
+    anomalies = _market_share_anomalies(amm, amm["rev_change"], amm["unit_change"])
     update_anomaly(anomalies)
     return anomalies
 
+def score_market_share_rows(df, baseline):
+    last = baseline["last"]
 
-# --------- INVENTORY ----------
-def detect_inventory_anomalies_ml():
-    products = fetch_supabase("products")
-    if not products:
+    rows = df[df["revenue_share_percent"].notna() & df["unit_share_percent"].notna()]
+    if rows.empty:
         return []
 
-    stocks = np.array([float(p.get("current_stock", 0)) for p in products])
+    pid = rows["product_id"]
+    rev = rows["revenue_share_percent"].astype(float)
+    unit = rows["unit_share_percent"].astype(float)
 
-    q1 = np.percentile(stocks, 25)
-    q3 = np.percentile(stocks, 75)
-    iqr = q3 - q1
+    # previous shares: the product's earlier row in this batch, else the cached last row
+    prev_rev = rev.groupby(pid).shift().fillna(pid.map({p: v[0] for p, v in last.items()})).astype(float)
+    prev_unit = unit.groupby(pid).shift().fillna(pid.map({p: v[1] for p, v in last.items()})).astype(float)
+    rev_change, unit_change = rev - prev_rev, unit - prev_unit
 
-    lower = q1 - 1.5 * iqr
-    upper = q3 + 1.5 * iqr
+    # NaN std (fewer than two changes for the product) or no previous row never flags, as in the full scan
+    flagged = (
+        (rev_change.abs() > 2 * pid.map(baseline["rev_std"]).astype(float)) |
+        (unit_change.abs() > 2 * pid.map(baseline["unit_std"]).astype(float))
+    )
 
-    anomalies = []
+    last.update(_last_shares(pid, rev, unit))
 
-    for p in products:
-        s = float(p.get("current_stock", 0))
+    anomalies = _market_share_anomalies(rows[flagged], rev_change[flagged], unit_change[flagged])
+    update_anomaly(anomalies)
+    return anomalies
 
-        if s < 0:
-            reason = "negative_stock"
-        elif s == 0:
-            reason = "stockout"
-        elif s < lower or s > upper:
-            reason = "iqr_outlier"
-        else:
-            continue
 
-        anomalies.append({
-            "type": "inventory_anomaly",
-            "product_id": p["product_id"],
-            "current_stock": s,
-            "reason": reason,
-            "message": "Inventory level anomaly detected",
-            "an_desc" : f"Inventory level anomaly detected for product with product id:{p['product_id']} due to {reason}."
-        })
+# --------- INVENTORY ----------
+INVENTORY_REASONS = ["negative_stock", "stockout", "iqr_outlier"]
+
+def _stock_levels(df):
+    if "current_stock" not in df:
+        return pd.Series(0.0, index=df.index)
+    return df["current_stock"].fillna(0).astype(float)
+
+def detect_inventory_anomalies_ml(snapshot=None):
+    products = (snapshot or TableSnapshot(fetch_supabase_frame)).frame("products")
+    if products.empty:
+        return []
+
+    sketch = _fit_sketch("inventory", products["product_id"], _stock_levels(products))
+    return _flag_inventory_rows(products, sketch)
+
+def score_inventory_rows(df, baseline):
+    if df.empty:
+        return []
+    sketch = baseline["sketch"]
+    # a stock UPDATE replaces the product's previous level in the sketch
+    _update_sketch("inventory", sketch, df["product_id"], _stock_levels(df))
+    return _flag_inventory_rows(df, sketch)
+
+def _flag_inventory_rows(df, sketch):
+    q1 = sketch.quantile(0.25)
+    q3 = sketch.quantile(0.75)
+    iqr = q3 - q1
+    lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+    s = _stock_levels(df)
+
+    # first matching condition wins, same precedence as the if/elif chain it replaces
+    reasons = np.select(
+        [s < 0, s == 0, (s < lower) | (s > upper)],
+        INVENTORY_REASONS,
+        default=""
+    )
+    flagged = reasons != ""
+
+    rows, reason = df[flagged], pd.Series(reasons[flagged], index=df.index[flagged])
+    anomalies = _records({
+        "type": "inventory_anomaly",
+        "product_id": rows["product_id"],
+        "current_stock": s[flagged],
+        "reason": reason,
+        "message": "Inventory level anomaly detected",
+        "an_desc": "Inventory level anomaly detected for product with product id:" + rows["product_id"].astype(str)
+                   + " due to " + reason + "."
+    })
     update_anomaly(anomalies)
     return anomalies
 
 # ---------- PROACTIVE AGENT USING ML ----------
 
+def _revenue_action(r):
+    return {
+        "type": r['type'],
+        "message": "ML detected unusual revenue",
+        "value": r["total_revenue"],
+        "day": r["calculated_for"],
+        "product_id": r["product_id"]
+    }
 
-def run_ml_proactive_agent():
+def _delivery_action(o):
+    return {
+        "type": "delivery_anomaly",
+        "message": "ML detected abnormal order delay",
+        "order_id": o["order_id"],
+        "delivery_id" : o["delivery_id"],
+        "weather_id": o["weather_id"],
+    }
 
-    revenue_anoms = detect_revenue_anomalies_ml()
-    delivery_anoms = detect_delivery_delay_anomalies_mad()
-    inventory_anoms = detect_inventory_anomalies_ml()
-    price_change_anoms = detect_price_change_anomalies()
-    sentiment_drift_anoms = detect_sentiment_drift()
-    factory_throughput_anoms = detect_factory_throughput_anomalies()
-    weather_risk_anoms = detect_weather_risk()
-    market_share_change_anoms = detect_market_share_sudden_change()
+def _inventory_action(i):
+    return {
+        "type": "inventory_anomaly",
+        "message": "ML detected abnormal inventory level",
+        "product_id": i["product_id"],
+        "stock": i["current_stock"]
+    }
 
-    actions = []
+def _price_change_action(p):
+    return {
+        "type": "price_change_anomaly",
+        "message": "Significant price change detected",
+        "product_id": p["product_id"],
+        "price_change": p["pct_change"]
+    }
 
-    for r in revenue_anoms:
-        actions.append({
-            "type": r['type'],
-            "message": "ML detected unusual revenue",
-            "value": r["total_revenue"],
-            "day": r["calculated_for"],
-            "product_id": r["product_id"]
-        })
+def _sentiment_drift_action(s):
+    return {
+        "type": "sentiment_drift_anomaly",
+        "message": "Customer sentiment drift detected",
+        "sentiment_id": s["sentiment_id"],
+        "review_id": s["review_id"],
+        "sentiment_score": s["sentiment_score"],
+        "detected_issues": s['detected_issues'],
+    }
 
-    for o in delivery_anoms:
-        actions.append({
-            "type": "delivery_anomaly",
-            "message": "ML detected abnormal order delay",
-            "order_id": o["order_id"],
-            "delivery_id" : o["delivery_id"],   
-            "weather_id": o["weather_id"],
-            
-        })
+def _factory_throughput_action(f):
+    return {
+        "type": "factory_throughput_anomaly",
+        "message": "Factory throughput anomaly detected",
+        "factory_id": f["factory_id"],
+        "produced_units": f["units_produced"],
+        "throughput_percentage": f["throughput"],
+        "backlog_units": f["backlog"]
+    }
 
-    for i in inventory_anoms:
-        actions.append({
-            "type": "inventory_anomaly",
-            "message": "ML detected abnormal inventory level",
-            "product_id": i["product_id"],
-            "stock": i["current_stock"]
-        })
-    
+def _weather_risk_action(w):
+    return {
+        "type": "weather_risk_anomaly",
+        "weather_id": w["weather_id"],
+        "message": "Severe weather condition detected",
+        "location": w["location"],
+        "severity_level": w["severity"],
+        "description": w["weather_type"]+" observed on "+w["observation_at"]
+    }
 
-    for p in price_change_anoms:
-        actions.append({
-            "type": "price_change_anomaly",
-            "message": "Significant price change detected",
-            "product_id": p["product_id"],
-            "price_change": p["pct_change"]
-        })
-    for s in sentiment_drift_anoms:
-        actions.append({
-            "type": "sentiment_drift_anomaly",
-            "message": "Customer sentiment drift detected",
-            "sentiment_id": s["sentiment_id"],
-            "review_id": s["review_id"],
-            "sentiment_score": s["sentiment_score"],
-            "detected_issues": s['detected_issues'],
-        })
-    for f in factory_throughput_anoms:
-        actions.append({
-            "type": "factory_throughput_anomaly",
-            "message": "Factory throughput anomaly detected",
-            "factory_id": f["factory_id"],
-            "produced_units": f["units_produced"],
-            "throughput_percentage": f["throughput"],
-            "backlog_units": f["backlog"]
-        })
+def _market_share_change_action(m):
+    return {
+        "type": "market_share_change_anomaly",
+        "message": "Sudden market share change detected",
+        "product_id": m["product_id"],
+        "calculated_for": m["calculated_for"],
+        "revenue_share_percent": m["revenue_share_percent"],
+        "unit_share_percent": m["unit_share_percent"]
+    }
 
-    for w in weather_risk_anoms:
-        actions.append({
-            "type": "weather_risk_anomaly",
-            "weather_id": w["weather_id"],
-            "message": "Severe weather condition detected",
-            "location": w["location"],
-            "severity_level": w["severity"],
-            "description": w["weather_type"]+" observed on "+w["observation_at"]
-        })
-    
-    for m in market_share_change_anoms:
-        actions.append({
-            "type": "market_share_change_anomaly",
-            "message": "Sudden market share change detected",
-            "product_id": m["product_id"],
-            "calculated_for": m["calculated_for"],
-            "revenue_share_percent": m["revenue_share_percent"],
-            "unit_share_percent": m["unit_share_percent"]
-        })
-    return actions
+
+# registration order is the order actions are reported in
+dispatcher = DetectorDispatcher(baselines, lambda: TableSnapshot(fetch_supabase_frame))
+for _detector in [
+    Detector("revenue", ["revenue_stats"], detect_revenue_anomalies_ml, score_revenue_rows, _revenue_action),
+    Detector("delivery", ["deliveries"], detect_delivery_delay_anomalies_mad, score_delivery_rows, _delivery_action),
+    Detector("inventory", ["products"], detect_inventory_anomalies_ml, score_inventory_rows, _inventory_action),
+    Detector("price", ["pricing_history"], detect_price_change_anomalies, score_price_rows, _price_change_action),
+    Detector("sentiment", ["review_sentiments"], detect_sentiment_drift, score_sentiment_rows, _sentiment_drift_action),
+    Detector("factory", ["factory_performance"], detect_factory_throughput_anomalies, score_factory_rows, _factory_throughput_action),
+    Detector("weather", ["weather_conditions"], detect_weather_risk, score_weather_rows, _weather_risk_action),
+    Detector("market_share", ["revenue_stats"], detect_market_share_sudden_change, score_market_share_rows, _market_share_change_action),
+]:
+    dispatcher.register(_detector)
+
+
+def run_ml_proactive_agent(payload=None):
+    """
+    Run the anomaly detectors.
+    payload is a realtime change payload, or a list of them coalesced by the
+    listener. Only the detectors reading a changed table run, scoring the
+    changed rows against cached baselines; without a payload every detector
+    runs a full scan. Detectors run concurrently; the returned list carries
+    per-table and per-detector timings in .timings.
+    """
+    if payload is None:
+        return dispatcher.run_full()
+
+    payloads = payload if isinstance(payload, list) else [payload]
+    events = [e for e in map(ChangeEvent.from_payload, payloads) if e is not None]
+    if not events:
+        return dispatcher.run_full()
+
+    return dispatcher.run_events(events)
 
 
 # ---------- ENDPOINT TRIGGERED BY DATABASE EVENT ----------
@@ -950,10 +1058,17 @@ def event_trigger(request):
     if request.method != "POST":
         return JsonResponse({"error": "POST required"}, status=405)
 
-    actions = run_ml_proactive_agent()
+    # Supabase database webhooks post {"type", "table", "record", "old_record"}
+    try:
+        payload = json.loads(request.body) if request.body else None
+    except json.JSONDecodeError:
+        payload = None
+
+    actions = run_ml_proactive_agent(payload)
 
     return JsonResponse({
         "status": "ok",
-        "actions": actions
+        "actions": actions,
+        "timings": actions.timings
     })
 
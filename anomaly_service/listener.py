@@ -1,45 +1,83 @@
 import os
 import asyncio
 import django
-from supabase import create_async_client
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "anomaly_service.settings")
 django.setup()
 
-from core.views import run_ml_proactive_agent, notify
+# importable once the settings have put the repo root on the path
+from common.supabase_pool import get_async_client
+from core.views import run_ml_proactive_agent, notify_digest, alerts_to_send, alert_failed, alert_outbox
+from core.scheduler import DetectionScheduler
 
 SUPABASE_URL = "<ENTER_SUPABASE_URL>"
 SUPABASE_KEY = "<ENTER_SUPABASE_API_KEY>"
 
+# events within this window are coalesced into one detection run
+DEBOUNCE_SECONDS = float(os.getenv("DETECTION_DEBOUNCE_SECONDS", "0.5"))
+# queued events before the listener falls back to one full rescan
+MAX_PENDING_EVENTS = int(os.getenv("DETECTION_MAX_PENDING", "1000"))
+# how often queued / failed alert e-mails are retried between detection runs
+ALERT_RETRY_SECONDS = float(os.getenv("ALERT_RETRY_SECONDS", "30"))
+
 
 # ---------- real async worker ----------
-async def handle_change(payload):
-    print("🔔 Supabase event received")
-    print("📨 Payload:", payload)
+async def handle_change(payloads):
+    # payloads is the coalesced batch, or None for a full rescan after overflow
+    print(f"🔔 Supabase events received: {len(payloads) if payloads else 'overflow, full rescan'}")
+    print("📊 Scheduler:", scheduler.metrics())
 
         # offload heavy sync function
-    actions = await asyncio.to_thread(run_ml_proactive_agent)
+    actions = await asyncio.to_thread(run_ml_proactive_agent, payloads)
+    print("⏱️ Detector timings:", actions.timings)
 
     print("\n🚨 Anomaly actions:")
     for a in actions:
         print(a)
 
-            # also offload notification functions
-        await asyncio.to_thread(notify, a, actions)
+    # only alert on anomalies not already e-mailed within the fingerprint TTL,
+    # batched into one digest per recipient; the outbox retries failed sends
+    fresh = alerts_to_send(actions)
+    if fresh:
+        try:
+            delivery = await asyncio.to_thread(notify_digest, fresh, actions)
+            print(f"📧 Alerts: {len(fresh)} new, delivery {delivery}")
+        except Exception as e:
+            # not even queued, so let the next cycle alert again
+            for a in fresh:
+                alert_failed(a)
+            print(f"❌ Queueing alerts failed: {e}")
 
 
     print("---------------------------------------------------\n")
 
 
 
+scheduler = DetectionScheduler(handle_change, window=DEBOUNCE_SECONDS, max_pending=MAX_PENDING_EVENTS)
+
+
+async def retry_alerts():
+    # rate-limited or failed alerts stay in the outbox until a flush gets them out
+    while True:
+        await asyncio.sleep(ALERT_RETRY_SECONDS)
+        try:
+            delivery = await asyncio.to_thread(alert_outbox.flush)
+            if delivery["sent"] or delivery["failed"]:
+                print(f"📧 Alert retry: {delivery}, outbox {alert_outbox.stats()}")
+        except Exception as e:
+            print(f"❌ Alert retry failed: {e}")
+
+
 # ---------- callback expected by supabase client (MUST BE SYNC) ----------
 def on_db_change(payload):
-    # schedule async task without blocking realtime loop
-    asyncio.create_task(handle_change(payload))
+    # enqueue without blocking realtime loop; the scheduler runs one batch at a time
+    scheduler.submit(payload)
 
 
 async def main():
-    client = await create_async_client(SUPABASE_URL, SUPABASE_KEY)
+    scheduler.start()
+    asyncio.create_task(retry_alerts())
+    client = await get_async_client(SUPABASE_URL, SUPABASE_KEY)
 
     print("👂 Subscribing to realtime database changes…")
 
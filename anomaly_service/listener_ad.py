@@ -1,21 +1,27 @@
 import os
 import asyncio
 import django
-from supabase import create_async_client
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "anomaly_service.settings")
 django.setup()
 
-from core.views import automate_ad,advertise
+# importable once the settings have put the repo root on the path
+from common.supabase_pool import get_async_client
+from core.views import automate_ad,advertise,image_pipeline
+from core.scheduler import DetectionScheduler
 
 SUPABASE_URL = "<ENTER_SUPABASE_URL>"
 SUPABASE_KEY = "<ENTER_SUPABASE_APIKEY>"
 
+DEBOUNCE_SECONDS = float(os.getenv("AD_DEBOUNCE_SECONDS", "2"))
+MAX_PENDING_EVENTS = int(os.getenv("AD_MAX_PENDING", "100"))
+
 
 # ---------- real async worker ----------
-async def handle_change(payload):
-    print("🔔 Supabase event received")
-    print("📨 Payload:", payload)
+async def handle_change(payloads):
+    # automate_ad always advertises the newest product, so a burst of inserts needs one run
+    print(f"🔔 Supabase events received: {len(payloads) if payloads else 'overflow'}")
+    print("📊 Scheduler:", scheduler.metrics())
 
         # offload heavy sync function
     product = await asyncio.to_thread(automate_ad)
@@ -31,14 +37,30 @@ async def handle_change(payload):
 
 
 
+scheduler = DetectionScheduler(handle_change, window=DEBOUNCE_SECONDS, max_pending=MAX_PENDING_EVENTS)
+
+
 # ---------- callback expected by supabase client (MUST BE SYNC) ----------
 def on_db_change(payload):
-    # schedule async task without blocking realtime loop
-    asyncio.create_task(handle_change(payload))
+    # enqueue without blocking realtime loop; the scheduler runs one batch at a time
+    scheduler.submit(payload)
+
+
+def on_preload_done(task):
+    # nobody awaits the preload; a failure only shows up here (the first ad retries the load)
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        print(f"❌ Image pipeline preload failed: {error!r}")
 
 
 async def main():
-    client = await create_async_client(SUPABASE_URL, SUPABASE_KEY)
+    scheduler.start()
+    # this process exists to render ads: load the weights while subscribing, not on the first insert
+    preload = asyncio.create_task(asyncio.to_thread(image_pipeline.load))
+    preload.add_done_callback(on_preload_done)
+    client = await get_async_client(SUPABASE_URL, SUPABASE_KEY)
 
     print("👂 Subscribing to realtime database changes…")
 
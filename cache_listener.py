@@ -0,0 +1,103 @@
+import os
+import asyncio
+import django
+from common.supabase_pool import get_async_client, http_client, rest_headers
+from common.supabase_rest import fetch_column_types, fetch_records
+from App.local_replica import HEARTBEAT_INTERVAL, LocalReplica
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Agent_21.settings")
+django.setup()
+
+from Agent_21.supabase_redis_api import REPLICA_READS, invalidate_tables
+
+SUPABASE_URL = "<ENTER_SUPABASE_URL>"
+SUPABASE_KEY = "<ENTER_SUPABASE_API_KEY>"
+
+# the SQLite replica /api/query/ reads from when SQL_REPLICA_READS is on; this
+# process is its only writer, and keeps no replica while reads are off
+local_replica = LocalReplica(
+    fetch=lambda table, order=None: fetch_records(
+        SUPABASE_URL, rest_headers(SUPABASE_KEY), table, order=order, session=http_client()
+    ),
+    schema=lambda: fetch_column_types(SUPABASE_URL, rest_headers(SUPABASE_KEY), session=http_client()),
+)
+
+
+# ---------- real async worker ----------
+async def handle_change(table, payload):
+    # replica first: a query re-run after the invalidation must see the change
+    if REPLICA_READS:
+        try:
+            await asyncio.to_thread(local_replica.apply, payload)
+        except Exception as e:
+            print(f"❌ Replica update for {table} failed: {e}")
+
+    # drop the cached /api/query/ results that read this table, off the realtime loop
+    try:
+        removed = await asyncio.to_thread(invalidate_tables, [table])
+        print(f"🧹 {table} changed, {removed} cached queries invalidated")
+    except Exception as e:
+        print(f"❌ Cache invalidation for {table} failed: {e}")
+
+
+async def heartbeat(client):
+    # readers trust the replica only while this beats; it stops with the process or the realtime socket
+    while True:
+        realtime = getattr(client, "realtime", None)
+        if getattr(realtime, "is_connected", True):
+            try:
+                await asyncio.to_thread(local_replica.heartbeat)
+            except Exception as e:
+                print(f"❌ Replica heartbeat failed: {e}")
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+# ---------- callback expected by supabase client (MUST BE SYNC) ----------
+def on_db_change(payload):
+    # python client shape {"data": {"table", ...}} or JS shape {"table", ...}
+    data = payload.get("data", payload) if isinstance(payload, dict) else {}
+    table = data.get("table")
+    if table:
+        asyncio.create_task(handle_change(table, payload))
+
+
+async def main():
+    client = await get_async_client(SUPABASE_URL, SUPABASE_KEY)
+
+    print("👂 Subscribing to realtime database changes…")
+
+    # every table in the realtime publication: any of them can back a cached query
+    (
+        await client.channel("sql_cache_changes")
+        .on_postgres_changes(
+            event="*",
+            schema="public",
+            table="*",
+            callback=on_db_change,
+        )
+        .subscribe()
+    )
+
+    # copied after subscribing, so changes made during the copy are held and replayed
+    if REPLICA_READS:
+        try:
+            copied = await asyncio.to_thread(local_replica.bootstrap)
+            print(f"🗄️ Local replica ready: {copied or 'already bootstrapped'}")
+        except Exception as e:
+            print(f"❌ Local replica bootstrap failed, queries keep going to Supabase: {e}")
+        beating = asyncio.create_task(heartbeat(client))   # referenced so the task is not collected
+
+    print("✅ Cache listener connected. Waiting for events…")
+
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    try:
+        # (Windows fix) — ensure compatible policy
+        if os.name == "nt":
+            asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 Listener stopped manually")
@@ -0,0 +1,4 @@
+"""
+Common
+Supabase access, table snapshots and model persistence shared by the main project and anomaly_service
+"""
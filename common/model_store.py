@@ -0,0 +1,155 @@
+"""
+Model Store
+Persisted IsolationForest that is refit on a schedule or after enough new rows, not on every call
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import IsolationForest
+
+MODEL_DIR = Path(os.getenv("MODEL_STORE_DIR", Path(__file__).resolve().parent.parent / "model_store"))
+REFIT_INTERVAL = int(os.getenv("MODEL_REFIT_INTERVAL", 6 * 3600))  # seconds
+REFIT_AFTER_ROWS = int(os.getenv("MODEL_REFIT_AFTER_ROWS", 500))
+# fits run in worker processes so they do not hold the GIL over the detector threads; 0 fits inline
+FIT_PROCESSES = int(os.getenv("MODEL_FIT_PROCESSES", 1))
+
+_fit_pool: Optional[ProcessPoolExecutor] = None
+_fit_pool_lock = threading.Lock()
+
+
+def _fit_isolation_forest(X: np.ndarray) -> Tuple[IsolationForest, np.ndarray]:
+    model = IsolationForest(contamination="auto", random_state=42)
+    return model, model.fit_predict(X)
+
+
+def _fit_in_worker(X: np.ndarray) -> Tuple[IsolationForest, np.ndarray]:
+    """Fit in the shared process pool, or inline when it is disabled or broken."""
+    global _fit_pool
+    if FIT_PROCESSES <= 0:
+        return _fit_isolation_forest(X)
+
+    with _fit_pool_lock:
+        if _fit_pool is None:
+            # spawn: forking a process that already runs threads can deadlock the child
+            _fit_pool = ProcessPoolExecutor(FIT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        pool = _fit_pool
+    try:
+        return pool.submit(_fit_isolation_forest, X).result()
+    except Exception as e:
+        print(f"Model store: process pool fit failed, fitting inline: {e}")
+        with _fit_pool_lock:
+            if _fit_pool is pool:
+                _fit_pool = None
+        return _fit_isolation_forest(X)
+
+
+class IsolationForestStore:
+    """
+    One-feature IsolationForest plus the median of its normal points, kept on disk.
+    A process starts warm from the last saved fit; scoring new rows only runs
+    decision_function, and fitting happens when needs_refit() says so.
+    """
+
+    def __init__(self, name: str, model_dir: Path = MODEL_DIR,
+                 refit_interval: float = REFIT_INTERVAL, refit_after_rows: int = REFIT_AFTER_ROWS):
+        self.path = Path(model_dir) / f"{name}.joblib"
+        self.refit_interval = refit_interval
+        self.refit_after_rows = refit_after_rows
+
+        self.model: Optional[IsolationForest] = None
+        self.center: Optional[float] = None
+        self.fitted_at = 0.0
+        self.n_fit_rows = 0
+        self.rows_since_fit = 0
+        self._lock = threading.Lock()
+
+        self.load()
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        try:
+            state = joblib.load(self.path)
+        except Exception as e:
+            print(f"Model store: could not load {self.path.name}: {e}")
+            return False
+
+        # pickles are only trusted by the sklearn version that wrote them
+        if state.get("sklearn_version") != sklearn.__version__:
+            print(f"Model store: {self.path.name} was saved by sklearn {state.get('sklearn_version')}, refitting")
+            return False
+
+        self.model = state["model"]
+        self.center = state["center"]
+        self.fitted_at = state["fitted_at"]
+        self.n_fit_rows = state["n_fit_rows"]
+        return True
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        joblib.dump({
+            "model": self.model,
+            "center": self.center,
+            "fitted_at": self.fitted_at,
+            "n_fit_rows": self.n_fit_rows,
+            "sklearn_version": sklearn.__version__,
+        }, tmp)
+        os.replace(tmp, self.path)
+
+    def needs_refit(self, total_rows: Optional[int] = None) -> bool:
+        """
+        Due when there is no model, the fit is older than refit_interval, or at
+        least refit_after_rows rows arrived since. total_rows lets full-scan
+        callers count new rows from the table size.
+        """
+        if self.model is None:
+            return True
+        if time.time() - self.fitted_at > self.refit_interval:
+            return True
+
+        seen = self.rows_since_fit
+        if total_rows is not None:
+            seen = max(seen, total_rows - self.n_fit_rows)
+        return seen >= self.refit_after_rows
+
+    def fit(self, values: np.ndarray) -> bool:
+        """Fit on the full history; returns False if no point came out normal."""
+        X = np.asarray(values, dtype=float).reshape(-1, 1)
+        model, preds = _fit_in_worker(X)
+
+        # use central tendency from normal points only
+        normal_values = X[preds == 1]
+        if not len(normal_values):
+            return False
+
+        with self._lock:
+            self.model = model
+            self.center = float(np.median(normal_values))
+            self.fitted_at = time.time()
+            self.n_fit_rows = len(X)
+            self.rows_since_fit = 0
+        self.save()
+        return True
+
+    def flag(self, values: np.ndarray) -> np.ndarray:
+        """Boolean outlier mask; decision_function < 0 is exactly predict() == -1."""
+        X = np.asarray(values, dtype=float).reshape(-1, 1)
+        with self._lock:
+            return self.model.decision_function(X) < 0
+
+    def record_new_rows(self, n: int):
+        with self._lock:
+            self.rows_since_fit += n
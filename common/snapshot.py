@@ -0,0 +1,70 @@
+"""
+Table Snapshot
+Fetches each monitored table once per detection cycle, projected to the columns the detectors read
+"""
+import threading
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+# Columns each detector reads; anything else is never pulled over REST.
+# The first column is the primary key and orders the pages, which keeps
+# Range pagination stable and rows in insertion order.
+DETECTOR_COLUMNS: Dict[str, List[str]] = {
+    "revenue_stats": [
+        "stats_id", "product_id", "total_revenue", "calculated_for",
+        "revenue_share_percent", "unit_share_percent"
+    ],
+    "deliveries": [
+        "delivery_id", "order_id", "delivery_status",
+        "promised_delivery_date", "actual_delivery_date"
+    ],
+    "products": ["product_id", "current_stock"],
+    "pricing_history": ["pricing_id", "product_id", "price", "start_date"],
+    "review_sentiments": ["sentiment_id", "review_id", "sentiment_score", "detected_issues"],
+    "factory_performance": [
+        "factory_id", "throughput_percentage", "backlog_units", "units_produced"
+    ],
+    "weather_conditions": [
+        "weather_id", "observed_location", "severity_level", "weather_type", "observed_at"
+    ],
+}
+
+
+class TableSnapshot:
+    """
+    Per-cycle view of the monitored tables.
+    The first detector asking for a table triggers the fetch; every later
+    detector in the same cycle gets the same rows.
+    """
+
+    def __init__(self, fetch: Callable[..., pd.DataFrame],
+                 columns: Optional[Dict[str, List[str]]] = None):
+        self.fetch = fetch
+        self.columns = DETECTOR_COLUMNS if columns is None else columns
+        self._tables: Dict[str, pd.DataFrame] = {}
+        self._table_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def select_for(self, table: str) -> str:
+        cols = self.columns.get(table)
+        return ",".join(cols) if cols else "*"
+
+    def order_for(self, table: str) -> Optional[str]:
+        cols = self.columns.get(table)
+        return f"{cols[0]}.asc" if cols else None
+
+    def frame(self, table: str) -> pd.DataFrame:
+        # one lock per table so different tables can load concurrently
+        with self._lock:
+            table_lock = self._table_locks.setdefault(table, threading.Lock())
+
+        with table_lock:
+            if table not in self._tables:
+                self._tables[table] = self.fetch(
+                    table, select=self.select_for(table), order=self.order_for(table)
+                )
+        return self._tables[table]
+
+    def fetched_tables(self) -> List[str]:
+        return list(self._tables)
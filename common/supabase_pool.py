@@ -0,0 +1,178 @@
+"""
+Supabase Pool
+One pooled keep-alive HTTP client per process, shared by every supabase-py client and raw PostgREST read, with timeouts and jittered retries
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+import httpx
+from supabase import acreate_client, create_client
+
+try:
+    from supabase import AsyncClientOptions, ClientOptions
+except ImportError:   # supabase-py without pluggable http clients
+    AsyncClientOptions = ClientOptions = None
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 20))
+MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", 10))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 60))   # seconds an idle connection is kept
+CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", 30))
+MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", 3))
+BACKOFF_BASE = 0.2   # seconds; attempt n sleeps uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**n))
+BACKOFF_MAX = 5.0
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# the request never reached the server, so even an insert is safe to resend
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def backoff(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Full-jitter exponential backoff, stretched to a numeric Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), BACKOFF_MAX))
+    return delay
+
+
+def _should_retry(request: httpx.Request, attempt: int, error: Optional[Exception] = None,
+                  response: Optional[httpx.Response] = None) -> bool:
+    if attempt >= MAX_RETRIES:
+        return False
+    if isinstance(error, NOT_SENT_ERRORS):
+        return True
+    if request.method not in IDEMPOTENT_METHODS:
+        return False
+    return error is not None or response.status_code in RETRY_STATUSES
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """
+    Retries a request that never reached the server, and an idempotent read
+    that failed in flight or got 429/5xx back. A POST (insert, RPC) that may
+    have run is never resent.
+    """
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError as e:
+                if not _should_retry(request, attempt, error=e):
+                    raise
+                print(f"Supabase request failed ({type(e).__name__}), retry {attempt + 1}/{MAX_RETRIES}")
+                time.sleep(backoff(attempt))
+            else:
+                if not _should_retry(request, attempt, response=response):
+                    return response
+                response.close()
+                print(f"Supabase returned {response.status_code}, retry {attempt + 1}/{MAX_RETRIES}")
+                time.sleep(backoff(attempt, response))
+            attempt += 1
+
+
+class AsyncRetryTransport(httpx.AsyncHTTPTransport):
+    """RetryTransport for httpx.AsyncClient; backs off without blocking the event loop."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await super().handle_async_request(request)
+            except httpx.TransportError as e:
+                if not _should_retry(request, attempt, error=e):
+                    raise
+                await asyncio.sleep(backoff(attempt))
+            else:
+                if not _should_retry(request, attempt, response=response):
+                    return response
+                await response.aclose()
+                await asyncio.sleep(backoff(attempt, response))
+            attempt += 1
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+_lock = threading.Lock()
+_http: Optional[httpx.Client] = None
+_clients: Dict[Tuple[str, str], object] = {}
+# an AsyncClient's connections belong to the loop that opened them
+_async_http: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+
+
+def http_client() -> httpx.Client:
+    """The process-wide pooled client; pass it as `session` to the PostgREST readers."""
+    global _http
+    with _lock:
+        if _http is None:
+            _http = httpx.Client(
+                transport=RetryTransport(http2=HTTP2, limits=_limits()),
+                timeout=_timeout(),
+                follow_redirects=True,
+            )
+        return _http
+
+
+def get_client(url: str, key: str):
+    """A supabase-py client per (url, key), built once and riding the shared pool."""
+    http = http_client()
+    with _lock:
+        client = _clients.get((url, key))
+        if client is None:
+            options = ClientOptions(httpx_client=http) if ClientOptions is not None else None
+            client = _clients[(url, key)] = create_client(url, key, options) if options else create_client(url, key)
+        return client
+
+
+def async_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    http = _async_http.get(loop)
+    if http is None:
+        http = _async_http[loop] = httpx.AsyncClient(
+            transport=AsyncRetryTransport(http2=HTTP2, limits=_limits()),
+            timeout=_timeout(),
+            follow_redirects=True,
+        )
+    return http
+
+
+async def get_async_client(url: str, key: str):
+    """Async supabase-py client per (url, key) for the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get((url, key))
+    if client is None:
+        options = AsyncClientOptions(httpx_client=async_http_client()) if AsyncClientOptions is not None else None
+        client = await acreate_client(url, key, options) if options else await acreate_client(url, key)
+        clients[(url, key)] = client
+    return client
+
+
+def rest_headers(key: str) -> Dict[str, str]:
+    return {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+        "Content-Type": "application/json"
+    }
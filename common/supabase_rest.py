@@ -0,0 +1,110 @@
+"""
+Supabase REST Reads
+Projected, filtered, Range-paginated PostgREST reads streamed into pandas columns
+"""
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import requests
+
+# Supabase ships PostgREST with max-rows = 1000; larger pages would be cut anyway
+DEFAULT_PAGE_SIZE = 1000
+REQUEST_TIMEOUT = 30  # seconds
+
+
+def build_params(select: str = "*", filters: Optional[Dict[str, str]] = None,
+                 order: Optional[str] = None) -> Dict[str, str]:
+    """
+    PostgREST query string. filters use PostgREST operators, e.g.
+    {"product_id": "eq.3", "calculated_for": "gte.2025-01-01"}.
+    """
+    params = {"select": select}
+    if filters:
+        params.update(filters)
+    if order:
+        params["order"] = order
+    return params
+
+
+def _get_range(http, url: str, headers: Dict, params: Dict, start: int, end: int) -> List[Dict]:
+    res = http.get(
+        url,
+        headers={**headers, "Range-Unit": "items", "Range": f"{start}-{end}"},
+        params=params,
+        timeout=REQUEST_TIMEOUT
+    )
+    # 416: range starts past the last row
+    if res.status_code == 416:
+        return []
+    res.raise_for_status()
+    return res.json()
+
+
+def iter_pages(base_url: str, headers: Dict, table: str, select: str = "*",
+               filters: Optional[Dict[str, str]] = None, order: Optional[str] = None,
+               page_size: int = DEFAULT_PAGE_SIZE, session=None) -> Iterator[List[Dict]]:
+    """
+    Yield a table page by page using Range headers.
+    A short page is either the end of the table or the server's max-rows ceiling;
+    a one-row probe tells them apart, and on a ceiling paging continues at that size
+    instead of silently stopping.
+    Pass an order on a unique column for stable pages across requests.
+    """
+    http = session or requests
+    url = f"{base_url}/rest/v1/{table}"
+    params = build_params(select, filters, order)
+    offset = 0
+
+    while True:
+        page = _get_range(http, url, headers, params, offset, offset + page_size - 1)
+        if not page:
+            return
+        yield page
+        offset += len(page)
+
+        if len(page) < page_size:
+            if not _get_range(http, url, headers, params, offset, offset):
+                return
+            print(f"PostgREST max-rows caps {table} pages at {len(page)} rows; paging at that size")
+            page_size = len(page)
+
+
+def fetch_records(base_url: str, headers: Dict, table: str, select: str = "*", **kwargs) -> List[Dict]:
+    """All rows as a list of dicts, for callers that need JSON-shaped rows."""
+    rows = []
+    for page in iter_pages(base_url, headers, table, select, **kwargs):
+        rows.extend(page)
+    return rows
+
+
+def fetch_column_types(base_url: str, headers: Dict, session=None) -> Dict[str, Dict[str, str]]:
+    """
+    Postgres type of every column PostgREST exposes, {table: {column: type}},
+    e.g. "bigint", "numeric", "timestamp with time zone", "text[]", read from
+    its OpenAPI description.
+    """
+    http = session or requests
+    res = http.get(f"{base_url}/rest/v1/", headers={**headers, "Accept": "application/openapi+json"},
+                   timeout=REQUEST_TIMEOUT)
+    res.raise_for_status()
+    definitions = res.json().get("definitions") or {}
+    return {
+        table: {column: spec.get("format") or spec.get("type") or "text"
+                for column, spec in (definition.get("properties") or {}).items()}
+        for table, definition in definitions.items()
+    }
+
+
+def fetch_frame(base_url: str, headers: Dict, table: str, select: str = "*", **kwargs) -> pd.DataFrame:
+    """
+    All rows as a DataFrame. Each page is converted to columns as soon as it
+    arrives, so only one page of dicts is alive at a time.
+    """
+    columns = None if select == "*" else [c.strip() for c in select.split(",")]
+    frames = [
+        pd.DataFrame.from_records(page, columns=columns)
+        for page in iter_pages(base_url, headers, table, select, **kwargs)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)